@@ -3,27 +3,29 @@ Main application entry point for FinanceGuard
 """
 
 import os
+import time
 import logging
 from dotenv import load_dotenv
 
+STARTED_AT = time.monotonic()
+
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (queued, JSON by default; see src/logging_config.py)
+from src.logging_config import configure_logging
+configure_logging()
 
 logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
     try:
         # Import the Flask app after logging configuration
-        from src.api.routes import app
+        from src.api.routes import app, tools
+        from src import startup
+
+        # Warm up according to STARTUP_MODE (lazy / background / eager)
+        startup.start(tools, started_at=STARTED_AT)
         
         # Run the server
         port = int(os.environ.get("PORT", 5000))
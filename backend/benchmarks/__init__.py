@@ -0,0 +1 @@
+"""Offline benchmarks that run the backend against local stand-ins for its external services"""
@@ -0,0 +1,97 @@
+"""Synthetic precedent corpora and a deterministic stand-in for the embedding model"""
+
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+EMBEDDING_DIM = 1024  # KURE-v1
+
+CLAUSE_TOPICS = [
+    "중도해지 시 해지수수료 부과", "운용사의 손해배상 책임 면제", "약관의 일방적 변경",
+    "전속 관할 법원 지정", "투자 원금 손실 가능성 고지 누락", "자동 연장 및 갱신 조항",
+    "과도한 위약금 약정", "정보 제공 의무 위반", "보수 및 수수료의 사후 인상", "담보 제공 강제",
+]
+
+
+class HashEncoder:
+    """Encodes text as hashed character trigrams; mimics SentenceTransformer.encode
+
+    Similar strings get similar vectors, which is enough to exercise retrieval
+    code paths without downloading or running the real model.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for i in range(max(len(text) - 2, 1)):
+            digest = hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(s) for s in sentences]) if sentences else np.zeros((0, self.dim), np.float32)
+
+
+def synthetic_cases(n: int, seed: int = 0) -> list:
+    """Case DB entries in the {"key", "value"} format of datasets/case_db.json"""
+    rng = np.random.default_rng(seed)
+    cases = []
+    for i in range(n):
+        topic = CLAUSE_TOPICS[int(rng.integers(len(CLAUSE_TOPICS)))]
+        key = f"{topic}에 관한 분쟁 사건 {i}: 금융투자계약 제{int(rng.integers(1, 30))}조의 효력"
+        value = (
+            f"사건번호 2023다{100000 + i}. {key}. 법원은 해당 조항이 고객에게 부당하게 불리하여 "
+            f"약관의 규제에 관한 법률에 따라 무효라고 판단하였다. " * 3
+        )
+        cases.append({"key": key, "value": value})
+    return cases
+
+
+def write_case_corpus(directory: str, n: int, encoder=None, seed: int = 0) -> tuple:
+    """Write case_db.json, precomputed_embeddings.npz and case_bm25.npz; returns the first two paths"""
+    from src.tools.lexical import build_case_index
+    encoder = encoder or HashEncoder()
+    cases = synthetic_cases(n, seed)
+    texts = [case["key"] for case in cases]
+    embeddings = np.asarray(encoder.encode(texts), dtype=np.float32)
+
+    os.makedirs(directory, exist_ok=True)
+    case_db_path = os.path.join(directory, "case_db.json")
+    embedding_path = os.path.join(directory, "precomputed_embeddings.npz")
+    with open(case_db_path, 'w', encoding='utf-8') as f:
+        json.dump(cases, f, ensure_ascii=False)
+    np.savez(embedding_path, texts=np.array(texts, dtype=object), embeddings=embeddings)
+    build_case_index(cases).save(os.path.join(directory, "case_bm25.npz"))
+    return case_db_path, embedding_path
+
+
+def synthetic_embeddings(n: int, dim: int = EMBEDDING_DIM, clusters: int = 256, seed: int = 0,
+                         dtype=np.float32, block: int = 65536) -> np.ndarray:
+    """Unit-norm rows drawn around random cluster centres, generated block by block to bound memory"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    matrix = np.empty((n, dim), dtype=dtype)
+    for start in range(0, n, block):
+        size = min(block, n - start)
+        rows = centres[rng.integers(clusters, size=size)] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32) / np.sqrt(dim)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        matrix[start:start + size] = rows
+    return matrix
+
+
+def synthetic_queries(matrix: np.ndarray, count: int, noise: float = 0.5, seed: Optional[int] = 1) -> np.ndarray:
+    """Queries that are noisy copies of random corpus rows, so nearest neighbours are meaningful"""
+    rng = np.random.default_rng(seed)
+    rows = matrix[rng.integers(len(matrix), size=count)].astype(np.float32)
+    rows += noise * rng.standard_normal(rows.shape).astype(np.float32) / np.sqrt(matrix.shape[1])
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
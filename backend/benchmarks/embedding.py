@@ -0,0 +1,113 @@
+"""
+Throughput of per-call encoding vs the in-process micro-batcher under
+concurrent load.
+
+By default a simulated encoder is used whose cost is a fixed per-call overhead
+plus a per-sentence cost. Its calls run one at a time, the way concurrent
+torch calls compete for the same cores; pass --model to measure a real
+SentenceTransformer instead.
+
+Usage (from the backend directory):
+    python -m benchmarks.embedding --concurrency 1,4,16,32
+    python -m benchmarks.embedding --model nlpai-lab/KURE-v1 --requests 256
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import CLAUSE_TOPICS, EMBEDDING_DIM
+from benchmarks.run import run_load
+from benchmarks.stubs import write_config
+
+
+class SimulatedEncoder:
+    """Takes call_ms + n * sentence_ms of exclusive compute per encode(); returns random unit vectors"""
+
+    def __init__(self, call_ms: float, sentence_ms: float, dim: int = EMBEDDING_DIM):
+        self.call_overhead = call_ms / 1000
+        self.sentence_cost = sentence_ms / 1000
+        self.dim = dim
+        self.calls = 0
+        self._compute = threading.Lock()
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        n = 1 if single else len(sentences)
+        with self._compute:
+            self.calls += 1
+            time.sleep(self.call_overhead + n * self.sentence_cost)
+        vectors = np.random.default_rng(n).standard_normal((n, self.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding micro-batching throughput benchmark")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",") if c], default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=512, help="encode calls per measurement")
+    parser.add_argument("--model", default=None, help="SentenceTransformer name (default: simulated encoder)")
+    parser.add_argument("--call-ms", type=float, default=15, help="simulated fixed cost per encode call")
+    parser.add_argument("--sentence-ms", type=float, default=1.5, help="simulated cost per sentence")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    if "FINANCEGUARD_CONFIG" not in os.environ:
+        os.environ["FINANCEGUARD_CONFIG"] = write_config(tempfile.mkdtemp(prefix="financeguard-bench-"))
+    from src.tools.embeddings import BatchingEncoder, InstrumentedEncoder
+
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+    else:
+        model = SimulatedEncoder(args.call_ms, args.sentence_ms)
+
+    texts = [f"{topic} 조항 {i}" for i in range(64) for topic in CLAUSE_TOPICS]
+    direct = InstrumentedEncoder(model)
+    batched = BatchingEncoder(direct, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+
+    results = []
+    for concurrency in args.concurrency:
+        row = {"concurrency": concurrency}
+        for name, encoder in (("per_call", direct), ("batched", batched)):
+            result = run_load(lambda i, encoder=encoder: encoder.encode(texts[i % len(texts)]),
+                              args.requests, concurrency, warmup=2)
+            row[name] = {key: result[key] for key in ("p50_ms", "p95_ms", "throughput_rps", "errors")}
+        row["speedup"] = round(row["batched"]["throughput_rps"] / row["per_call"]["throughput_rps"], 2)
+        results.append(row)
+        print(
+            f"concurrency={concurrency:>3} per-call {row['per_call']['throughput_rps']:>8.1f} req/s "
+            f"p95={row['per_call']['p95_ms']:.1f}ms | batched {row['batched']['throughput_rps']:>8.1f} req/s "
+            f"p95={row['batched']['p95_ms']:.1f}ms | x{row['speedup']}"
+        )
+    batched.stop()
+
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "batcher": batched.get_stats(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
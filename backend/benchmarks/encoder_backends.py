@@ -0,0 +1,155 @@
+"""
+Parity and throughput of the embedding backends (torch, onnx, onnx-int8).
+
+Parity: every backend encodes the same texts as the PyTorch reference, and the
+report lists per-text cosine similarity to the reference embedding. It also
+compares query-to-case cosine scores (max absolute difference) and how often
+the top-k cases agree. Throughput: sentences per second at several batch
+sizes, with single-string encodes included as the per-request case.
+
+Needs the real model plus onnxruntime/optimum (see src/tools/encoder_backends.py).
+
+Usage (from the backend directory):
+    python -m benchmarks.encoder_backends --backends torch,onnx,onnx-int8
+    python -m benchmarks.encoder_backends --cases datasets/case_db.json --threads 4 --min-cosine 0.99
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import CLAUSE_TOPICS, synthetic_cases
+from benchmarks.stubs import write_config
+
+
+def load_texts(path: str, limit: int) -> list:
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [case["key"] for case in json.load(f)[:limit]]
+    return [case["key"] for case in synthetic_cases(limit)]
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def parity(reference: dict, candidate: dict, top_k: int) -> dict:
+    """Compare a backend's case/query embeddings with the reference backend's"""
+    per_text = np.sum(unit(reference["cases"]) * unit(candidate["cases"]), axis=1)
+    reference_scores = unit(reference["queries"]) @ unit(reference["cases"]).T
+    candidate_scores = unit(candidate["queries"]) @ unit(candidate["cases"]).T
+    reference_top = np.argsort(-reference_scores, axis=1)[:, :top_k]
+    candidate_top = np.argsort(-candidate_scores, axis=1)[:, :top_k]
+    overlap = [len(set(r) & set(c)) / top_k for r, c in zip(reference_top.tolist(), candidate_top.tolist())]
+    return {
+        "cosine_to_reference_min": round(float(per_text.min()), 5),
+        "cosine_to_reference_mean": round(float(per_text.mean()), 5),
+        "score_max_abs_diff": round(float(np.abs(reference_scores - candidate_scores).max()), 5),
+        "top1_agreement": round(float(np.mean(reference_top[:, 0] == candidate_top[:, 0])), 4),
+        f"top{top_k}_overlap": round(float(np.mean(overlap)), 4),
+    }
+
+
+def throughput(model, texts: list, batch_sizes: list, seconds: float) -> dict:
+    results = {}
+    for batch_size in batch_sizes:
+        model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        calls = encoded = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            offset = (calls * batch_size) % max(len(texts) - batch_size + 1, 1)
+            batch = texts[offset:offset + batch_size]
+            if batch_size == 1:
+                model.encode(batch[0])
+            else:
+                model.encode(batch, batch_size=batch_size)
+            calls += 1
+            encoded += len(batch)
+        results[f"batch{batch_size}_sentences_per_s"] = round(encoded / (time.perf_counter() - start), 1)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding backend parity and throughput")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8",
+                        help="comma-separated; the first one is the parity reference")
+    parser.add_argument("--cases", default=None, help="case_db.json to draw texts from (default: synthetic)")
+    parser.add_argument("--limit", type=int, default=512, help="case texts to encode for parity")
+    parser.add_argument("--batch-sizes", type=lambda v: [int(b) for b in v.split(",") if b], default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10, help="timed encoding per batch size")
+    parser.add_argument("--threads", type=int, default=0, help="torch / ONNX Runtime intra-op threads (0: default)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=None,
+                        help="exit non-zero if any backend's minimum cosine to the reference is lower")
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if "FINANCEGUARD_CONFIG" not in os.environ:
+        os.environ["FINANCEGUARD_CONFIG"] = write_config(tempfile.mkdtemp(prefix="financeguard-bench-"))
+    from src.tools.encoder_backends import load_encoder, set_intra_op_threads
+
+    if args.threads:
+        set_intra_op_threads(args.threads)
+        try:
+            import torch
+            torch.set_num_threads(args.threads)
+        except ImportError:
+            pass
+
+    texts = load_texts(args.cases, args.limit)
+    queries = [f"{topic} 조항이 불공정한가요?" for topic in CLAUSE_TOPICS]
+    backends = [b for b in args.backends.split(",") if b]
+
+    results = {}
+    embeddings = {}
+    for backend in backends:
+        start = time.perf_counter()
+        model = load_encoder(backend)
+        load_s = time.perf_counter() - start
+        embeddings[backend] = {
+            "cases": model.encode(texts, batch_size=32),
+            "queries": model.encode(queries),
+        }
+        results[backend] = {"load_s": round(load_s, 2), **throughput(model, texts, args.batch_sizes, args.seconds)}
+        del model
+
+    reference = backends[0]
+    failed = False
+    for backend in backends[1:]:
+        results[backend]["parity"] = parity(embeddings[reference], embeddings[backend], args.top_k)
+        if args.min_cosine is not None and results[backend]["parity"]["cosine_to_reference_min"] < args.min_cosine:
+            failed = True
+
+    for backend, result in results.items():
+        speeds = " ".join(f"{key.split('_')[0]}={value}/s" for key, value in result.items() if key.endswith("_per_s"))
+        line = f"{backend:<10} load={result['load_s']}s {speeds}"
+        if "parity" in result:
+            p = result["parity"]
+            line += f" | cos min={p['cosine_to_reference_min']} top1={p['top1_agreement']}"
+        print(line)
+
+    report = {"settings": {k: v for k, v in vars(args).items() if k != "output"}, "reference": reference, "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if failed:
+        print(f"Parity check failed: cosine to {reference} below {args.min_cosine}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Retrieval micro-benchmark and recall harness for CaseLawRetriever.
+
+Builds (or loads) case embedding matrices at KURE-v1 dimensionality and times
+the retrieval paths the tools use, without any model or network calls:
+  - CaseLawRetriever.find_similar_case (toxic clause -> top-1 precedent)
+  - tool_find_case.retrieve_cases (chat query -> top-1 precedent)
+  - tool_dispute_simulator.retrieve_cases_for_clauses (top-10 per clause,
+    one clause per batch element)
+  - CaseLawRetriever.search on raw query batches
+Quantized copies of the matrix (float16, int8) are scored against the exact
+float32 top-k to report recall@k alongside their memory and latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.retrieval --sizes 10000,100000 --output retrieval.json
+    python -m benchmarks.retrieval --sizes 1000000 --batch-sizes 1,64 --queries 64
+    python -m benchmarks.retrieval --load datasets/precomputed_embeddings.npz
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import EMBEDDING_DIM, synthetic_embeddings, synthetic_queries
+from benchmarks.run import current_rss_mb, peak_rss_mb
+from benchmarks.stubs import write_config
+
+QUANTIZATIONS = ["float16", "int8"]
+
+
+class LookupEncoder:
+    """Stands in for the embedding model by returning precomputed query vectors
+
+    Query texts are "query-<i>"; surrounding whitespace (added by the tools when
+    combining a query with a clause) is ignored.
+    """
+
+    def __init__(self, queries: np.ndarray):
+        self.queries = queries
+
+    def _lookup(self, text: str) -> np.ndarray:
+        return self.queries[int(text.strip().rsplit("-", 1)[1])]
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            return self._lookup(sentences)
+        return np.stack([self._lookup(s) for s in sentences])
+
+
+class SyntheticCases(Sequence):
+    """Case records generated on access, so a 1M-row corpus costs no memory"""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index):
+        return {"key": f"case-{index}", "value": f"synthetic precedent {index}"}
+
+
+def make_retriever(embeddings: np.ndarray, queries: np.ndarray):
+    from src.tools.highlight import CaseLawRetriever
+
+    retriever = CaseLawRetriever(case_db_path="synthetic_case_db.json")
+    retriever.model = LookupEncoder(queries)
+    retriever.cases = SyntheticCases(len(embeddings))
+    retriever.case_embeddings = embeddings
+    return retriever
+
+
+def time_calls(fn: Callable[[int], object], calls: int, items_per_call: int = 1, warmup: int = 2) -> dict:
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "calls": calls,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "queries_per_s": round(items_per_call * calls / float(np.sum(latencies)), 1),
+    }
+
+
+def legacy_top_k(embeddings: np.ndarray, query: np.ndarray, top_k: int) -> np.ndarray:
+    """The per-query cosine + full argsort the tools used before CaseLawRetriever.search"""
+    similarities = np.dot(embeddings, query) / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+    return np.argsort(similarities)[-top_k:][::-1]
+
+
+def quantize(embeddings: np.ndarray, kind: str):
+    """Return (matrix, per-row scales or None)"""
+    if kind == "float16":
+        return embeddings.astype(np.float16), None
+    if kind == "int8":
+        scales = np.abs(embeddings).max(axis=1).astype(np.float32) / 127
+        scales[scales == 0] = 1
+        return np.round(embeddings / scales[:, None]).astype(np.int8), scales
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def quantized_top_k(matrix: np.ndarray, scales, queries: np.ndarray, top_k: int, block: int = 65536) -> np.ndarray:
+    """Top-k by dequantizing one block of rows at a time (bounded extra memory)"""
+    scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+    for start in range(0, len(matrix), block):
+        rows = matrix[start:start + block].astype(np.float32)
+        if scales is not None:
+            rows *= scales[start:start + block, None]
+        scores[:, start:start + block] = queries @ rows.T
+    candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall_at_k(exact: np.ndarray, approximate: np.ndarray) -> float:
+    hits = [len(set(e) & set(a)) / len(e) for e, a in zip(exact.tolist(), approximate.tolist())]
+    return float(np.mean(hits))
+
+
+def benchmark_size(embeddings: np.ndarray, args) -> dict:
+    from src.tools.tool_dispute_simulator import retrieve_cases_for_clauses
+    from src.tools.tool_find_case import retrieve_cases
+
+    rows, dim = embeddings.shape
+    max_batch = max(args.batch_sizes)
+    queries = synthetic_queries(embeddings, max(args.queries, max_batch), seed=args.seed + 1)
+    retriever = make_retriever(embeddings, queries)
+    n_queries = len(queries)
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    retriever.search(queries[:1])  # one-off normalization of the corpus
+    prepare_s = time.perf_counter() - start
+
+    timings = {
+        "find_similar_case": time_calls(
+            lambda i: retriever.find_similar_case(f"query-{i % n_queries}"), args.queries),
+        "retrieve_cases": time_calls(
+            lambda i: retrieve_cases({"query": f"query-{i % n_queries}"}, retriever), args.queries),
+        "legacy_top1": time_calls(
+            lambda i: legacy_top_k(retriever.case_embeddings, queries[i % n_queries], 1), args.queries),
+    }
+    for batch in args.batch_sizes:
+        calls = max(args.queries // batch, 3)
+
+        def simulation_top10(i, batch=batch):
+            clauses = [{"독소조항": f"query-{(i * batch + j) % n_queries}"} for j in range(batch)]
+            state = {"query": "", "relevant_toxic_clauses": clauses, "similar_cases": []}
+            result = retrieve_cases_for_clauses(state, retriever, "", None)
+            if result.get("error"):
+                raise RuntimeError(result["error"])
+
+        def search(i, batch=batch):
+            offset = (i * batch) % (n_queries - batch + 1)
+            retriever.search(queries[offset:offset + batch], top_k=args.top_k)
+
+        timings[f"simulation_top10_batch{batch}"] = time_calls(simulation_top10, calls, batch)
+        timings[f"search_top{args.top_k}_batch{batch}"] = time_calls(search, calls, batch)
+
+    # Recall of quantized matrices against exact float32 search
+    eval_queries = queries[:args.queries]
+    exact, _ = retriever.search(eval_queries, top_k=args.top_k)
+    recall = {}
+    for kind in args.quantize:
+        matrix, scales = quantize(retriever.case_embeddings, kind)
+        start = time.perf_counter()
+        approximate = quantized_top_k(matrix, scales, eval_queries, args.top_k)
+        elapsed = time.perf_counter() - start
+        recall[kind] = {
+            f"recall@{args.top_k}": round(recall_at_k(exact, approximate), 4),
+            "memory_mb": round((matrix.nbytes + (scales.nbytes if scales is not None else 0)) / 2 ** 20, 1),
+            "queries_per_s": round(len(eval_queries) / elapsed, 1),
+        }
+        del matrix, scales
+
+    return {
+        "rows": rows,
+        "dim": dim,
+        "memory": {
+            "embeddings_mb": round(retriever.case_embeddings.nbytes / 2 ** 20, 1),
+            "rss_before_mb": round(rss_before, 1),
+            "rss_after_mb": round(current_rss_mb(), 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "prepare_s": round(prepare_s, 3),
+        },
+        "timings": timings,
+        "quantization": recall,
+    }
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CaseLawRetriever latency, memory and recall benchmark")
+    parser.add_argument("--sizes", type=parse_int_list, default=[10000, 100000],
+                        help="comma-separated corpus sizes (1000000 needs ~4GB per float32 matrix)")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--load", default=None,
+                        help="precomputed_embeddings.npz to benchmark instead of synthetic matrices")
+    parser.add_argument("--batch-sizes", type=parse_int_list, default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=128, help="timed queries per measurement")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--quantize", type=lambda v: [q for q in v.split(",") if q], default=QUANTIZATIONS,
+                        help=f"comma-separated subset of {','.join(QUANTIZATIONS)} (empty to skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict[str, object]:
+    args = parse_args(argv)
+    if "FINANCEGUARD_CONFIG" not in os.environ:
+        os.environ["FINANCEGUARD_CONFIG"] = write_config(tempfile.mkdtemp(prefix="financeguard-bench-"))
+
+    if args.load:
+        loaded = np.load(args.load, allow_pickle=True)
+        matrices = [(len(loaded["embeddings"]), lambda: np.asarray(loaded["embeddings"], dtype=np.float32))]
+    else:
+        matrices = [(size, lambda size=size: synthetic_embeddings(size, args.dim, seed=args.seed)) for size in args.sizes]
+
+    results = []
+    for size, build in matrices:
+        embeddings = build()
+        result = benchmark_size(embeddings, args)
+        del embeddings
+        results.append(result)
+        timings = result["timings"]
+        recall = ", ".join(
+            f"{kind} recall@{args.top_k}={values[f'recall@{args.top_k}']}" for kind, values in result["quantization"].items()
+        )
+        print(
+            f"rows={size:>8} find_similar_case p50={timings['find_similar_case']['p50_ms']:.2f}ms "
+            f"legacy p50={timings['legacy_top1']['p50_ms']:.2f}ms "
+            f"rss={result['memory']['rss_after_mb']:.0f}MB {recall}"
+        )
+
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
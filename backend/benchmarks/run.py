@@ -0,0 +1,279 @@
+"""
+Offline load benchmark for the backend.
+
+All external services are replaced by local stubs (see stubs.py), so the
+numbers reflect the backend's own overhead plus the configured stub latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --scenario query --requests 50 --concurrency 8
+    python -m benchmarks.run --scenario all --llm-latency-ms 800 --output results.json
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import HashEncoder, write_case_corpus
+from benchmarks.stubs import (
+    DiskS3, Latency, LocalS3, StubServer, StubTavily, load_fixtures, make_moto_s3, make_pdf, write_config
+)
+
+SCENARIOS = ["upload", "query", "toxic", "simulate", "case", "web", "retriever"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process right now"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_load(fn: Callable[[int], None], requests: int, concurrency: int, warmup: int) -> dict:
+    """Call fn(i) `requests` times from `concurrency` threads and summarize latencies"""
+    for i in range(warmup):
+        fn(-1 - i)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def timed(i: int) -> None:
+        start = time.perf_counter()
+        try:
+            fn(i)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    rss_before = current_rss_mb()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "mean_ms": round(float(np.mean(latencies_ms)), 2) if latencies_ms else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "wall_s": round(wall, 3),
+        "rss_before_mb": round(rss_before, 1),
+        "rss_after_mb": round(current_rss_mb(), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def prepare_environment(args, workdir: str, stub: StubServer) -> None:
+    """Point the backend at the stubs; must run before anything under src is imported"""
+    os.environ.update({
+        "FINANCEGUARD_CONFIG": write_config(workdir),
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{stub.base_url}/v1",
+        "UPSTAGE_BASE_URL": f"{stub.base_url}/v1",
+        "TAVILY_API_KEY": "tvly-benchmark",
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "DOCUMENT_DB_URI": "sqlite:///" + os.path.join(workdir, "documents.sqlite"),
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.sqlite"),
+        "CASE_DB_PATH": os.path.join(workdir, "case_db.json"),
+        "EMBEDDING_PATH": os.path.join(workdir, "precomputed_embeddings.npz"),
+        "CASE_LEXICAL_INDEX_PATH": os.path.join(workdir, "case_bm25.npz"),
+    })
+
+
+class Bench:
+    """Imports the backend against the stubs and builds one request function per scenario"""
+
+    def __init__(self, args, fixtures: dict, workdir: str):
+        self.args = args
+        self.fixtures = fixtures
+        self.workdir = workdir
+        self.queries = fixtures["queries"]
+
+        from src import documents
+        if args.s3 == "local":
+            self.s3 = LocalS3(Latency(args.s3_latency_ms / 1000))
+            documents._s3_client = self.s3
+        elif args.s3 == "disk":
+            os.makedirs(os.path.join(workdir, "s3"), exist_ok=True)
+            self.s3 = DiskS3(Latency(args.s3_latency_ms / 1000), os.path.join(workdir, "s3"))
+            documents._s3_client = self.s3
+        else:
+            self.moto = make_moto_s3(documents.BUCKET_NAME, documents.S3_REGION)
+
+        from src.tools import embeddings
+        if args.stub_embeddings:
+            embeddings._model = embeddings.wrap_model(HashEncoder())
+        write_case_corpus(workdir, args.cases, encoder=embeddings.get_embedding_model())
+
+        from src.tools import tool_chat_web
+        self.tavily = StubTavily(fixtures, Latency(args.tavily_latency_ms / 1000))
+        tool_chat_web.set_search_client(self.tavily)
+
+        from src.api.routes import app, tools
+        self.app = app
+        self.tools = {tool.name: tool for tool in tools}
+        self._local = threading.local()
+        self.document_id = self._upload(make_pdf("benchmark-base"))["pdf_id"]
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def _upload(self, pdf: bytes) -> dict:
+        response = self._client().post(
+            "/api/pdf-upload",
+            data={"file": (io.BytesIO(pdf), "contract.pdf")},
+            content_type="multipart/form-data"
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"upload failed with {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json()
+
+    def _query(self, i: int) -> str:
+        return self.queries[i % len(self.queries)]
+
+    def _invoke_tool(self, name: str, args: dict):
+        result = self.tools[name].invoke(args)
+        if isinstance(result, dict) and result.get("error"):
+            raise RuntimeError(result["error"])
+        return result
+
+    def scenario(self, name: str) -> Callable[[int], None]:
+        if name == "upload":
+            if self.args.same_document:
+                return lambda i: self._upload(make_pdf("benchmark-base"))
+            run_id = f"{os.getpid()}-{time.time_ns()}"
+            return lambda i: self._upload(make_pdf(f"{run_id}-{i}"))
+        if name == "query":
+            from src.agent.core import process_query
+            tools = list(self.tools.values())
+
+            def query(i: int) -> None:
+                response = process_query(self._query(i), tools, file_id=self.document_id)
+                if isinstance(response, dict) and response.get("type") == "error":
+                    raise RuntimeError(response.get("message"))
+            return query
+        if name == "toxic":
+            return lambda i: self._invoke_tool(
+                "find_toxic_clauses_tool", {"query": self.queries[0], "file_id": self.document_id}
+            )
+        if name == "simulate":
+            return lambda i: self._invoke_tool(
+                "simulate_dispute_tool", {"query": self.queries[1], "file_id": self.document_id}
+            )
+        if name == "case":
+            return lambda i: self._invoke_tool("find_case_tool", {"query": self._query(i)})
+        if name == "web":
+            # Distinct queries so the web search cache does not hide the stub latency
+            return lambda i: self._invoke_tool("web_search_tool", {"query": f"{self.queries[3]} {i}"})
+        if name == "retriever":
+            from src.tools.highlight import CaseLawRetriever
+            from src.config import CASE_DB_PATH, EMBEDDING_PATH
+            retriever = CaseLawRetriever(CASE_DB_PATH, EMBEDDING_PATH)
+            return lambda i: retriever.find_similar_case(self._query(i))
+        raise ValueError(f"Unknown scenario: {name}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load benchmark with stubbed external services")
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="all")
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed requests before each scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--upstage-latency-ms", type=float, default=500)
+    parser.add_argument("--tavily-latency-ms", type=float, default=200)
+    parser.add_argument("--s3-latency-ms", type=float, default=20)
+    parser.add_argument("--s3", choices=["local", "disk", "moto"], default="local",
+                        help="in-memory or file-backed S3 stand-in, or moto's AWS mock")
+    parser.add_argument("--cases", type=int, default=2000, help="size of the synthetic precedent corpus")
+    parser.add_argument("--stub-embeddings", action="store_true",
+                        help="use a hashing encoder instead of loading KURE-v1")
+    parser.add_argument("--same-document", action="store_true",
+                        help="upload the same PDF every time (measures the cached path)")
+    parser.add_argument("--fixtures", default=None, help="recorded responses JSON (defaults to fixtures/responses.json)")
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> Dict[str, dict]:
+    args = parse_args(argv)
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else load_fixtures()
+    workdir = tempfile.mkdtemp(prefix="financeguard-bench-")
+
+    stub = StubServer(
+        fixtures,
+        llm_latency=Latency(args.llm_latency_ms / 1000),
+        upstage_latency=Latency(args.upstage_latency_ms / 1000)
+    ).start()
+    prepare_environment(args, workdir, stub)
+
+    try:
+        bench = Bench(args, fixtures, workdir)
+        scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+        results = {}
+        for name in scenarios:
+            stub_counts_before = dict(stub.request_counts)
+            result = run_load(bench.scenario(name), args.requests, args.concurrency, args.warmup)
+            result["stub_requests"] = {
+                kind: count - stub_counts_before[kind] for kind, count in stub.request_counts.items()
+            }
+            results[name] = result
+            print(
+                f"{name:<10} p50={result['p50_ms']:>9.1f}ms p95={result['p95_ms']:>9.1f}ms "
+                f"p99={result['p99_ms']:>9.1f}ms {result['throughput_rps']:>8.2f} req/s "
+                f"rss={result['rss_after_mb']:.0f}MB errors={result['errors']}"
+            )
+    finally:
+        stub.stop()
+
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+In-process stand-ins for the external services used by the backend.
+
+- StubServer: one local HTTP server speaking the OpenAI chat completions API
+  and the Upstage document parse API, replaying recorded responses
+- StubTavily: drop-in for TavilyClient.search
+- LocalS3: in-memory subset of the boto3 S3 client
+- DiskS3: the same client storing objects as files, copied in chunks
+Every stub sleeps for a configurable latency (plus jitter) before answering.
+"""
+
+import io
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "responses.json")
+
+
+def write_config(directory: str) -> str:
+    """Write a config.yaml with placeholder API keys and return its path"""
+    path = os.path.join(directory, "config.yaml")
+    with open(path, 'w') as f:
+        f.write("openai:\n  key: sk-benchmark\nupstage:\n  key: up-benchmark\ntavily:\n  key: tvly-benchmark\n")
+    return path
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Latency:
+    """Fixed delay in seconds with uniform relative jitter"""
+
+    def __init__(self, seconds: float, jitter: float = 0.1):
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def sleep(self) -> None:
+        if self.seconds > 0:
+            time.sleep(self.seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+class StubServer:
+    """OpenAI-compatible chat completions and Upstage parse endpoints on localhost
+
+    Chat replies are chosen by the first `chat_rules` entry whose `match`
+    string occurs in the system prompt. Requests that offer tools get a tool
+    call picked by keyword from `tool_routes`; structured-output requests get
+    `structured_summary` as JSON.
+    """
+
+    def __init__(self, fixtures: dict, llm_latency: Latency, upstage_latency: Latency):
+        self.fixtures = fixtures
+        self.llm_latency = llm_latency
+        self.upstage_latency = upstage_latency
+        self.request_counts = {"chat": 0, "upstage": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.request_counts[kind] += 1
+
+    def _chat_completion(self, body: dict) -> dict:
+        messages = body.get("messages", [])
+        system_prompt = " ".join(_message_text(m) for m in messages if m.get("role") == "system")
+        user_text = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+
+        message = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+        if body.get("tools"):
+            tool_name = self._route_tool(user_text, {t["function"]["name"] for t in body["tools"]})
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool_name, "arguments": json.dumps({"query": user_text}, ensure_ascii=False)}
+            }]
+            finish_reason = "tool_calls"
+        elif body.get("response_format", {}).get("type") == "json_schema":
+            message["content"] = json.dumps(self.fixtures["structured_summary"], ensure_ascii=False)
+        else:
+            message["content"] = next(
+                rule["content"] for rule in self.fixtures["chat_rules"] if rule["match"] in system_prompt
+            )
+
+        prompt_tokens = sum(len(_message_text(m)) for m in messages) // 2
+        completion_tokens = len(message["content"] or "") // 2 + 1
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _route_tool(self, user_text: str, offered: set) -> str:
+        for route in self.fixtures["tool_routes"]:
+            if route["tool"] in offered and (
+                not route["keywords"] or any(k in user_text for k in route["keywords"])
+            ):
+                return route["tool"]
+        return sorted(offered)[0]
+
+    def _upstage_parse(self) -> dict:
+        text = self.fixtures["contract_text"]
+        return dict(self.fixtures["upstage_parse"], content={"text": text, "html": "", "markdown": ""})
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict) -> None:
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _drain(self, length: int) -> None:
+                while length > 0:
+                    chunk = self.rfile.read(min(length, 2 ** 16))
+                    if not chunk:
+                        break
+                    length -= len(chunk)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if self.path.endswith(("/document-parse", "/document-digitization")):
+                    # Documents can be large; consume the upload without holding it in memory
+                    self._drain(length)
+                    raw = b""
+                else:
+                    raw = self.rfile.read(length) if length else b""
+                if self.path.endswith("/chat/completions"):
+                    stub._count("chat")
+                    stub.llm_latency.sleep()
+                    self._send_json(200, stub._chat_completion(json.loads(raw or b"{}")))
+                elif self.path.endswith(("/document-parse", "/document-digitization")):
+                    stub._count("upstage")
+                    stub.upstage_latency.sleep()
+                    self._send_json(200, stub._upstage_parse())
+                else:
+                    self._send_json(404, {"error": {"message": f"No stub for {self.path}"}})
+
+        return Handler
+
+
+class StubTavily:
+    """Replays a recorded Tavily search response"""
+
+    def __init__(self, fixtures: dict, latency: Latency):
+        self.response = fixtures["tavily_search"]
+        self.latency = latency
+        self.calls = 0
+
+    def search(self, query: str, **kwargs) -> dict:
+        self.calls += 1
+        self.latency.sleep()
+        return dict(self.response, query=query)
+
+
+class _StreamingBody:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._stream.read() if amt is None else self._stream.read(amt)
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class LocalS3Error(Exception):
+    """Mimics botocore's ClientError closely enough for `except Exception` callers"""
+
+    def __init__(self, code: str, key: str):
+        super().__init__(f"An error occurred ({code}) for key {key}")
+        self.response = {"Error": {"Code": code}}
+
+
+class LocalS3:
+    """Thread-safe in-memory implementation of the S3 client calls the backend makes"""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs) -> dict:
+        self.latency.sleep()
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self._lock:
+            self.objects[(Bucket, Key)] = (data, kwargs.get("ContentType", "binary/octet-stream"))
+        return {"ETag": uuid.uuid4().hex}
+
+    def _get(self, Bucket: str, Key: str):
+        with self._lock:
+            if (Bucket, Key) not in self.objects:
+                raise LocalS3Error("NoSuchKey", Key)
+            return self.objects[(Bucket, Key)]
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.latency.sleep()
+        data, content_type = self._get(Bucket, Key)
+        return {"Body": _StreamingBody(data), "ContentType": content_type, "ContentLength": len(data)}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.latency.sleep()
+        data, content_type = self._get(Bucket, Key)
+        return {"ContentType": content_type, "ContentLength": len(data)}
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, ExtraArgs: Optional[dict] = None, **kwargs) -> None:
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj, **(ExtraArgs or {}))
+
+    def download_fileobj(self, Bucket: str, Key: str, Fileobj, **kwargs) -> None:
+        self.latency.sleep()
+        data, _ = self._get(Bucket, Key)
+        Fileobj.write(data)
+
+
+class DiskS3(LocalS3):
+    """LocalS3 that keeps objects in files and streams them, so it adds no per-object memory"""
+
+    def __init__(self, latency: Latency, directory: str):
+        super().__init__(latency)
+        self.directory = directory
+
+    def _path(self, Bucket: str, Key: str) -> str:
+        return os.path.join(self.directory, uuid.uuid5(uuid.NAMESPACE_URL, f"{Bucket}/{Key}").hex)
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs) -> dict:
+        self.latency.sleep()
+        path = self._path(Bucket, Key)
+        with open(path + ".tmp", 'wb') as f:
+            if hasattr(Body, "read"):
+                shutil.copyfileobj(Body, f)
+            else:
+                f.write(Body)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self.objects[(Bucket, Key)] = (path, kwargs.get("ContentType", "binary/octet-stream"))
+        return {"ETag": uuid.uuid4().hex}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.latency.sleep()
+        path, content_type = self._get(Bucket, Key)
+        with open(path, 'rb') as f:
+            data = f.read()
+        return {"Body": _StreamingBody(data), "ContentType": content_type, "ContentLength": len(data)}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.latency.sleep()
+        path, content_type = self._get(Bucket, Key)
+        return {"ContentType": content_type, "ContentLength": os.path.getsize(path)}
+
+    def download_fileobj(self, Bucket: str, Key: str, Fileobj, **kwargs) -> None:
+        self.latency.sleep()
+        path, _ = self._get(Bucket, Key)
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, Fileobj)
+
+
+def make_moto_s3(bucket: str, region: str):
+    """Start moto's in-process AWS mock and create the bucket; returns the mock to stop later"""
+    from moto import mock_aws
+    import boto3
+
+    mock = mock_aws()
+    mock.start()
+    boto3.client("s3", region_name=region).create_bucket(
+        Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": region}
+    )
+    return mock
+
+
+def make_pdf(text: str = "", pages: int = 1) -> bytes:
+    """Tiny but well-formed PDF; the Upstage stub ignores the content, `text` only makes the hash unique"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (3 + i) for i in range(pages)) + b"] /Count %d >>" % pages,
+    ]
+    for _ in range(pages):
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>")
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n% " + text.encode("utf-8") + b"\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
@@ -0,0 +1,125 @@
+"""
+Peak Python heap used by the backend while it handles large PDFs.
+
+Every document is written to disk and posted through the Flask test client,
+so the request body is streamed from that file. S3 is DiskS3 and the Upstage
+stub discards uploads as it reads them, so whatever tracemalloc sees on top of
+the baseline comes from copies the backend makes. Two paths are measured:
+    upload - POST /api/pdf-upload (hash, S3 upload, parse, analysis)
+    toxic  - find_toxic_clauses_tool on that document (S3 download, parse)
+A path that buffers the whole file shows a peak of one or more times the
+document size; a streaming path stays flat as documents grow.
+
+Usage (from the backend directory):
+    python -m benchmarks.upload_memory --sizes-mb 1,8,32 --stub-embeddings
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import run
+from benchmarks.stubs import Latency, StubServer, load_fixtures, make_pdf
+
+CHUNK_SIZE = 2 ** 20
+
+
+def write_pdf(path: str, size: int, tag: str) -> int:
+    """Well-formed PDF followed by an incompressible comment block, `size` bytes in total"""
+    with open(path, 'wb') as f:
+        f.write(make_pdf(tag))
+        f.write(b"%")
+        while f.tell() < size:
+            f.write(os.urandom(min(CHUNK_SIZE, size - f.tell())))
+        return f.tell()
+
+
+def measure(fn) -> tuple:
+    """(result, peak bytes allocated above the starting point, seconds)"""
+    gc.collect()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, tracemalloc.get_traced_memory()[1] - baseline, elapsed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Peak memory of the upload and document download paths")
+    parser.add_argument("--sizes-mb", type=lambda v: [float(s) for s in v.split(",") if s], default=[1, 8, 32])
+    parser.add_argument("--cases", type=int, default=300, help="size of the synthetic precedent corpus")
+    parser.add_argument("--stub-embeddings", action="store_true",
+                        help="use a hashing encoder instead of loading KURE-v1")
+    parser.add_argument("--output", default=None, help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    bench_args = run.parse_args([
+        "--s3", "disk", "--s3-latency-ms", "0", "--llm-latency-ms", "0", "--upstage-latency-ms", "0",
+        "--tavily-latency-ms", "0", "--cases", str(args.cases)
+    ] + (["--stub-embeddings"] if args.stub_embeddings else []))
+    fixtures = load_fixtures()
+    workdir = tempfile.mkdtemp(prefix="financeguard-bench-")
+    stub = StubServer(fixtures, llm_latency=Latency(0), upstage_latency=Latency(0)).start()
+    run.prepare_environment(bench_args, workdir, stub)
+
+    results = []
+    try:
+        bench = run.Bench(bench_args, fixtures, workdir)
+        client = bench.app.test_client()
+        tracemalloc.start()
+        for size_mb in args.sizes_mb:
+            path = os.path.join(workdir, f"contract-{size_mb}mb.pdf")
+            size = write_pdf(path, int(size_mb * 2 ** 20), f"memory-{size_mb}-{time.time_ns()}")
+
+            def upload():
+                with open(path, 'rb') as f:
+                    response = client.post("/api/pdf-upload", data={"file": (f, "contract.pdf")},
+                                           content_type="multipart/form-data")
+                if response.status_code != 200:
+                    raise RuntimeError(f"upload failed with {response.status_code}")
+                return response.get_json()["pdf_id"]
+
+            document_id, upload_peak, upload_s = measure(upload)
+            _, toxic_peak, toxic_s = measure(lambda: bench._invoke_tool(
+                "find_toxic_clauses_tool", {"query": bench.queries[0], "file_id": document_id}
+            ))
+            row = {
+                "size_mb": round(size / 2 ** 20, 2),
+                "upload_peak_mb": round(upload_peak / 2 ** 20, 2),
+                "upload_s": round(upload_s, 3),
+                "toxic_peak_mb": round(toxic_peak / 2 ** 20, 2),
+                "toxic_s": round(toxic_s, 3),
+            }
+            results.append(row)
+            print(
+                f"{row['size_mb']:>7.1f}MB  upload peak={row['upload_peak_mb']:>7.2f}MB "
+                f"({upload_peak / size:.2f}x)  toxic peak={row['toxic_peak_mb']:>7.2f}MB ({toxic_peak / size:.2f}x)"
+            )
+            os.remove(path)
+        tracemalloc.stop()
+    finally:
+        stub.stop()
+
+    report = {"settings": {k: v for k, v in vars(args).items() if k != "output"}, "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Production server settings (from the backend directory):
+
+    gunicorn -c gunicorn.conf.py
+
+The master imports the app and preloads the embedding model and case
+embeddings before forking, so workers share those pages copy-on-write
+instead of each loading its own copy. See src/prefork.py.
+"""
+
+import logging
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.logging_config import configure_logging
+
+configure_logging()
+logger = logging.getLogger("gunicorn.conf")
+
+wsgi_app = "src.api.routes:app"
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))  # requests mostly wait on LLM calls
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 300))  # dispute simulation can take minutes
+preload_app = True
+
+
+def on_starting(server):
+    # Runs in the master after the app has been preloaded
+    from src import prefork
+    from src.api.routes import tools
+    prefork.preload(tools)
+
+
+def post_fork(server, worker):
+    from src import prefork
+    from src.api.routes import app
+    prefork.after_fork(server.cfg.workers, app)
+
+
+def post_worker_init(worker):
+    from src import prefork, startup
+    from src.api.routes import tools
+    # Builds what could not be shared (the agent graph); the rest is inherited
+    startup.start(tools)
+    memory = prefork.process_memory()
+    logger.info(
+        f"Worker {worker.pid} ready: uss={memory['uss'] / 2 ** 20:.1f}MB "
+        f"pss={memory['pss'] / 2 ** 20:.1f}MB rss={memory['rss'] / 2 ** 20:.1f}MB"
+    )
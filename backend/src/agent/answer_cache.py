@@ -0,0 +1,109 @@
+"""Per-document semantic cache of final chat answers, checked before the agent graph runs"""
+
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from src.config import (
+    ANSWER_CACHE_MAX_DOCUMENTS, ANSWER_CACHE_MAX_PER_DOCUMENT, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL
+)
+from src.telemetry import metrics
+from src.tools.embeddings import get_embedding_model
+from src.tools.lexical import tokenize
+from src.tools.search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+
+def answer_scope(file_id: str, tools: List) -> str:
+    """Cache partition: the document (its ID is the content hash, i.e. the version) and the tool set"""
+    return f"{file_id}:{','.join(sorted(tool.name for tool in tools))}"
+
+
+def question_signature(query: str) -> frozenset:
+    """Statute references, case numbers and numbers of a question
+
+    Questions that differ only in these ("제5조 해지 조건은?" / "제7조 해지 조건은?")
+    embed almost identically but ask about different things.
+    """
+    return frozenset(token for token in tokenize(query) if any(c.isdigit() for c in token))
+
+
+def is_cacheable(response: dict) -> bool:
+    return response.get("type") != "error" and response.get("status") != "error"
+
+
+class AnswerCache:
+    """Structured responses keyed by question, one semantic SearchCache per scope
+
+    A question matches a cached one when it normalizes to the same text, or its
+    embedding is at least `threshold` similar and it names the same articles,
+    case numbers and numbers. Every hit counts the latency of the original
+    agent run as saved.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_per_document: int = ANSWER_CACHE_MAX_PER_DOCUMENT,
+                 max_documents: int = ANSWER_CACHE_MAX_DOCUMENTS, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 model=get_embedding_model):
+        self.ttl = ttl
+        self.max_per_document = max_per_document
+        self.max_documents = max_documents
+        self.threshold = threshold
+        self.model = model
+        self._scopes = OrderedDict()  # scope -> SearchCache
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "saved_seconds": 0.0}
+
+    def _cache(self, scope: str, create: bool = False) -> Optional[SearchCache]:
+        with self._lock:
+            cache = self._scopes.get(scope)
+            if cache is None and create:
+                cache = self._scopes[scope] = SearchCache(
+                    ttl=self.ttl, max_size=self.max_per_document, model=self.model, semantic_threshold=self.threshold,
+                    signature=question_signature
+                )
+                while len(self._scopes) > self.max_documents:
+                    self._scopes.popitem(last=False)
+            if cache is not None:
+                self._scopes.move_to_end(scope)
+            return cache
+
+    def get(self, scope: str, query: str) -> Optional[dict]:
+        cache = self._cache(scope)
+        entry = cache.get(query) if cache is not None else None
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+                self.stats["saved_seconds"] += entry["seconds"]
+        metrics.inc("financeguard_answer_cache_total", help="Chat answer cache lookups",
+                    result="hit" if entry is not None else "miss")
+        if entry is None:
+            return None
+        metrics.inc("financeguard_answer_cache_saved_seconds_total", entry["seconds"],
+                    help="Agent run time avoided by answer cache hits")
+        return copy.deepcopy(entry["response"])
+
+    def put(self, scope: str, query: str, response: dict, seconds: float) -> None:
+        self._cache(scope, create=True).put(query, {"response": copy.deepcopy(response), "seconds": seconds})
+        with self._lock:
+            self.stats["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats, documents=len(self._scopes))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+answer_cache = AnswerCache()
+
+metrics.register_collector("financeguard_answer_cache", answer_cache.get_stats)
@@ -1,6 +1,11 @@
 import os
+import contextvars
 import json
 import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Dict, Any, List, Optional, Union, TypedDict
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -12,19 +17,22 @@ from langchain_core.messages import ToolMessage, SystemMessage, HumanMessage, AI
 from langchain_openai import ChatOpenAI
 from src.config import FORMAT_PROMPT_PATH
 
-import boto3
-from botocore.config import Config
-
 # Local imports
 from .state import AgentState
 from .processors import extract_response_from_messages
-
-BUCKET_NAME = os.environ.get('BUCKET_NAME', 'wetube-gwanwoo')
-s3 = boto3.client('s3',
-    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-    region_name='ap-northeast-2',
-    config=Config(signature_version='s3v4')
+from .router import IntentRouter
+from .memory import get_checkpointer, trim_history, response_to_text
+from .answer_cache import answer_cache, answer_scope, is_cacheable
+from src.telemetry import span, traced, metrics
+from src.serialization import dumps
+from src.logging_config import log_payload
+from src.config import (
+    ANSWER_CACHE_ENABLED,
+    FAST_ROUTER_ENABLED,
+    TOOL_MAX_WORKERS,
+    TOOL_TIMEOUTS,
+    TOOL_TIMEOUT_DEFAULT,
+    TOOL_RESULT_CACHE_SIZE
 )
 
 # Load environment variables
@@ -34,6 +42,46 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How each tool's output becomes the final response:
+#   "raw"  - already structured; extract_response_from_messages parses it directly
+#   "tool" - already formatted inside CustomToolNode (web search)
+#   "llm"  - sent through the formatter node
+TOOL_FORMAT_POLICIES = {
+    "find_toxic_clauses_tool": "raw",
+    "simulate_dispute_tool": "raw",
+    "find_case_tool": "raw",
+    "web_search_tool": "tool",
+}
+DEFAULT_FORMAT_POLICY = "llm"
+
+# Tools whose result depends only on the uploaded document, not on the query
+DOCUMENT_ONLY_TOOLS = {"find_toxic_clauses_tool"}
+
+# Compiled agents and fast-path routers, keyed by tool names
+_agents = {}
+_fast_routers = {}
+_cache_lock = threading.Lock()
+
+class _TimedCall:
+    """Tool call whose timeout counts from when it starts running, not from when it was queued"""
+
+    def __init__(self, fn, timeout: float) -> None:
+        self.fn = fn
+        self.timeout = timeout
+        self.started = threading.Event()
+        self.started_at = None
+
+    def __call__(self, *args):
+        self.started_at = time.monotonic()
+        self.started.set()
+        return self.fn(*args)
+
+    def result(self, future):
+        # A call queued behind others gets up to one timeout to start
+        if not self.started.wait(self.timeout):
+            raise FutureTimeoutError()
+        return future.result(timeout=max(self.started_at + self.timeout - time.monotonic(), 0))
+
 class CustomToolNode:
     """Custom implementation of ToolNode that properly handles file IDs"""
     
@@ -46,10 +94,6 @@ class CustomToolNode:
     def format_web_search_results(self, raw_results: str) -> str:
         """Format web search results into a conversational response"""
         try:
-            # Load the formatting prompt
-            with open(FORMAT_PROMPT_PATH, 'r', encoding='utf-8') as f:
-                format_prompt = f.read()
-            
             # Create a special prompt for web search formatting
             web_search_format_prompt = """
             You are a helpful financial assistant. Format the following web search results into a natural, 
@@ -69,11 +113,13 @@ class CustomToolNode:
             
             logger.info("Formatting web search results...")
             
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages_for_formatting,
-                temperature=0.3,
-            )
+            with span("llm.format_web_search", model="gpt-4o-mini") as llm_span:
+                response = self.openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages_for_formatting,
+                    temperature=0.3,
+                )
+                llm_span.record_usage(response)
             
             formatted_response = response.choices[0].message.content.strip()
             logger.info("Successfully formatted web search results")
@@ -82,6 +128,130 @@ class CustomToolNode:
             logger.error(f"Error formatting web search results: {e}")
             return f"검색 결과: {raw_results}"
             
+    def _error_messages(self, tool_name: str, tool_id: str, e: Exception) -> list:
+        """Build the messages reported for a failed tool call"""
+        results = []
+        # Handle specific tool errors
+        if tool_name == "simulate_dispute_tool":
+            error_msg = {
+                "simulations": [
+                    f"계약서 분석 중 오류가 발생했습니다: {str(e)}",
+                    "파일이 올바르게 업로드되었는지 확인하시고, 다시 시도해 주세요."
+                ]
+            }
+            results.append(
+                ToolMessage(
+                    content=json.dumps(error_msg, ensure_ascii=False),
+                    name=tool_name,
+                    tool_call_id=tool_id,
+                )
+            )
+        elif tool_name == "web_search_tool":
+            error_msg = f"검색 중 오류가 발생했습니다: {str(e)}"
+            results.append(
+                ToolMessage(
+                    content=error_msg,
+                    name=tool_name,
+                    tool_call_id=tool_id,
+                )
+            )
+            # Add assistant message for better UX
+            results.append({
+                "role": "assistant", 
+                "content": error_msg
+            })
+        elif tool_name == "find_toxic_clauses_tool":
+            error_msg = [{"error": f"독소조항 분석 중 오류가 발생했습니다: {str(e)}"}]
+            results.append(
+                ToolMessage(
+                    content=json.dumps(error_msg, ensure_ascii=False),
+                    name=tool_name,
+                    tool_call_id=tool_id,
+                )
+            )
+        else:
+            results.append(
+                ToolMessage(
+                    content=f"Error: {str(e)}",
+                    name=tool_name,
+                    tool_call_id=tool_id,
+                )
+            )
+        return results
+
+    def _cached_messages(self, tool_name: str, tool_id: str, content: str) -> list:
+        """Rebuild the messages of a tool result cached from an earlier turn"""
+        results = [ToolMessage(content=content, name=tool_name, tool_call_id=tool_id)]
+        if tool_name == "web_search_tool":
+            results.append({"role": "assistant", "content": content})
+        return results
+
+    def _run_tool_call(self, tool, tool_name: str, tool_args, tool_id: str, file_id) -> list:
+        """Execute a single tool call and return its result messages"""
+        logger.info(f"Executing tool: {tool_name}")
+        
+        try:
+            with span(f"tool.{tool_name}"):
+                # Create a copy of args to avoid modifying the original
+                final_args = dict(tool_args) if isinstance(tool_args, dict) else {}
+            
+                # Special handling for tools that need file ID
+                if tool_name == "simulate_dispute_tool" and file_id:
+                    logger.info("Adding file_id to simulation tool arguments")
+                    final_args["file_id"] = file_id
+                
+                    # Make sure query is in args
+                    if "query" not in final_args and isinstance(tool_args, dict):
+                        final_args["query"] = tool_args.get("query", "계약서 시뮬레이션")
+                    
+                    result = tool.invoke(final_args)
+                elif tool_name == "find_toxic_clauses_tool" and file_id:
+                    logger.info("Adding file_id to toxic clauses tool arguments")
+                    final_args["file_id"] = file_id
+                
+                    # Make sure query is in args
+                    if "query" not in final_args and isinstance(tool_args, dict):
+                        final_args["query"] = tool_args.get("query", "독소조항 분석")
+                    
+                    result = tool.invoke(final_args)
+                else:
+                    result = tool.invoke(tool_args)
+            
+                # For web search tool, format the results before returning
+                if tool_name == "web_search_tool":
+                    logger.info("Formatting web search results through LLM")
+                    # Convert result to string for formatting
+                    result_str = json.dumps(result, ensure_ascii=False)
+                    # Format the results through LLM
+                    formatted_result = self.format_web_search_results(result_str)
+                    return [
+                        # Create a tool message with formatted results
+                        ToolMessage(
+                            content=formatted_result,
+                            name=tool_name,
+                            tool_call_id=tool_id,
+                        ),
+                        # Also append an assistant message to make it more conversational
+                        {
+                            "role": "assistant", 
+                            "content": formatted_result
+                        }
+                    ]
+            
+                # Create a regular tool message for other tools
+                return [
+                    ToolMessage(
+                        content=dumps(result),
+                        name=tool_name,
+                        tool_call_id=tool_id,
+                    )
+                ]
+        except Exception as e:
+            logger.error(f"Error executing tool {tool_name}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return self._error_messages(tool_name, tool_id, e)
+            
     def __call__(self, state):
         # Get the messages and file ID from the state
         messages = state.get("messages", [])
@@ -106,130 +276,76 @@ class CustomToolNode:
         if not tool_calls:
             return state
             
-        # Process each tool call
-        results = []
+        tool_results = dict(state.get("tool_results") or {})
+        
+        # Tool calls from one LLM turn run concurrently, in a pool of this turn only, so
+        # concurrent requests and abandoned (timed out) calls never hold up each other
+        executor = ThreadPoolExecutor(max_workers=max(1, min(len(tool_calls), TOOL_MAX_WORKERS)),
+                                      thread_name_prefix="tool")
+        try:
+            return self._run_tool_calls(executor, tool_calls, file_id, tool_results)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_tool_calls(self, executor: ThreadPoolExecutor, tool_calls: list, file_id, tool_results: dict) -> dict:
+        # Start every tool call concurrently
+        pending = []
         for tool_call in tool_calls:
             tool_name = tool_call.get("name") if isinstance(tool_call, dict) else tool_call.name
             tool_args = tool_call.get("args") if isinstance(tool_call, dict) else tool_call.args
             tool_id = tool_call.get("id") if isinstance(tool_call, dict) else tool_call.id
             
-            logger.info(f"Executing tool: {tool_name}")
-            
             # Find the right tool
             tool = self.tools_dict.get(tool_name)
             
             if not tool:
                 logger.error(f"Tool not found: {tool_name}")
                 continue
-                
+            
+            cache_key = tool_result_key(tool_name, tool_args, file_id)
+            if cache_key in tool_results:
+                logger.info(f"Reusing {tool_name} result from an earlier turn")
+                pending.append((tool_name, tool_id, cache_key, None, None))
+                continue
+            
+            call = _TimedCall(self._run_tool_call, TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT_DEFAULT))
+            # Run in a copy of the current context so the tool's spans nest under this node
+            future = executor.submit(
+                contextvars.copy_context().run, call, tool, tool_name, tool_args, tool_id, file_id
+            )
+            pending.append((tool_name, tool_id, cache_key, future, call))
+        
+        # Collect results in the original call order; a failure only affects its own call
+        results = []
+        for tool_name, tool_id, cache_key, future, call in pending:
+            if future is None:
+                results.extend(self._cached_messages(tool_name, tool_id, tool_results[cache_key]))
+                continue
             try:
-                # Create a copy of args to avoid modifying the original
-                final_args = dict(tool_args) if isinstance(tool_args, dict) else {}
-                
-                # Special handling for tools that need file ID
-                if tool_name == "simulate_dispute_tool" and file_id:
-                    logger.info("Adding file_id to simulation tool arguments")
-                    final_args["file_id"] = file_id
-                    
-                    # Make sure query is in args
-                    if "query" not in final_args and isinstance(tool_args, dict):
-                        final_args["query"] = tool_args.get("query", "계약서 시뮬레이션")
-                        
-                    result = tool.invoke(final_args)
-                elif tool_name == "find_toxic_clauses_tool" and file_id:
-                    logger.info("Adding file_id to toxic clauses tool arguments")
-                    final_args["file_id"] = file_id
-                    
-                    # Make sure query is in args
-                    if "query" not in final_args and isinstance(tool_args, dict):
-                        final_args["query"] = tool_args.get("query", "독소조항 분석")
-                        
-                    result = tool.invoke(final_args)
-                else:
-                    result = tool.invoke(tool_args)
-                
-                # For web search tool, format the results before returning
-                if tool_name == "web_search_tool":
-                    logger.info("Formatting web search results through LLM")
-                    # Convert result to string for formatting
-                    result_str = json.dumps(result, ensure_ascii=False)
-                    # Format the results through LLM
-                    formatted_result = self.format_web_search_results(result_str)
-                    # Create a tool message with formatted results
-                    results.append(
-                        ToolMessage(
-                            content=formatted_result,
-                            name=tool_name,
-                            tool_call_id=tool_id,
-                        )
-                    )
-                    # Also append an assistant message to make it more conversational
-                    results.append({
-                        "role": "assistant", 
-                        "content": formatted_result
-                    })
-                else:
-                    # Create a regular tool message for other tools
-                    results.append(
-                        ToolMessage(
-                            content=json.dumps(result, ensure_ascii=False),
-                            name=tool_name,
-                            tool_call_id=tool_id,
-                        )
-                    )
-            except Exception as e:
-                logger.error(f"Error executing tool {tool_name}: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                
-                # Handle specific tool errors
-                if tool_name == "simulate_dispute_tool":
-                    error_msg = {
-                        "simulations": [
-                            f"계약서 분석 중 오류가 발생했습니다: {str(e)}",
-                            "파일이 올바르게 업로드되었는지 확인하시고, 다시 시도해 주세요."
-                        ]
-                    }
-                    results.append(
-                        ToolMessage(
-                            content=json.dumps(error_msg, ensure_ascii=False),
-                            name=tool_name,
-                            tool_call_id=tool_id,
-                        )
-                    )
-                elif tool_name == "web_search_tool":
-                    error_msg = f"검색 중 오류가 발생했습니다: {str(e)}"
-                    results.append(
-                        ToolMessage(
-                            content=error_msg,
-                            name=tool_name,
-                            tool_call_id=tool_id,
-                        )
-                    )
-                    # Add assistant message for better UX
-                    results.append({
-                        "role": "assistant", 
-                        "content": error_msg
-                    })
-                elif tool_name == "find_toxic_clauses_tool":
-                    error_msg = [{"error": f"독소조항 분석 중 오류가 발생했습니다: {str(e)}"}]
-                    results.append(
-                        ToolMessage(
-                            content=json.dumps(error_msg, ensure_ascii=False),
-                            name=tool_name,
-                            tool_call_id=tool_id,
-                        )
-                    )
-                else:
-                    results.append(
-                        ToolMessage(
-                            content=f"Error: {str(e)}",
-                            name=tool_name,
-                            tool_call_id=tool_id,
-                        )
-                    )
+                messages_for_call = call.result(future)
+            except FutureTimeoutError:
+                # A queued call is dropped; a running one finishes in the background, unused
+                state = "running" if call.started.is_set() else "queued"
+                future.cancel()
+                logger.error(f"Tool {tool_name} timed out ({state})")
+                metrics.inc("financeguard_tool_timeouts_total", help="Tool calls abandoned after their timeout",
+                            tool=tool_name, state=state)
+                messages_for_call = self._error_messages(
+                    tool_name, tool_id, TimeoutError("도구 실행 시간이 초과되었습니다.")
+                )
+            results.extend(messages_for_call)
+            
+            # Remember successful results so follow-up turns can reuse them
+            tool_message = messages_for_call[0] if messages_for_call else None
+            if isinstance(tool_message, ToolMessage) and not _is_error_output(tool_message.content):
+                tool_results.pop(cache_key, None)
+                tool_results[cache_key] = tool_message.content
         
-        return {"messages": results}
+        # Bound the cache, dropping the oldest results first
+        while len(tool_results) > TOOL_RESULT_CACHE_SIZE:
+            tool_results.pop(next(iter(tool_results)))
+        
+        return {"messages": results, "tool_results": tool_results}
 
 def create_formatter(format_prompt_path=FORMAT_PROMPT_PATH):
     """Create a response formatter function"""
@@ -294,11 +410,13 @@ def create_formatter(format_prompt_path=FORMAT_PROMPT_PATH):
                     {"role": "user", "content": last_message_content}
                 ]
                 
-                summary_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages_for_formatting,
-                    temperature=0.1,
-                )
+                with span("llm.format_response", model="gpt-4o-mini") as llm_span:
+                    summary_response = client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=messages_for_formatting,
+                        temperature=0.1,
+                    )
+                    llm_span.record_usage(summary_response)
                 
                 formatted_response = summary_response.choices[0].message.content.strip()
                 # Don't append if we already have a direct chatbot response
@@ -317,6 +435,43 @@ def create_formatter(format_prompt_path=FORMAT_PROMPT_PATH):
             
     return format_response
 
+def tool_result_key(tool_name: str, tool_args, file_id) -> str:
+    """Cache key for a tool result; document tools that ignore the query are keyed by file only"""
+    if tool_name in DOCUMENT_ONLY_TOOLS:
+        return f"{tool_name}:{file_id}"
+    args = tool_args if isinstance(tool_args, dict) else {}
+    return f"{tool_name}:{file_id}:{json.dumps(args, ensure_ascii=False, sort_keys=True)}"
+
+def _is_error_output(content: str) -> bool:
+    """Check whether a tool message carries an error payload instead of a result"""
+    try:
+        parsed = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return content.startswith("Error:") if isinstance(content, str) else False
+    if isinstance(parsed, list) and parsed and isinstance(parsed[0], dict):
+        parsed = parsed[0]
+    return isinstance(parsed, dict) and bool(parsed.get("error"))
+
+def tool_format_router(state: AgentState):
+    """
+    Decide whether tool output needs the LLM formatter.
+    Only tools with the "llm" policy (or tool errors, which read better as a
+    sentence) go through the formatter; everything else ends the graph.
+    """
+    tool_messages = [
+        message for message in state.get("messages", [])
+        if isinstance(message, ToolMessage)
+    ]
+    
+    for message in tool_messages:
+        policy = TOOL_FORMAT_POLICIES.get(message.name, DEFAULT_FORMAT_POLICY)
+        if policy == "llm" or (policy == "raw" and _is_error_output(message.content)):
+            logger.info(f"Formatting output of {message.name} with the LLM")
+            return "formatter"
+    
+    logger.info("Tool output already structured, skipping formatter")
+    return END
+
 def llm_tool_router(state: AgentState):
     """
     Custom router function that uses LLM's judgment to determine next step.
@@ -346,8 +501,12 @@ def llm_tool_router(state: AgentState):
     else:
         return "formatter"
 
-def create_chatbot_node(tools):
-    """Create the chatbot node for the agent"""
+def create_chatbot_node(tools, fast_router: Optional[IntentRouter] = None):
+    """Create the chatbot node for the agent
+
+    If a fast-path router is given, confidently classified queries are sent
+    straight to a tool and the LLM tool selection call is skipped.
+    """
     
     # Create LangChain ChatOpenAI instance with lower temperature for more reliable tool selection
     llm = ChatOpenAI(
@@ -420,7 +579,7 @@ def create_chatbot_node(tools):
     # Format the prompt with actual tool descriptions
     formatted_tool_selection_prompt = tool_selection_prompt.format(tool_list="\n".join(tool_descriptions))
     
-    print(formatted_tool_selection_prompt)
+    log_payload(logger, "Tool selection prompt", formatted_tool_selection_prompt)
     
     # Bind tools to the LLM
     llm_with_tools = llm.bind_tools(tools)
@@ -464,6 +623,22 @@ def create_chatbot_node(tools):
         
         # Log the message before processing
         logger.info(f"Processing message: {last_user_message}")
+
+        # Fast path: route to a tool by embedding similarity, skipping the LLM round-trip
+        if fast_router is not None and isinstance(last_user_message, str) and last_user_message.strip():
+            tool_name = fast_router.route(last_user_message, file_available=bool(file_id))
+            if tool_name:
+                return {"messages": [{
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [{
+                        "name": tool_name,
+                        "args": {"query": last_user_message},
+                        "id": f"fastpath_{uuid.uuid4().hex}",
+                        "type": "tool_call"
+                    }]
+                }]}
+
         # Add file context to the user message if available
         if file_id:
             file_context = "사용자가 계약서 파일을 업로드했습니다. 필요한 경우 계약서 분석 도구를 사용하세요."
@@ -472,11 +647,14 @@ def create_chatbot_node(tools):
         
         # Add system message with the tool selection prompt and file context
         system_msg = SystemMessage(content=f"{formatted_tool_selection_prompt}\n\n{file_context}")
-        messages_with_system = [system_msg] + (messages if isinstance(messages, list) else [messages])
+        history = state.get("history") or []
+        messages_with_system = [system_msg] + history + (messages if isinstance(messages, list) else [messages])
         
         # Use the LLM with the enhanced system prompt
         try:
-            response = llm_with_tools.invoke(messages_with_system)
+            with span("llm.tool_selection") as llm_span:
+                response = llm_with_tools.invoke(messages_with_system)
+                llm_span.record_usage(response)
             # Log the response for debugging
             logger.info("LLM Response:")
             logger.info(f"Response type: {type(response)}")
@@ -504,11 +682,31 @@ def create_chatbot_node(tools):
     
     return chatbot
 
-def create_legal_assistant_agent(tools) -> StateGraph:
-    """Create the LangGraph workflow for the legal assistant agent"""
+def get_fast_router(tools) -> IntentRouter:
+    """Return the shared fast-path router for this tool set"""
+    key = tuple(tool.name for tool in tools)
+    with _cache_lock:
+        if key not in _fast_routers:
+            _fast_routers[key] = IntentRouter(list(key))
+        return _fast_routers[key]
+
+def get_fast_router_stats() -> dict:
+    """Fast-path routing counters (including hit rate) for every tool set"""
+    with _cache_lock:
+        routers = dict(_fast_routers)
+    return {",".join(key): router.get_stats() for key, router in routers.items()}
+
+metrics.register_collector("financeguard_fast_router", get_fast_router_stats)
+
+def create_legal_assistant_agent(tools, checkpointer=None) -> StateGraph:
+    """Create the LangGraph workflow for the legal assistant agent
+
+    With a checkpointer, state (history and tool results) is persisted per thread ID.
+    """
     
     # Create nodes
-    chatbot_node = create_chatbot_node(tools)
+    fast_router = get_fast_router(tools) if FAST_ROUTER_ENABLED else None
+    chatbot_node = create_chatbot_node(tools, fast_router)
     tool_node = CustomToolNode(tools=tools)
     formatter_node = create_formatter()
     
@@ -516,9 +714,9 @@ def create_legal_assistant_agent(tools) -> StateGraph:
     workflow = StateGraph(AgentState)
     
     # Add nodes
-    workflow.add_node("chatbot", chatbot_node)
-    workflow.add_node("tools", tool_node)
-    workflow.add_node("formatter", formatter_node)
+    workflow.add_node("chatbot", traced("agent.chatbot")(chatbot_node))
+    workflow.add_node("tools", traced("agent.tools")(tool_node))
+    workflow.add_node("formatter", traced("agent.formatter")(formatter_node))
     
     # Use our custom LLM-based router instead of tools_condition
     workflow.add_conditional_edges(
@@ -531,16 +729,37 @@ def create_legal_assistant_agent(tools) -> StateGraph:
         }
     )
     
-    # Edge from tools to formatter
-    workflow.add_edge("tools", "formatter")
+    # Skip the formatter for tools whose output is already structured or formatted
+    workflow.add_conditional_edges(
+        "tools",
+        tool_format_router,
+        {
+            "formatter": "formatter",
+            END: END
+        }
+    )
     
     # Set entry point
     workflow.set_entry_point("chatbot")
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+def get_legal_assistant_agent(tools, persistent: bool = False):
+    """Return the compiled agent for this tool set, building it only once"""
+    key = (tuple(tool.name for tool in tools), persistent)
+    agent = _agents.get(key)
+    if agent is None:
+        agent = create_legal_assistant_agent(tools, checkpointer=get_checkpointer() if persistent else None)
+        with _cache_lock:
+            agent = _agents.setdefault(key, agent)
+    return agent
 
-def process_query(query: str, tools: List, file_id: Optional[str] = None) -> dict:
-    """Process a user query and return the response in the appropriate format"""
+def process_query(query: str, tools: List, file_id: Optional[str] = None, thread_id: Optional[str] = None) -> dict:
+    """Process a user query and return the response in the appropriate format
+
+    With a thread ID the conversation is persisted: earlier turns (trimmed to the
+    history budget) are shown to the LLM and earlier tool results are reused.
+    """
     try:
         logger.info(f"Processing query: '{query}'")
         
@@ -549,26 +768,60 @@ def process_query(query: str, tools: List, file_id: Optional[str] = None) -> dic
             # Add additional debug log
             logger.info(f"File ID type: {type(file_id)}")
         
-        # Create the agent
-        agent = create_legal_assistant_agent(tools)
+        # Reuse the compiled agent (prompt, LLM client and router are built once)
+        agent = get_legal_assistant_agent(tools, persistent=bool(thread_id))
+        config = {"configurable": {"thread_id": thread_id}} if thread_id else None
         
-        # Initial state with messages and file_id
-        # Make sure file_id is explicitly included
-        initial_state = {
-            "messages": [{"role": "user", "content": query}],
-            "file_id": file_id,  # This is the important field that's not getting through
-            "error": ""
-        }
+        # Load the conversation so far
+        history, tool_results = [], {}
+        if config:
+            previous = agent.get_state(config).values
+            history = trim_history(previous.get("history") or [])
+            tool_results = previous.get("tool_results") or {}
+            logger.info(f"Thread {thread_id}: {len(history)} history messages, {len(tool_results)} cached tool results")
         
-        # Debug log for initial state
-        logger.info(f"Initial state: {initial_state}")
+        # The same question about the same document was answered recently. Follow-up
+        # questions depend on earlier turns, so only a thread's first question is looked up.
+        scope = answer_scope(file_id, tools) if ANSWER_CACHE_ENABLED and file_id and not history else None
+        response = answer_cache.get(scope, query) if scope else None
+        if response is not None:
+            logger.info(f"Answered '{query}' from the answer cache")
+        else:
+            # Initial state with messages and file_id
+            # Make sure file_id is explicitly included
+            initial_state = {
+                "messages": [{"role": "user", "content": query}],
+                "file_id": file_id,  # This is the important field that's not getting through
+                "error": "",
+                "history": history,
+                "tool_results": tool_results
+            }
+            
+            # Debug log for initial state (sampled, bounded)
+            log_payload(logger, "Initial state", initial_state)
+            
+            # Run the agent
+            started = time.perf_counter()
+            with span("agent.invoke", persistent=bool(thread_id)):
+                result = agent.invoke(initial_state, config)
+            logger.info(f"Agent execution completed, result keys: {result.keys()}")
+            
+            # Extract the final response
+            response = extract_response_from_messages(result.get("messages", []))
+            
+            # Only answers that did not depend on earlier turns are reused for other conversations
+            if scope and is_cacheable(response):
+                answer_cache.put(scope, query, response, time.perf_counter() - started)
         
-        # Run the agent
-        result = agent.invoke(initial_state)
-        logger.info(f"Agent execution completed, result keys: {result.keys()}")
+        # Record this turn for follow-up questions
+        if config:
+            history = trim_history(history + [
+                {"role": "user", "content": query},
+                {"role": "assistant", "content": response_to_text(response)}
+            ])
+            agent.update_state(config, {"history": history})
         
-        # Extract the final response
-        return extract_response_from_messages(result.get("messages", []))
+        return response
         
     except Exception as e:
         logger.error(f"Uncaught error during agent execution: {e}")
@@ -0,0 +1,71 @@
+"""Conversation persistence: checkpointer setup and bounded history"""
+
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List
+
+from src.config import CHECKPOINT_DB_PATH, CONVERSATION_MAX_TURNS, CONVERSATION_TOKEN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Longest text kept for a single history entry
+MAX_HISTORY_ENTRY_CHARS = 2000
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+def get_checkpointer():
+    """Return the process-wide LangGraph checkpointer
+
+    Conversations are stored in SQLite at CHECKPOINT_DB_PATH. If the SQLite
+    checkpointer package is not installed, an in-memory saver is used instead
+    (state then lasts only as long as the process).
+    """
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            try:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+                connection = sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False)
+                _checkpointer = SqliteSaver(connection)
+                logger.info(f"Using SQLite checkpointer at {CHECKPOINT_DB_PATH}")
+            except ImportError:
+                from langgraph.checkpoint.memory import MemorySaver
+                logger.warning("langgraph-checkpoint-sqlite not installed, conversations are kept in memory only")
+                _checkpointer = MemorySaver()
+        return _checkpointer
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for mixed Korean/English text (about 2 characters per token)"""
+    return len(text) // 2 + 1
+
+def trim_history(history: List[Dict[str, str]], max_turns: int = CONVERSATION_MAX_TURNS,
+                 token_budget: int = CONVERSATION_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """Keep the most recent messages that fit both the turn limit and the token budget"""
+    recent = history[-max_turns * 2:] if max_turns > 0 else []
+
+    trimmed = []
+    used = 0
+    for message in reversed(recent):
+        cost = estimate_tokens(message.get("content", ""))
+        if used + cost > token_budget:
+            break
+        trimmed.append(message)
+        used += cost
+    trimmed.reverse()
+
+    # Never start the history with an orphaned assistant reply
+    while trimmed and trimmed[0].get("role") != "user":
+        trimmed.pop(0)
+    return trimmed
+
+def response_to_text(response: Dict[str, Any]) -> str:
+    """Condense a structured agent response into text for the conversation history"""
+    text = response.get("message") if response.get("type") == "simple_dialogue" else None
+    if not isinstance(text, str) or not text:
+        text = response.get("response")
+    if not isinstance(text, str) or not text:
+        text = json.dumps(response, ensure_ascii=False)
+    return text[:MAX_HISTORY_ENTRY_CHARS]
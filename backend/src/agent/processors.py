@@ -2,6 +2,7 @@ import json
 import logging
 from typing import Dict, Any
 import re
+from src.logging_config import Payload, log_payload
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -101,18 +102,11 @@ def extract_response_from_messages(final_messages, logger=logger):
     if not final_messages:
         return {"type": "error", "response": "응답을 생성하지 못했습니다.", "status": "error", "message": "No response generated"}
     
-    # Enhanced logging
-    logger.info("=" * 50)
-    logger.info("Processing final messages:")
-    for i, msg in enumerate(final_messages):
-        logger.info(f"Message {i}:")
-        logger.info(f"Type: {type(msg)}")
-        logger.info(f"Class name: {msg.__class__.__name__ if hasattr(msg, '__class__') else 'No class'}")
-        if hasattr(msg, 'content'):
-            logger.info(f"Content: {msg.content[:100]}...")
-        elif isinstance(msg, dict) and 'content' in msg:  # Fixed: Changed 'message' to 'msg'
-            logger.info(f"Content: {msg['content'][:100]}...")
-    logger.info("="*50)
+    # One bounded debug line per message instead of several INFO lines
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, msg in enumerate(final_messages):
+            content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", None)
+            logger.debug("Message %d (%s): %s", i, msg.__class__.__name__, Payload(content, limit=200))
     
     # First, check if there's a direct simple response from the assistant 
     # This should have priority for simple queries
@@ -156,9 +150,7 @@ def extract_response_from_messages(final_messages, logger=logger):
                 try:
                     content_str = message.content
                     content = json.loads(content_str)
-                    
-                    print("=Content"*50)
-                    print(content)
+                    log_payload(logger, f"{tool_name} result", content)
                     
                     # Handle different tool types
                     if tool_name == "find_case_tool":
@@ -250,9 +242,7 @@ def process_find_case_result(content):
         else:
             content_str = str(content)
             
-        print(content)
-        print("="*50)
-        print(content_str)
+        log_payload(logger, "find_case_tool content", content_str)
 
         # Define regex pattern for case details
         pattern = r'제목:\s*(.*?)(?:\s*\n)\s*요약:\s*(.*?)(?:\s*\n)\s*핵심 포인트:\s*(.*?)(?:\s*\n)\s*판결 결과:\s*(.*?)$'
@@ -293,7 +283,7 @@ def process_find_case_result(content):
 def process_simulation_result(content):
     """Process simulate_dispute_tool results"""
     simulations = content.get("simulations", [])
-    print(simulations)
+    log_payload(logger, "Simulations", simulations)
     if not simulations:
         return {
             "type": "simple_dialogue", 
@@ -0,0 +1,131 @@
+"""Embedding-based fast-path router that picks a tool without an LLM call"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import FAST_ROUTER_THRESHOLD, FAST_ROUTER_MARGIN
+from src.tools.embeddings import get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+# Labelled example utterances per tool (the English ones mirror the tool selection prompt)
+TOOL_EXAMPLES: Dict[str, List[str]] = {
+    "find_toxic_clauses_tool": [
+        "Are there any toxic clauses in this contract?",
+        "Can you point out any unfair terms?",
+        "이 계약서에 독소조항이 있나요?",
+        "불리한 조항을 찾아줘",
+        "계약서에서 위험한 조항이 뭐야?",
+        "소비자에게 불공정한 약관이 있는지 알려줘",
+    ],
+    "simulate_dispute_tool": [
+        "What happens if I terminate the contract?",
+        "Will I be liable for a penalty?",
+        "What are the consequences of breaching this clause?",
+        "계약을 중도 해지하면 어떻게 돼?",
+        "위약금을 물어야 하나요?",
+        "이 조항을 어기면 어떤 분쟁이 생길 수 있는지 시뮬레이션해줘",
+    ],
+    "find_case_tool": [
+        "Are there any similar precedents?",
+        "How have courts ruled in cases like this?",
+        "비슷한 판례가 있나요?",
+        "이런 경우 법원은 어떻게 판결했어?",
+        "관련된 금융 분쟁 사례를 찾아줘",
+    ],
+    "web_search_tool": [
+        "What are the recent amendments to financial law?",
+        "What are the latest guidelines from the financial supervisory authority?",
+        "최근 금융소비자보호법 개정 내용이 뭐야?",
+        "금융감독원의 최신 가이드라인을 알려줘",
+        "요즘 예금 금리 동향은 어때?",
+    ],
+}
+
+# Tools that can only run on an uploaded contract
+FILE_TOOLS = {"simulate_dispute_tool", "find_toxic_clauses_tool"}
+
+
+class IntentRouter:
+    """Nearest-example intent classifier over KURE-v1 embeddings
+
+    A query is routed straight to a tool only when its best example similarity
+    clears `threshold` and leads the runner-up tool by `margin`; otherwise the
+    caller should fall back to the LLM tool selector.
+    """
+
+    def __init__(self, tool_names: List[str], examples: Dict[str, List[str]] = TOOL_EXAMPLES,
+                 threshold: float = FAST_ROUTER_THRESHOLD, margin: float = FAST_ROUTER_MARGIN, model=None):
+        self.examples = {name: examples[name] for name in tool_names if examples.get(name)}
+        self.threshold = threshold
+        self.margin = margin
+        self.model = model
+        self._labels = None
+        self._embeddings = None
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"queries": 0, "fast_path": 0, "fallback": 0, "per_tool": {name: 0 for name in self.examples}}
+
+    def _ensure_embeddings(self):
+        if self._embeddings is not None:
+            return
+        with self._init_lock:
+            if self._embeddings is not None:
+                return
+            if self.model is None:
+                self.model = get_embedding_model()
+            labels, utterances = [], []
+            for name, tool_examples in self.examples.items():
+                labels.extend([name] * len(tool_examples))
+                utterances.extend(tool_examples)
+            self._labels = np.array(labels)
+            self._embeddings = np.asarray(self.model.encode(utterances, normalize_embeddings=True))
+            logger.info(f"Fast-path router embedded {len(utterances)} examples for {len(self.examples)} tools")
+
+    def classify(self, query: str) -> Tuple[Optional[str], float, float]:
+        """Return (best tool, its score, lead over the runner-up tool)"""
+        if not self.examples:
+            return None, 0.0, 0.0
+        self._ensure_embeddings()
+
+        query_embedding = self.model.encode(query, normalize_embeddings=True)
+        similarities = self._embeddings @ query_embedding
+        scores = sorted(
+            ((float(similarities[self._labels == name].max()), name) for name in self.examples),
+            reverse=True
+        )
+        best_score, best_tool = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        return best_tool, best_score, best_score - runner_up
+
+    def route(self, query: str, file_available: bool) -> Optional[str]:
+        """Return a tool name if the query can skip the LLM router, else None"""
+        tool_name = None
+        try:
+            best_tool, score, lead = self.classify(query)
+            confident = score >= self.threshold and lead >= self.margin
+            if confident and (best_tool not in FILE_TOOLS or file_available):
+                tool_name = best_tool
+            logger.info(f"Fast-path router: best={best_tool} score={score:.3f} lead={lead:.3f} -> {tool_name or 'LLM'}")
+        except Exception as e:
+            logger.error(f"Fast-path router failed, falling back to LLM: {e}")
+
+        with self._stats_lock:
+            self.stats["queries"] += 1
+            if tool_name:
+                self.stats["fast_path"] += 1
+                self.stats["per_tool"][tool_name] += 1
+            else:
+                self.stats["fallback"] += 1
+            logger.info(f"Fast-path hit rate: {self.stats['fast_path']}/{self.stats['queries']}")
+        return tool_name
+
+    def get_stats(self) -> dict:
+        """Snapshot of routing counters including the fast-path hit rate"""
+        with self._stats_lock:
+            stats = dict(self.stats, per_tool=dict(self.stats["per_tool"]))
+        stats["hit_rate"] = stats["fast_path"] / stats["queries"] if stats["queries"] else 0.0
+        return stats
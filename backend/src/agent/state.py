@@ -5,3 +5,5 @@ class AgentState(TypedDict, total=False):
     messages: List[Any]  # List of message objects or dicts
     error: str  # Error message if any
     file_id: Optional[Any]  # File ID for accessing S3 files
+    history: List[Dict[str, str]]  # Earlier turns of the conversation as {"role", "content"} dicts
+    tool_results: Dict[str, str]  # Tool outputs from earlier turns, keyed by tool, file and arguments
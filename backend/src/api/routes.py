@@ -6,48 +6,106 @@ import uuid
 import logging
 from flask import Flask, request, jsonify, Response, session
 from werkzeug.utils import secure_filename
-import boto3
-from botocore.config import Config
 import requests
 from datetime import datetime
-import io
+from typing import Optional
 
 # Local imports
 from ..agent.core import process_query
 from ..tools.tool_registry import get_registered_tools
-from ..imsi.main_one import *
-from ..imsi.main_two import *
-from ..imsi.basic import *
+from ..imsi.main_one import LLMSummarizer, PDFProcessor
+from ..imsi.basic import DocumentParser
 from ..imsi.model import db, PDFFile
-from src.config import UPLOADS_DIR
+from ..documents import (
+    BUCKET_NAME,
+    compute_document_id,
+    document_registry,
+    document_s3_key,
+    document_url,
+    file_size,
+    get_s3_client,
+    read_header,
+    upload_document
+)
+from ..tools.highlight import ToxicClauseFinder, get_case_retriever
+from ..tools.embeddings import get_embedding_model
+from ..tools.segmentation import document_index_store
+from ..tools.contract_versions import analyze_contract
+from ..tools.case_summaries import case_summaries, case_id, default_summary_version, parse_summary
+from ..telemetry import render_prometheus, span
+from ..serialization import OrjsonProvider, dumps
+from ..logging_config import log_payload
+from .. import startup
+from src.config import (
+    UPLOADS_DIR,
+    OPENAI_API_KEY,
+    UPSTAGE_API_KEY,
+    HIGHLIGHT_PROMPT_PATH,
+    DOCUMENT_DB_URI,
+    CASE_DB_PATH,
+    EMBEDDING_PATH,
+    CASES_PAGE_SIZE,
+    CASES_MAX_RESULTS,
+    CASE_EXCERPT_CHARS,
+    CONTRACT_VERSIONING,
+    UPLOAD_MAX_BYTES
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Create Flask app and configure it
 app = Flask(__name__)
+app.json = OrjsonProvider(app)  # numpy-aware and faster than the stdlib encoder
 app.secret_key = os.urandom(24)  # For session management
-pdf_counter = 0
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_BYTES  # larger uploads get 413 before they are spooled
+
+# Document registry database (shared by all workers)
+app.config['SQLALCHEMY_DATABASE_URI'] = DOCUMENT_DB_URI
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"connect_args": {"timeout": 30}} if DOCUMENT_DB_URI.startswith("sqlite") else {}
+db.init_app(app)
+with app.app_context():
+    db.create_all()
 
 # Register tools
 tools = get_registered_tools()
 
-# S3 설정
-BUCKET_NAME = os.environ.get('BUCKET_NAME', 'wetube-gwanwoo')
-s3 = boto3.client('s3',
-    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-    region_name='ap-northeast-2',
-    config=Config(signature_version='s3v4')
-)
+def get_session_id() -> str:
+    """Stable ID of the browser session, used to map sessions to their documents"""
+    return session.setdefault('session_id', uuid.uuid4().hex)
+
+def s3_object_exists(key: str) -> bool:
+    try:
+        get_s3_client().head_object(Bucket=BUCKET_NAME, Key=key)
+        return True
+    except Exception:
+        return False
+
+def resolve_file_id(requested_file_id: Optional[str]) -> Optional[str]:
+    """Pick the document for a chat request: explicit ID, then session, then the session's latest upload
+
+    An explicit ID is only used if this session uploaded that document.
+    """
+    if requested_file_id:
+        if (requested_file_id == session.get('pdf_file_id')
+                or document_registry.in_session(get_session_id(), requested_file_id)):
+            return requested_file_id
+        logger.warning(f"Ignoring file ID {requested_file_id}: not a document of this session")
+    if session.get('pdf_file_id'):
+        return session['pdf_file_id']
+    return document_registry.latest_for_session(get_session_id())
 
 def user_query():
     # Get the query from JSON request
     if request.is_json:
         data = request.get_json()
         query = data.get("query")
+        thread_id = data.get("thread_id")
+        requested_file_id = data.get("file_id")
     else:
         query = request.form.get("query")
+        thread_id = request.form.get("thread_id")
+        requested_file_id = request.form.get("file_id")
     
     if not query:
         return jsonify({
@@ -58,15 +116,20 @@ def user_query():
         }), 400
     
     try:
-        # Get the file ID from the session
-        file_id = session.get('pdf_file_id')
-        file_id = "0"
-        logger.info(f"Retrieved file ID from session: {file_id}")
+        # Get the file ID from the request or the session
+        file_id = resolve_file_id(requested_file_id)
+        logger.info(f"Resolved file ID: {file_id}")
+        
+        # Conversation state is kept per thread; default to one thread per browser session
+        if not thread_id:
+            thread_id = session.setdefault('thread_id', uuid.uuid4().hex)
+        logger.info(f"Using conversation thread: {thread_id}")
         
         # Process the query with the file ID
-        response = process_query(query, tools, file_id)
-        print(f"Response: {response}")
-        response_data = json.dumps(response, ensure_ascii=False)
+        response = process_query(query, tools, file_id, thread_id=thread_id)
+        response["thread_id"] = thread_id
+        log_payload(logger, "Response", response)
+        response_data = dumps(response)
         return Response(response_data, content_type="application/json; charset=utf-8")
     except Exception as e:
         logger.error(f"Error processing query: {e}")
@@ -90,7 +153,6 @@ def upload_pdf():
     """
     프론트엔드에서 PDF 파일 업로드를 위한 엔드포인트
     """
-    global pdf_counter  # 전역 변수 사용
     print("Upload endpoint called")  # 요청이 들어왔는지 확인
     
     if 'file' not in request.files:
@@ -112,63 +174,57 @@ def upload_pdf():
         # 파일 저장
         filename = secure_filename(file.filename)
 
-        # Read the file content
-        file_content = file.read()
-        file.seek(0)  # Reset position for later use
+        # Werkzeug has already spooled the upload (to a temp file once it is large);
+        # hashing, S3 and parsing all read from that one handle instead of copies
+        file_obj = file.stream
         
         # Check if it's actually a PDF
-        if not file_content.startswith(b'%PDF-'):
+        if read_header(file_obj) != b'%PDF-':
             print("Warning: File doesn't look like a valid PDF")
             return jsonify({"error": "업로드된 파일이 유효한 PDF 형식이 아닙니다."}), 400
 
-        # Use a unique file counter for each upload
-        s3_path = f"{pdf_counter}"
+        # The document ID is the content hash, so the same PDF maps to the same ID in every worker
+        document_id = compute_document_id(file_obj)
+        s3_path = document_s3_key(document_id)
+        session_id = get_session_id()
         
-        # Save file to S3 as binary PDF
-        s3.put_object(
-            Body=file_content,
-            Bucket=BUCKET_NAME,
-            Key=s3_path,
-            ContentType='application/pdf',
-            ACL='public-read'
-        )
+        record, created = document_registry.register(document_id, filename, file_size(file_obj))
         
-        # Sample file url for client
-        file_path = f"https://{BUCKET_NAME}.s3.ap-northeast-2.amazonaws.com/{s3_path}"
+        # Store the document ID in the session for later use
+        session['pdf_file_id'] = document_id
+        document_registry.attach_to_session(session_id, document_id)
+        logger.info(f"Stored PDF document ID in session: {document_id}")
         
-        # Store the S3 path in the session for later use
-        session['pdf_file_id'] = s3_path
-        logger.info(f"Stored PDF file ID in session: {s3_path}")
+        # Identical PDF already analyzed: skip upload and processing entirely
+        cached_result = document_registry.get_artifact(document_id, "upload_result")
+        if cached_result:
+            logger.info(f"Reusing analysis of document {document_id}")
+            return jsonify(dict(cached_result, filename=filename)), 200
         
-        # Use the CURRENT uploaded file for processing, not a fixed one
-        file_obj = io.BytesIO(file_content)
-        file_obj.seek(0)
+        if created or not s3_object_exists(s3_path):
+            # Stream the file to S3 (multipart for large files)
+            upload_document(file_obj, document_id)
+        
+        # Sample file url for client
+        file_path = document_url(document_id)
         
-        API_KEY = get_upstage_api_key("backend/conf.d/config.yaml")
+        API_KEY = UPSTAGE_API_KEY
         document_parser = DocumentParser(API_KEY)
         llm_summarizer = LLMSummarizer()
         pdf_processor = PDFProcessor(document_parser, llm_summarizer)
 
-        # Extract summary from the CURRENT file
+        # Extract text from the CURRENT file
         print(f"Processing file: {s3_path}")
-        parse_result, summary = pdf_processor.process_pdf(file_obj)
+        with span("upload.parse"):
+            parse_result = pdf_processor.parse(file_obj)
+        document_registry.put_artifact(document_id, "parsed_text", parse_result)
 
-        # Reset file object for reuse
-        file_obj.seek(0)
-
-        PROMPT_PATH = "backend/prompts/find_toxic_clause.txt"
-        CASE_DB_PATH = "backend/datasets/case_db.json"
-
-        document_parser = DocumentParser(API_KEY)
-
-        case_retriever = CaseLawRetriever(
-            case_db_path=CASE_DB_PATH,
-            embedding_path="backend/datasets/precomputed_embeddings.npz"
-        )
+        case_retriever = get_case_retriever(CASE_DB_PATH, EMBEDDING_PATH)
 
+        # Long contracts are analyzed chunk by chunk instead of in one prompt
         llm_highlighter = ToxicClauseFinder(
-            app=app,
-            prompt_path=PROMPT_PATH,
+            openai_api_key=OPENAI_API_KEY,
+            prompt_path=HIGHLIGHT_PROMPT_PATH,
             case_retriever=case_retriever
         )
         print("Starting document analysis...")
@@ -176,11 +232,29 @@ def upload_pdf():
         text = parse_result
         if not text:
             return jsonify({"error": "파싱된 텍스트가 없습니다."}), 400
-        
-        highlight_result = llm_highlighter.highlight(text)
 
+        # Segment the contract once so later chat turns can reuse the article index
+        with span("upload.index"):
+            document_index = document_index_store.build(document_id, text, get_embedding_model())
+        
+        # An amended version of a contract this session uploaded before only re-analyzes its changed articles
+        with span("upload.toxic_clauses"):
+            highlight_result, version = analyze_contract(
+                llm_highlighter, document_id, document_index, session_id, incremental=CONTRACT_VERSIONING
+            )
         if not highlight_result:
             return jsonify({"error": "분석 결과가 없습니다."}), 400
+
+        previous_result = None
+        if version and not (version["changed"] or version["added"] or version["removed"]):
+            previous_result = document_registry.get_artifact(version["previous_pdf_id"], "upload_result")
+        if previous_result:
+            # Same articles as the earlier version: its summary still applies
+            summary = dict(previous_result["key_values"], summary=previous_result["summary"],
+                           key_findings=previous_result["key_findings"])
+        else:
+            with span("upload.summarize"):
+                summary = llm_summarizer.generate_summary(text)
         
         high_json = json.dumps(highlight_result, ensure_ascii=False, indent=2)
         high_json = json.loads(high_json)
@@ -188,7 +262,7 @@ def upload_pdf():
         result_highlight=dict()
         converted = []
         
-        print(high_json)
+        log_payload(logger, "Toxic clauses", high_json)
         for item in high_json:
             converted.append(item["독소조항"])
             rationale = item["친절한_설명"]
@@ -197,16 +271,14 @@ def upload_pdf():
         result_highlight["rationale"] = rationale
         result_highlight["highlights"] = converted
         
-        # Increment counter AFTER successful processing
-        
-        print(f"Finished processing file. New counter: {pdf_counter}")
+        print(f"Finished processing document: {document_id}")
         
         response_data = {
             "status": "success",
             "message": "Successfully uploaded file",
             "filename": filename,
             "file_url": file_path,
-            "pdf_id": f"{pdf_counter}",
+            "pdf_id": document_id,
             "summary": summary["summary"],
             "key_values": {
                 "annualReturn": summary["annualReturn"],
@@ -217,9 +289,10 @@ def upload_pdf():
                 "riskLevel": summary["riskLevel"]
             },
             "key_findings": summary["key_findings"],
-            "highlights": converted  # 원본 객체를 그대로 사용
+            "highlights": converted,  # 원본 객체를 그대로 사용
+            "version": version  # 이전 버전과의 조 단위 비교 (없으면 None)
         }
-        pdf_counter += 1
+        document_registry.put_artifact(document_id, "upload_result", response_data)
         return jsonify(response_data), 200
 
     except Exception as e:
@@ -228,6 +301,90 @@ def upload_pdf():
         print(traceback.format_exc())  # Add full stack trace
         return jsonify({"error": str(e)}), 500
 
+def case_result(case: dict, summary: Optional[str]) -> dict:
+    """A precedent as /api/cases returns it: the cached LLM summary when there is one, otherwise an excerpt"""
+    text = str(case.get("value", ""))
+    result = {
+        "id": case_id(text),
+        "title": str(case.get("key", "")),
+        "summary": text[:CASE_EXCERPT_CHARS] + ("…" if len(text) > CASE_EXCERPT_CHARS else ""),
+        "keyPoints": [],
+        "result": "",
+        "formatted": summary is not None,
+    }
+    if summary is not None:
+        result.update(parse_summary(summary))
+    return result
+
+@app.route('/api/cases', methods=['GET', 'POST'])
+def search_cases():
+    """Precedent search straight from the case retriever (no LLM calls), paginated"""
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    query = (params.get("query") or "").strip()
+    if not query:
+        return jsonify({"error": "Query not provided"}), 400
+    try:
+        page = max(int(params.get("page", 1)), 1)
+        page_size = min(max(int(params.get("page_size", CASES_PAGE_SIZE)), 1), CASES_MAX_RESULTS)
+    except (TypeError, ValueError):
+        return jsonify({"error": "page and page_size must be integers"}), 400
+
+    offset = (page - 1) * page_size
+    if offset >= CASES_MAX_RESULTS:
+        return jsonify({"query": query, "page": page, "page_size": page_size, "has_more": False, "cases": []})
+
+    with span("cases.search", page=page, page_size=page_size):
+        case_retriever = get_case_retriever()
+        case_retriever.ensure_loaded()
+        # One extra hit tells whether there is a next page
+        top_k = min(offset + page_size + 1, CASES_MAX_RESULTS, len(case_retriever.cases))
+        query_embedding = case_retriever.model.encode(query)
+        indices, scores = case_retriever.search(query_embedding, top_k=top_k, query_texts=[query])
+        hits = list(zip(indices[0].tolist(), scores[0].tolist()))
+        page_hits = hits[offset:offset + page_size]
+
+        cases = [case_retriever.cases[index] for index, _ in page_hits]
+        summaries = case_summaries.get_many((str(case["value"]) for case in cases), default_summary_version())
+        results = [
+            dict(case_result(case, summaries.get(case_id(str(case["value"])))), score=round(score, 4))
+            for case, (_, score) in zip(cases, page_hits)
+        ]
+
+    return jsonify({
+        "query": query,
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(hits) > offset + page_size and offset + page_size < CASES_MAX_RESULTS,
+        "cases": results,
+    })
+
+@app.route('/api/cases/<case_key>', methods=['GET'])
+def get_case(case_key: str):
+    """Full text of one precedent; search results and tool outputs only carry its ID (hash of the case text)"""
+    case_retriever = get_case_retriever()
+    index = case_retriever.find_case(case_key)
+    if index is None:
+        return jsonify({"error": f"Case {case_key} not found"}), 404
+    case = case_retriever.cases[index]
+    text = str(case.get("value", ""))
+    return jsonify(dict(case_result(case, case_summaries.get(text, default_summary_version())), text=text))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint for stage latencies, token counts and cache stats"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving, whether or not warm-up has finished"""
+    return jsonify(dict(startup.status(), status="ok"))
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 503 until models, case data and the agent graph are loaded, or if that failed (see steps)"""
+    ready = startup.is_ready()
+    return jsonify(dict(startup.status(), ready=ready)), 200 if ready else 503
+
 @app.route('/reset', methods=['POST'])
 def reset_session():
     # Remove the stored file if it exists
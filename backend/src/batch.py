@@ -0,0 +1,264 @@
+"""
+Offline bulk analysis of contract PDFs.
+
+Runs the same pipeline as /api/pdf-upload on every PDF in a directory or a
+manifest (one path per line, relative to the manifest), without S3 or a web
+server:
+    parse (Upstage) -> summarize -> toxic clause detection -> case linking
+It reuses PDFProcessor, ToxicClauseFinder and the process-wide case retriever.
+
+Documents flow through the stages independently; each stage has its own
+concurrency limit (BATCH_*_WORKERS), so slow LLM stages do not starve parsing
+and the retriever is not flooded. Every finished document is appended to the
+output JSONL and then to the checkpoint file (its content hash), so an
+interrupted run continues where it stopped. Failed documents are written with
+their error and retried on the next run; a document counts as failed when any
+LLM step fell back to a partial result (missing summary items, unanalyzed
+text, clauses without a precedent).
+
+Command line (from the backend directory):
+    python -m src.batch contracts/ --output results.jsonl
+    python -m src.batch manifest.txt --output results.jsonl --toxic-workers 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from src.config import (
+    BATCH_LINK_WORKERS, BATCH_PARSE_WORKERS, BATCH_PROGRESS_EVERY, BATCH_SUMMARY_WORKERS, BATCH_TOXIC_WORKERS,
+    CASE_DB_PATH, EMBEDDING_PATH, HIGHLIGHT_PROMPT_PATH, OPENAI_API_KEY, UPSTAGE_API_KEY
+)
+from src.documents import compute_document_id, read_header
+from src.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("parse", "summarize", "toxic", "link")
+
+
+def discover(source: str) -> List[str]:
+    """PDF paths under a directory (recursively, sorted) or listed in a manifest file"""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        lines = (line.strip() for line in f)
+        return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+
+class Checkpoint:
+    """Append-only record of finished documents, keyed by content hash"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._done = set()
+        self._claimed = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._done.add(json.loads(line)["document_id"])
+                    except (ValueError, KeyError):
+                        continue  # partially written last line
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def claim(self, document_id: str) -> bool:
+        """False if the document is finished or already being analyzed in this run"""
+        with self._lock:
+            if document_id in self._done or document_id in self._claimed:
+                return False
+            self._claimed.add(document_id)
+            return True
+
+    def add(self, document_id: str, path: str) -> None:
+        with self._lock:
+            self._done.add(document_id)
+            self._file.write(dumps({"document_id": document_id, "path": path}) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Stage:
+    """Concurrency limit and busy/wait time of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def run(self, fn, *args):
+        queued = time.perf_counter()
+        with self._slots:
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.calls += 1
+                    self.busy_seconds += finished - started
+                    self.wait_seconds += started - queued
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "calls": self.calls,
+                "busy_seconds": round(self.busy_seconds, 2),
+                "wait_seconds": round(self.wait_seconds, 2),
+                "avg_seconds": round(self.busy_seconds / self.calls, 3) if self.calls else None,
+            }
+
+
+class BatchAnalyzer:
+    """Runs the upload pipeline on local PDFs with per-stage concurrency limits"""
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None):
+        from src.imsi.basic import DocumentParser
+        from src.imsi.main_one import LLMSummarizer, PDFProcessor
+        from src.tools.highlight import ToxicClauseFinder, get_case_retriever
+
+        limits = {"parse": BATCH_PARSE_WORKERS, "summarize": BATCH_SUMMARY_WORKERS,
+                  "toxic": BATCH_TOXIC_WORKERS, "link": BATCH_LINK_WORKERS}
+        limits.update(workers or {})
+        self.stages = {name: Stage(name, limits[name]) for name in STAGES}
+
+        self.processor = PDFProcessor(DocumentParser(UPSTAGE_API_KEY), LLMSummarizer())
+        self.finder = ToxicClauseFinder(
+            openai_api_key=OPENAI_API_KEY,
+            prompt_path=HIGHLIGHT_PROMPT_PATH,
+            case_retriever=get_case_retriever(CASE_DB_PATH, EMBEDDING_PATH)
+        )
+
+    @property
+    def max_in_flight(self) -> int:
+        """Documents in the pipeline at once: enough to keep every stage busy"""
+        return sum(stage.workers for stage in self.stages.values())
+
+    def analyze(self, path: str, checkpoint: Checkpoint) -> Optional[dict]:
+        """Result record of one document, or None if it was already analyzed"""
+        started = time.perf_counter()
+        record = {"path": path, "filename": os.path.basename(path)}
+        stage = "read"
+        try:
+            with open(path, 'rb') as f:
+                if read_header(f) != b'%PDF-':
+                    raise ValueError("not a PDF file")
+                record["document_id"] = compute_document_id(f)
+                if not checkpoint.claim(record["document_id"]):
+                    return None
+
+                stage = "parse"
+                text = self.stages["parse"].run(self.processor.parse, f)
+
+            stage = "summarize"
+            summary = self.stages["summarize"].run(self.processor.summarizer.generate_summary, text, True)
+            stage = "toxic"
+            clauses, rationale, complete = self.stages["toxic"].run(self.finder.detect, text)
+            if not complete:
+                raise RuntimeError("toxic clause analysis incomplete (LLM call failed or text truncated)")
+            stage = "link"
+            linked = self.stages["link"].run(self.finder.link, clauses, rationale)
+            if len(linked) < len(clauses):
+                raise RuntimeError(f"no precedent linked for {len(clauses) - len(linked)} of {len(clauses)} clauses")
+        except Exception as e:
+            logger.error(f"Batch analysis of {path} failed at {stage}: {e}")
+            record.update(status="error", stage=stage, error=str(e))
+        else:
+            record.update(status="ok", text_chars=len(text), summary=summary, rationale=rationale,
+                          toxic_clauses=linked)
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        return record
+
+    def run(self, paths: List[str], output_path: str, checkpoint_path: str) -> dict:
+        """Analyze `paths`, appending records to `output_path`; returns the run report"""
+        checkpoint = Checkpoint(checkpoint_path)
+        counts = {"ok": 0, "error": 0, "skipped": 0}
+        logger.info(f"Batch: {len(paths)} documents, {len(checkpoint)} already in {checkpoint_path}")
+
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="batch")
+        try:
+            with open(output_path, 'a', encoding='utf-8') as output:
+                for future in as_completed(executor.submit(self.analyze, path, checkpoint) for path in paths):
+                    record = future.result()
+                    if record is None:
+                        counts["skipped"] += 1
+                        continue
+                    # Output before checkpoint: a crash in between repeats a document, never loses one
+                    output.write(dumps(record) + "\n")
+                    output.flush()
+                    counts[record["status"]] += 1
+                    if record["status"] == "ok":
+                        checkpoint.add(record["document_id"], record["path"])
+                    processed = counts["ok"] + counts["error"]
+                    if BATCH_PROGRESS_EVERY and processed % BATCH_PROGRESS_EVERY == 0:
+                        logger.info(f"Batch progress: {processed} analyzed, "
+                                    f"{_per_minute(processed, time.perf_counter() - started):.1f} docs/min")
+        except KeyboardInterrupt:
+            logger.warning("Interrupted; finished documents are checkpointed, rerun to continue")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            checkpoint.close()
+        executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        processed = counts["ok"] + counts["error"]
+        return {
+            "documents": len(paths),
+            **counts,
+            "seconds": round(elapsed, 2),
+            "docs_per_minute": round(_per_minute(processed, elapsed), 2),
+            "stages": {name: stage.get_stats() for name, stage in self.stages.items()},
+        }
+
+
+def _per_minute(count: int, seconds: float) -> float:
+    return count * 60 / seconds if seconds > 0 else 0.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk contract analysis (parse, summary, toxic clauses, precedents)")
+    parser.add_argument("source", help="directory of PDFs or a manifest with one PDF path per line")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", default=None, help="finished documents (default: <output>.checkpoint)")
+    parser.add_argument("--limit", type=int, default=None, help="analyze at most this many documents")
+    for name, default in zip(STAGES, (BATCH_PARSE_WORKERS, BATCH_SUMMARY_WORKERS, BATCH_TOXIC_WORKERS,
+                                      BATCH_LINK_WORKERS)):
+        parser.add_argument(f"--{name}-workers", type=int, default=default)
+    args = parser.parse_args(argv)
+
+    from src.logging_config import configure_logging
+    configure_logging()
+
+    paths = discover(args.source)[:args.limit]
+    analyzer = BatchAnalyzer({name: getattr(args, f"{name}_workers") for name in STAGES})
+    report = analyzer.run(paths, args.output, args.checkpoint or f"{args.output}.checkpoint")
+    print(json.dumps(report, indent=2))
+    return 0 if report["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,7 @@ import yaml
 
 # Base paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CONFIG_PATH = os.path.join(BASE_DIR, "conf.d", "config.yaml")
+CONFIG_PATH = os.environ.get("FINANCEGUARD_CONFIG", os.path.join(BASE_DIR, "conf.d", "config.yaml"))
 DATASETS_DIR = os.path.join(BASE_DIR, "datasets")
 PROMPTS_DIR = os.path.join(BASE_DIR, "prompts")
 UPLOADS_DIR = os.path.join(BASE_DIR, "src", "uploads")
@@ -22,13 +22,130 @@ UPSTAGE_API_KEY = config['upstage']['key']
 TAVILY_API_KEY = config['tavily']['key']  # Added from config.yaml
 
 # Dataset paths
-CASE_DB_PATH = os.path.join(DATASETS_DIR, "case_db.json")
-EMBEDDING_PATH = os.path.join(DATASETS_DIR, "precomputed_embeddings.npz")
+CASE_DB_PATH = os.environ.get("CASE_DB_PATH", os.path.join(DATASETS_DIR, "case_db.json"))
+EMBEDDING_PATH = os.environ.get("EMBEDDING_PATH", os.path.join(DATASETS_DIR, "precomputed_embeddings.npz"))
+CASE_LEXICAL_INDEX_PATH = os.environ.get("CASE_LEXICAL_INDEX_PATH", os.path.join(DATASETS_DIR, "case_bm25.npz"))
+
+# External service endpoints (overridable to point at local stubs)
+UPSTAGE_BASE_URL = os.environ.get("UPSTAGE_BASE_URL", "https://api.upstage.ai/v1")
+
+# Embedding model shared by the retriever, segmentation index and router
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "nlpai-lab/KURE-v1")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")  # "torch", "onnx" or "onnx-int8"
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", os.path.join(DATASETS_DIR, "onnx", "KURE-v1"))  # exported graphs
+EMBEDDING_ONNX_QUANTIZATION = os.environ.get("EMBEDDING_ONNX_QUANTIZATION", "avx512_vnni")  # "arm64", "avx2", "avx512" or "avx512_vnni"
+EMBEDDING_ONNX_THREADS = int(os.environ.get("EMBEDDING_ONNX_THREADS", 0))  # intra-op threads, 0: runtime default
+EMBEDDING_BATCHING = os.environ.get("EMBEDDING_BATCHING", "true").lower() == "true"  # coalesce concurrent encode calls
+EMBEDDING_MAX_BATCH_SIZE = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE", 32))  # sentences per coalesced call
+EMBEDDING_MAX_WAIT_MS = float(os.environ.get("EMBEDDING_MAX_WAIT_MS", 2))  # how long a batch waits to fill up
+
+# Case retrieval settings
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")  # "dense" or "hybrid" (dense + BM25, when the index exists)
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", 50))  # candidates taken from each ranking before fusion
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", 60))  # reciprocal rank fusion constant
+SIMULATION_CASE_CANDIDATES = int(os.environ.get("SIMULATION_CASE_CANDIDATES", 10))  # cases re-ranked per clause
+CASES_PAGE_SIZE = int(os.environ.get("CASES_PAGE_SIZE", 10))  # default page size of /api/cases
+CASES_MAX_RESULTS = int(os.environ.get("CASES_MAX_RESULTS", 100))  # deepest result /api/cases pages through
+CASE_EXCERPT_CHARS = int(os.environ.get("CASE_EXCERPT_CHARS", 300))  # summary length for cases not formatted yet
 
 # Prompt paths
 SIMULATION_PROMPT_PATH = os.path.join(PROMPTS_DIR, "simulate_dispute.txt")
 FORMAT_PROMPT_PATH = os.path.join(PROMPTS_DIR, "format_output.txt")
 HIGHLIGHT_PROMPT_PATH = os.path.join(PROMPTS_DIR, "find_toxic_clause.txt")
+SUMMARY_PROMPT_PATH = os.path.join(PROMPTS_DIR, "summarize_pdf.yaml")
+
+# Summarizer settings
+SUMMARY_MODE = os.environ.get("SUMMARY_MODE", "structured")  # "structured" or "text"
+SUMMARY_MAX_ATTEMPTS = int(os.environ.get("SUMMARY_MAX_ATTEMPTS", 3))
+SUMMARY_TIME_BUDGET = float(os.environ.get("SUMMARY_TIME_BUDGET", 60))  # seconds, across all attempts
+
+# Toxic clause detection settings
+TOXIC_CHUNKED_MODE = os.environ.get("TOXIC_CHUNKED_MODE", "true").lower() == "true"
+TOXIC_CHUNK_SIZE = int(os.environ.get("TOXIC_CHUNK_SIZE", 6000))  # characters per chunk
+TOXIC_CHUNK_OVERLAP = int(os.environ.get("TOXIC_CHUNK_OVERLAP", 400))  # characters shared by neighbouring chunks
+TOXIC_MAX_WORKERS = int(os.environ.get("TOXIC_MAX_WORKERS", 4))
+CLAUSE_CACHE_ENABLED = os.environ.get("CLAUSE_CACHE_ENABLED", "true").lower() == "true"  # reuse verdicts of identical articles
+CLAUSE_CACHE_SEMANTIC = os.environ.get("CLAUSE_CACHE_SEMANTIC", "false").lower() == "true"  # also match near-identical articles
+CLAUSE_CACHE_SEMANTIC_THRESHOLD = float(os.environ.get("CLAUSE_CACHE_SEMANTIC_THRESHOLD", 0.97))  # min cosine similarity
+CLAUSE_CACHE_MAX_ENTRIES = int(os.environ.get("CLAUSE_CACHE_MAX_ENTRIES", 5000))  # verdicts kept in process memory
+CLAUSE_CACHE_RETIRE_DAYS = float(os.environ.get("CLAUSE_CACHE_RETIRE_DAYS", 7))  # delete versions not written for this long
+
+# Contract segmentation index settings
+DOCUMENT_INDEX_MAX_DOCUMENTS = int(os.environ.get("DOCUMENT_INDEX_MAX_DOCUMENTS", 32))  # per-document indexes kept in memory
+
+# Contract version settings (incremental re-analysis of amended contracts)
+CONTRACT_VERSIONING = os.environ.get("CONTRACT_VERSIONING", "true").lower() == "true"
+CONTRACT_VERSION_MIN_OVERLAP = float(os.environ.get("CONTRACT_VERSION_MIN_OVERLAP", 0.5))  # share of identical articles
+CONTRACT_VERSION_CANDIDATES = int(os.environ.get("CONTRACT_VERSION_CANDIDATES", 5))  # earlier documents compared per upload
+
+# Embedding fast-path router settings
+FAST_ROUTER_ENABLED = os.environ.get("FAST_ROUTER_ENABLED", "true").lower() == "true"
+FAST_ROUTER_THRESHOLD = float(os.environ.get("FAST_ROUTER_THRESHOLD", 0.65))  # min cosine similarity to an example
+FAST_ROUTER_MARGIN = float(os.environ.get("FAST_ROUTER_MARGIN", 0.05))  # min lead over the runner-up tool
+
+# Agent tool execution settings
+TOOL_MAX_WORKERS = int(os.environ.get("TOOL_MAX_WORKERS", 4))  # tool calls run concurrently per turn
+TOOL_TIMEOUT_DEFAULT = float(os.environ.get("TOOL_TIMEOUT_DEFAULT", 120))  # seconds
+TOOL_TIMEOUTS = {
+    "simulate_dispute_tool": float(os.environ.get("SIMULATION_TOOL_TIMEOUT", 240)),
+    "find_toxic_clauses_tool": float(os.environ.get("TOXIC_TOOL_TIMEOUT", 240)),
+    "find_case_tool": float(os.environ.get("CASE_TOOL_TIMEOUT", 60)),
+    "web_search_tool": float(os.environ.get("WEB_SEARCH_TOOL_TIMEOUT", 30)),
+}
+
+# Conversation persistence settings
+CHECKPOINT_DB_PATH = os.environ.get("CHECKPOINT_DB_PATH", os.path.join(DATASETS_DIR, "checkpoints.sqlite"))
+CONVERSATION_MAX_TURNS = int(os.environ.get("CONVERSATION_MAX_TURNS", 10))  # user/assistant pairs kept
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", 3000))  # approx. tokens of history sent to the LLM
+TOOL_RESULT_CACHE_SIZE = int(os.environ.get("TOOL_RESULT_CACHE_SIZE", 16))  # tool outputs reused across turns
+
+# Chat answer cache settings (see src/agent/answer_cache.py)
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.93))  # min cosine similarity of questions
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 3600))  # seconds
+ANSWER_CACHE_MAX_PER_DOCUMENT = int(os.environ.get("ANSWER_CACHE_MAX_PER_DOCUMENT", 64))  # answers kept per document
+ANSWER_CACHE_MAX_DOCUMENTS = int(os.environ.get("ANSWER_CACHE_MAX_DOCUMENTS", 256))  # documents with cached answers
+
+# Document registry (shared by all worker processes)
+DOCUMENT_DB_URI = os.environ.get("DOCUMENT_DB_URI", "sqlite:///" + os.path.join(DATASETS_DIR, "documents.sqlite"))
+
+# Document upload and storage settings
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 50 * 2 ** 20))  # larger uploads are rejected with 413
+DOCUMENT_SPOOL_MAX_BYTES = int(os.environ.get("DOCUMENT_SPOOL_MAX_BYTES", 2 ** 20))  # downloads above this spill to a temp file
+S3_MULTIPART_THRESHOLD = int(os.environ.get("S3_MULTIPART_THRESHOLD", 8 * 2 ** 20))  # multipart transfer above this size
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get("S3_MULTIPART_CHUNKSIZE", 8 * 2 ** 20))  # bytes per part
+S3_MAX_CONCURRENCY = int(os.environ.get("S3_MAX_CONCURRENCY", 4))  # parts transferred in parallel
+
+# Web search cache settings
+WEB_SEARCH_CACHE_TTL = float(os.environ.get("WEB_SEARCH_CACHE_TTL", 6 * 3600))  # seconds
+WEB_SEARCH_CACHE_SIZE = int(os.environ.get("WEB_SEARCH_CACHE_SIZE", 512))
+WEB_SEARCH_SEMANTIC_CACHE = os.environ.get("WEB_SEARCH_SEMANTIC_CACHE", "false").lower() == "true"
+WEB_SEARCH_SEMANTIC_THRESHOLD = float(os.environ.get("WEB_SEARCH_SEMANTIC_THRESHOLD", 0.92))
+
+# Batch analysis settings (see src/batch.py)
+BATCH_PARSE_WORKERS = int(os.environ.get("BATCH_PARSE_WORKERS", 4))  # documents in Upstage parsing at once
+BATCH_SUMMARY_WORKERS = int(os.environ.get("BATCH_SUMMARY_WORKERS", 4))  # documents being summarized at once
+BATCH_TOXIC_WORKERS = int(os.environ.get("BATCH_TOXIC_WORKERS", 4))  # documents in toxic clause detection at once
+BATCH_LINK_WORKERS = int(os.environ.get("BATCH_LINK_WORKERS", 2))  # documents linking clauses to precedents at once
+BATCH_PROGRESS_EVERY = int(os.environ.get("BATCH_PROGRESS_EVERY", 25))  # log throughput every N documents
+
+# Telemetry settings
+TELEMETRY_ENABLED = os.environ.get("TELEMETRY_ENABLED", "true").lower() == "true"
+TELEMETRY_OTLP_ENDPOINT = os.environ.get("TELEMETRY_OTLP_ENDPOINT")  # e.g. http://localhost:4318/v1/traces
+TELEMETRY_SERVICE_NAME = os.environ.get("TELEMETRY_SERVICE_NAME", "financeguard-backend")
+
+# Logging settings (see src/logging_config.py)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # "json" (one object per line) or "text"
+LOG_MODULE_LEVELS = os.environ.get("LOG_MODULE_LEVELS", "")  # e.g. "src.agent=DEBUG,src.tools.highlight=WARNING"
+LOG_MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", 2000))  # longer messages/fields are truncated
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.1))  # share of DEBUG payload logs kept
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))  # records buffered before new ones are dropped
+
+# Startup settings
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "background")  # "lazy", "background" or "eager"
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", 5))  # time to first healthy response
+TORCH_THREADS_PER_WORKER = int(os.environ.get("TORCH_THREADS_PER_WORKER", 0))  # 0: CPUs divided by worker count
 
 # Ensure directories exist
 for directory in [DATASETS_DIR, PROMPTS_DIR, UPLOADS_DIR]:
@@ -0,0 +1,234 @@
+"""Content-addressed document identity and the per-document registry"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+from sqlalchemy.exc import IntegrityError
+
+from src.config import (
+    DOCUMENT_SPOOL_MAX_BYTES, S3_MAX_CONCURRENCY, S3_MULTIPART_CHUNKSIZE, S3_MULTIPART_THRESHOLD
+)
+from src.imsi.model import db, PDFFile, DocumentArtifact, SessionDocument
+from src.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'wetube-gwanwoo')
+S3_REGION = 'ap-northeast-2'
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # e.g. a local S3-compatible server
+
+DOCUMENT_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_s3_client = None
+
+def get_s3_client():
+    """Return the shared S3 client"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3',
+            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+            region_name=S3_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=Config(signature_version='s3v4')
+        )
+    return _s3_client
+
+def compute_document_id(file_obj) -> str:
+    """SHA-256 of the file content; identical PDFs get the same ID in every process"""
+    digest = hashlib.sha256()
+    if isinstance(file_obj, (bytes, bytearray)):
+        digest.update(file_obj)
+    else:
+        file_obj.seek(0)
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        file_obj.seek(0)
+    return digest.hexdigest()
+
+def document_s3_key(document_id: str) -> str:
+    """S3 key of a document; legacy counter-based IDs were used as keys directly"""
+    if DOCUMENT_ID_PATTERN.fullmatch(document_id):
+        return f"pdf/{document_id}.pdf"
+    return document_id
+
+def document_url(document_id: str) -> str:
+    return f"https://{BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{document_s3_key(document_id)}"
+
+def file_size(file_obj) -> int:
+    """Total size of a seekable file, without moving its position"""
+    position = file_obj.tell()
+    file_obj.seek(0, os.SEEK_END)
+    size = file_obj.tell()
+    file_obj.seek(position)
+    return size
+
+def read_header(file_obj, size: int = 5) -> bytes:
+    """First bytes of a file (e.g. b'%PDF-'); the file is rewound afterwards"""
+    file_obj.seek(0)
+    header = file_obj.read(size)
+    file_obj.seek(0)
+    return header
+
+def s3_transfer_config():
+    """Multipart settings for upload_fileobj/download_fileobj; memory in flight is about chunk size x concurrency"""
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=S3_MAX_CONCURRENCY,
+        use_threads=S3_MAX_CONCURRENCY > 1
+    )
+
+def upload_document(file_obj, document_id: str) -> int:
+    """Stream a document to S3 from its file handle (multipart for large files); returns its size"""
+    size = file_size(file_obj)
+    file_obj.seek(0)
+    with span("s3.upload_fileobj") as s3_span:
+        get_s3_client().upload_fileobj(
+            file_obj, BUCKET_NAME, document_s3_key(document_id),
+            ExtraArgs={'ContentType': 'application/pdf', 'ACL': 'public-read'},
+            Config=s3_transfer_config()
+        )
+        s3_span.record_payload(size, direction="out")
+    file_obj.seek(0)
+    return size
+
+def open_document(document_id: str):
+    """Download a document into a spooled temp file (in memory up to DOCUMENT_SPOOL_MAX_BYTES), positioned at 0
+
+    The caller owns the returned file and should close it.
+    """
+    file_obj = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES)
+    try:
+        with span("s3.download_fileobj") as s3_span:
+            get_s3_client().download_fileobj(
+                BUCKET_NAME, document_s3_key(document_id), file_obj, Config=s3_transfer_config()
+            )
+            s3_span.record_payload(file_obj.tell())
+    except Exception:
+        file_obj.close()
+        raise
+    file_obj.seek(0)
+    return file_obj
+
+
+class _SizedReader:
+    """Read-only view of a file handle with a known length
+
+    requests and requests-toolbelt size a body via fileno() or getvalue(), which
+    rolls a SpooledTemporaryFile over to disk or copies a BytesIO; this gives
+    them the remaining length directly.
+    """
+
+    def __init__(self, file_obj):
+        self._file = file_obj
+        self._end = file_size(file_obj)
+
+    @property
+    def len(self) -> int:
+        return self._end - self._file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+
+def document_form(file_obj, fields: dict, filename: str = 'document.pdf'):
+    """Multipart form with the document as `document`, streamed from its handle rather than built in memory
+
+    Returns (body, content_type) for requests.post(data=body, headers={"Content-Type": content_type}).
+    """
+    from requests_toolbelt import MultipartEncoder
+
+    file_obj.seek(0)
+    encoder = MultipartEncoder(fields=dict(
+        {name: str(value) for name, value in fields.items()},
+        document=(filename, _SizedReader(file_obj), 'application/pdf')
+    ))
+    return encoder, encoder.content_type
+
+
+class DocumentRegistry:
+    """Maps sessions to documents and documents to their cached artifacts
+
+    Backed by the Flask-SQLAlchemy database, so it is shared by every worker
+    process; unique constraints make concurrent registration of the same
+    document (or artifact) safe. Must be used inside an application context.
+    """
+
+    def register(self, document_id: str, filename: str, size: int) -> Tuple[PDFFile, bool]:
+        """Get or create the record of a document. Returns (record, created)."""
+        record = PDFFile.query.filter_by(document_id=document_id).first()
+        if record is not None:
+            return record, False
+
+        record = PDFFile(
+            document_id=document_id,
+            filename=filename,
+            file_url=document_url(document_id),
+            s3_key=document_s3_key(document_id),
+            size=size
+        )
+        db.session.add(record)
+        try:
+            db.session.commit()
+            return record, True
+        except IntegrityError:
+            # Another worker registered the same content first
+            db.session.rollback()
+            return PDFFile.query.filter_by(document_id=document_id).first(), False
+
+    def get(self, document_id: str) -> Optional[PDFFile]:
+        return PDFFile.query.filter_by(document_id=document_id).first()
+
+    def attach_to_session(self, session_id: str, document_id: str) -> None:
+        link = SessionDocument.query.filter_by(session_id=session_id, document_id=document_id).first()
+        if link is not None:
+            link.created_at = datetime.utcnow()
+        else:
+            db.session.add(SessionDocument(session_id=session_id, document_id=document_id))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+    def in_session(self, session_id: str, document_id: str) -> bool:
+        """Whether the session uploaded this document"""
+        return SessionDocument.query.filter_by(session_id=session_id, document_id=document_id).first() is not None
+
+    def latest_for_session(self, session_id: str) -> Optional[str]:
+        """Most recently uploaded document of a session"""
+        link = (SessionDocument.query
+                .filter_by(session_id=session_id)
+                .order_by(SessionDocument.created_at.desc())
+                .first())
+        return link.document_id if link else None
+
+    def get_artifact(self, document_id: str, kind: str) -> Optional[Any]:
+        artifact = DocumentArtifact.query.filter_by(document_id=document_id, kind=kind).first()
+        return json.loads(artifact.payload) if artifact else None
+
+    def put_artifact(self, document_id: str, kind: str, payload: Any) -> None:
+        data = json.dumps(payload, ensure_ascii=False)
+        artifact = DocumentArtifact.query.filter_by(document_id=document_id, kind=kind).first()
+        if artifact is not None:
+            artifact.payload = data
+        else:
+            db.session.add(DocumentArtifact(document_id=document_id, kind=kind, payload=data))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Written concurrently by another worker; results are deterministic per document
+            db.session.rollback()
+
+
+document_registry = DocumentRegistry()
@@ -1,10 +1,14 @@
 import os
 import yaml
 import json
+from functools import lru_cache
 from numpy import dot
 from numpy.linalg import norm
 import requests
 from werkzeug.utils import secure_filename
+from src.config import UPSTAGE_BASE_URL
+from src.telemetry import span
+from src.documents import document_form
 
 
 def get_openai_api_key(api_key_path):
@@ -22,10 +26,14 @@ def get_tavily_api_key(api_key_path):
         config = yaml.safe_load(f)
     return config['tavily']['key']
 
-def load_prompt(args):
+@lru_cache(maxsize=None)
+def load_prompt_config(args):
+	"""YAML 프롬프트 파일을 한 번만 읽고 파싱해 캐시합니다."""
 	with open(args, "r", encoding="UTF-8") as f:
-		prompt = yaml.load(f, Loader=yaml.FullLoader)["prompt"]
-	return prompt
+		return yaml.load(f, Loader=yaml.FullLoader)
+
+def load_prompt(args):
+	return load_prompt_config(args)["prompt"]
 
 def load_data(arg):
     with open(arg, 'r',encoding='utf-8') as json_file:
@@ -37,33 +45,31 @@ def cos_sim(a, b):
     return dot(a, b) / (norm(a) * norm(b))
 
 def load_prefix(args):
-	with open(args, "r", encoding="UTF-8") as f:
-		prefix = yaml.load(f, Loader=yaml.FullLoader)["prefix"]
-	return prefix
+	return load_prompt_config(args)["prefix"]
 
 def load_message(args):
-	with open(args, "r", encoding="UTF-8") as f:
-		prefix = yaml.load(f, Loader=yaml.FullLoader)["message"]
-	return prefix
+	return load_prompt_config(args)["message"]
 
 # PDF 파일을 외부 파싱 API를 통해 처리하는 클래스
 class DocumentParser:
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.url = "https://api.upstage.ai/v1/document-digitization"
+        self.url = f"{UPSTAGE_BASE_URL}/document-digitization"
     
     def parse(self, file_obj) -> dict:
         """
         file_obj: 파일 객체 (예: Flask의 request.files['document'])
         반환: API 응답 JSON을 dict로 반환
         """
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        # API에서는 파일 객체를 그대로 받을 수 있음.
-        files = {"document": file_obj}
         # 필요에 따라 추가 옵션 지정 (예: OCR 강제 적용, base64 인코딩 옵션, 모델 선택 등)
         data = {"ocr": "force", "base64_encoding": "[]", "model": "document-parse", "output_formats" : "['text']"}
+        # 파일 전체를 메모리에 올리지 않고 파일 객체에서 바로 multipart 본문을 스트리밍
+        body, content_type = document_form(file_obj, data)
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": content_type}
         
-        response = requests.post(self.url, headers=headers, files=files, data=data)
+        with span("upstage.document_parse") as parse_span:
+            response = requests.post(self.url, headers=headers, data=body)
+            parse_span.record_payload(len(response.content))
         
         return response.text
     
@@ -2,79 +2,195 @@ import requests
 from flask import Flask, request, jsonify, Response
 from langchain.schema import HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
+from openai import LengthFinishReasonError
+from pydantic import BaseModel, Field
+from typing import List
 from src.imsi.basic import *
+from src.config import CONFIG_PATH, SUMMARY_PROMPT_PATH, SUMMARY_MODE, SUMMARY_MAX_ATTEMPTS, SUMMARY_TIME_BUDGET
 import json
+import logging
 import os
+import re
+import time
 from werkzeug.utils import secure_filename
 
+logger = logging.getLogger(__name__)
+
+
+# 요약 결과에 반드시 포함되어야 하는 항목들
+REQUIRED_SUMMARY_KEYS = [
+    "summary", "annualReturn", "volatility", "managementFee", "minimumInvestment",
+    "lockupPeriod", "riskLevel", "key_findings"
+]
+
+# 예산 내에 항목을 채우지 못했을 때 사용할 기본값
+MISSING_SUMMARY_VALUE = "정보 없음"
+
+
+class PDFSummary(BaseModel):
+    """Structured output schema for the contract summary (all values in Korean)"""
+    summary: str = Field(..., description="A concise overview of the content.")
+    annualReturn: str = Field(..., description="The percentage gain or loss expected from an investment over a one-year period.")
+    volatility: str = Field(..., description="The degree of variation in an asset's price over time, indicating its risk and uncertainty.")
+    managementFee: str = Field(..., description="The annual cost charged by a fund manager for overseeing the investment.")
+    minimumInvestment: str = Field(..., description="The smallest amount of capital required to participate in an investment product.")
+    lockupPeriod: str = Field(..., description="A fixed duration during which investors cannot redeem or sell their investment.")
+    riskLevel: str = Field(..., description="A classification indicating the potential for loss or fluctuation in investment value.")
+    key_findings: List[str] = Field(..., description="Important points identified from the content that require special attention.")
+
+
+def parse_summary_text(response: str) -> dict:
+    """
+    모델 응답에서 요약 항목을 최대한 추출합니다.
+    JSON 응답(잘린 JSON 포함)과 기존 `key: value` 형식을 모두 지원합니다.
+    """
+    response = response.replace('```json', '').replace('```', '').strip()
+
+    # 1) 완전한 JSON
+    try:
+        loaded = json.loads(response)
+        if isinstance(loaded, dict):
+            return {key: loaded[key] for key in REQUIRED_SUMMARY_KEYS if key in loaded}
+    except json.JSONDecodeError:
+        pass
+
+    parsed = {}
+
+    # 2) 잘린 JSON - 완성된 문자열 값만 복구
+    for key in REQUIRED_SUMMARY_KEYS:
+        if key == 'key_findings':
+            match = re.search(r'"key_findings"\s*:\s*\[(.*?)\]', response, re.DOTALL)
+            if match:
+                parsed[key] = re.findall(r'"((?:[^"\\]|\\.)*)"', match.group(1))
+        else:
+            match = re.search(rf'"{key}"\s*:\s*"((?:[^"\\]|\\.)*)"', response)
+            if match:
+                parsed[key] = match.group(1)
+    if parsed:
+        return parsed
+
+    # 3) 멀티라인 `key: value` 형식
+    for line in response.split('\n'):
+        # ':'가 없는 라인은 건너뛰기
+        if ':' not in line:
+            continue
+
+        key, value = line.split(':', 1)
+        key = key.strip()
+        value = value.strip()
+
+        if key == 'key_findings':
+            # 각 항목의 공백 제거
+            parsed[key] = [item.strip() for item in value.split(",")]
+        elif key in REQUIRED_SUMMARY_KEYS:
+            parsed[key] = value
+
+    return parsed
+
+
+class SummaryIncompleteError(Exception):
+    """요약 항목 일부를 예산 안에 채우지 못함"""
+
+    def __init__(self, missing: list):
+        super().__init__(f"Summary incomplete, missing: {', '.join(missing)}")
+        self.missing = missing
+
 
 # LLM을 통해 요약을 생성하는 클래스
 class LLMSummarizer:
-    def __init__(self):
-        # LLM 관련 설정 추가 가능 (예: API 키 등)
-        get_openai_api_key("backend/conf.d/config.yaml")
-        self.llm = ChatOpenAI(model_name='gpt-4o-mini',  # 'gpt-3.5-turbo' or 'gpt-4o-mini'
-                      temperature=0,max_tokens=1500, max_retries=100)
-
-    
-    def generate_summary(self, text: str) -> str:
+    def __init__(self, mode: str = SUMMARY_MODE, max_attempts: int = SUMMARY_MAX_ATTEMPTS,
+                 time_budget: float = SUMMARY_TIME_BUDGET):
         """
-        text: 파싱된 전체 텍스트
-        반환: 생성된 요약 문자열
-        
+        mode: "structured" (JSON schema 출력) 또는 "text" (기존 `key: value` 출력)
+        max_attempts: 요약 생성 최대 시도 횟수
+        time_budget: 모든 시도를 합친 최대 소요 시간(초)
         """
-        prompt_path = "backend/prompts/summarize_pdf.yaml"
-        prompt = load_message(prompt_path)
-        sys_prompt=  load_prompt(prompt_path)
-        prefix = load_prefix(prompt_path)
-        prompt = '\n\n'.join([prompt, prefix])
+        get_openai_api_key(CONFIG_PATH)
+        self.mode = mode
+        self.max_attempts = max(1, max_attempts)
+        self.time_budget = time_budget
+        # 재시도는 generate_summary에서 예산 안에서만 수행하므로 클라이언트 재시도는 끕니다.
+        self.llm = ChatOpenAI(model_name='gpt-4o-mini',  # 'gpt-3.5-turbo' or 'gpt-4o-mini'
+                      temperature=0, max_tokens=1500, max_retries=0)
+
+    def _build_messages(self, text: str) -> list:
+        prompt_config = load_prompt_config(SUMMARY_PROMPT_PATH)
+        sys_prompt = prompt_config["prompt"]
+        prompt = prompt_config["message"]
+        if self.mode == "text":
+            prompt = '\n\n'.join([prompt, prompt_config["prefix"]])
         prompt = prompt.format(**{
             "content": text
         })
-        system_message = SystemMessage(content=sys_prompt)
-        human_message = HumanMessage(content=prompt)
-        required_keys = [
-            "summary", "annualReturn", "volatility", "managementFee", "minimumInvestment",
-            "lockupPeriod", "riskLevel","key_findings"
-        ]
-
-        while True:
-            try:
-                print("sumarizing...")
-                response = self.llm.generate([[system_message, human_message]])
-                response = response.generations[0][0].text
-                
-
-                # 멀티라인 대응 파서
-                parsed = {}
-                for line in response.strip().split('\n'):
-                    # ':'가 없는 라인은 건너뛰기
-                    if ':' not in line:
-                        continue
-                        
-                    key, value = line.split(':', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    if key == 'key_findings':
-                        # 각 항목의 공백 제거
-                        parsed[key] = [item.strip() for item in value.split(",")]
-                    else:
-                        parsed[key] = value
-
-                for key in required_keys:
-                    if key not in parsed:
-                        raise ValueError(f"누락된 항목: {key}")
-                    
-                
+        return [SystemMessage(content=sys_prompt), HumanMessage(content=prompt)]
+
+    def _request(self, messages: list, timeout: float) -> dict:
+        """한 번의 LLM 호출로 얻은 (부분) 요약 항목을 반환합니다."""
+        if self.mode == "text":
+            with span("llm.summarize", mode=self.mode) as llm_span:
+                response = self.llm.invoke(messages, timeout=timeout)
+                llm_span.record_usage(response)
+            return parse_summary_text(response.content)
+
+        try:
+            with span("llm.summarize", mode=self.mode) as llm_span:
+                response = self.llm.invoke(messages, response_format=PDFSummary, timeout=timeout)
+                llm_span.record_usage(response)
+        except LengthFinishReasonError as e:
+            # 출력이 잘린 경우에도 완성된 항목은 살립니다.
+            content = e.completion.choices[0].message.content or ""
+            return parse_summary_text(content)
+
+        parsed = response.additional_kwargs.get("parsed")
+        if isinstance(parsed, PDFSummary):
+            return parsed.model_dump()
+        if isinstance(parsed, dict):
+            return parsed
+        return parse_summary_text(response.content or "")
+
+    def generate_summary(self, text: str, strict: bool = False) -> dict:
+        """
+        text: 파싱된 전체 텍스트
+        strict: True이면 부분 결과 대신 SummaryIncompleteError를 발생시킵니다.
+        반환: 요약 항목 dict. 시도 횟수나 시간 예산을 모두 소진하면
+              가장 많이 채워진 부분 결과에 누락 항목을 기본값으로 채워 반환합니다.
+        """
+        messages = self._build_messages(text)
+        deadline = time.monotonic() + self.time_budget
+        best = {}
+
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Summary time budget exhausted")
                 break
 
+            try:
+                logger.info(f"Summarizing ({self.mode}, attempt {attempt}/{self.max_attempts})...")
+                parsed = self._request(messages, timeout=remaining)
             except Exception as e:
-                print(e)
-                print("Retrying...")
-                parsed = "요약에 문제가 있습니다."
+                logger.error(f"Summary attempt {attempt} failed: {e}")
+                continue
 
-        return parsed
+            if len(parsed) > len(best):
+                best = parsed
+
+            missing = [key for key in REQUIRED_SUMMARY_KEYS if not best.get(key)]
+            if not missing:
+                return best
+            logger.warning(f"누락된 항목: {missing}")
+
+        missing = [key for key in REQUIRED_SUMMARY_KEYS if not best.get(key)]
+        if strict:
+            raise SummaryIncompleteError(missing)
+        logger.warning("Returning partial summary")
+        result = {}
+        for key in REQUIRED_SUMMARY_KEYS:
+            if best.get(key):
+                result[key] = best[key]
+            else:
+                result[key] = [] if key == "key_findings" else MISSING_SUMMARY_VALUE
+        return result
 
 
 # DocumentParser와 LLMSummarizer를 조합해 PDF를 처리하는 클래스
@@ -83,10 +199,10 @@ class PDFProcessor:
         self.parser = parser
         self.summarizer = summarizer
     
-    def process_pdf(self, file_obj) -> str:
+    def parse(self, file_obj) -> str:
         """
         file_obj: 업로드된 PDF 파일 객체
-        반환: LLM으로 생성한 summary
+        반환: 파싱된 텍스트
         """
         parse_result = self.parser.parse(file_obj)
 
@@ -101,6 +217,14 @@ class PDFProcessor:
 
         if not parse_result:
             parse_result = "파싱된 텍스트가 없습니다."
+        return parse_result
+
+    def process_pdf(self, file_obj) -> str:
+        """
+        file_obj: 업로드된 PDF 파일 객체
+        반환: (파싱된 텍스트, LLM으로 생성한 summary)
+        """
+        parse_result = self.parse(file_obj)
         summary = self.summarizer.generate_summary(parse_result)
         print(summary)
         return parse_result, summary
@@ -1,11 +1,77 @@
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import Session
 from datetime import datetime
 db = SQLAlchemy()
 
 
+def own_session() -> Session:
+    """A session of its own, for stores used from tool threads
+
+    db.session is one per app context, and tool calls of one turn share the
+    request's context, so parallel tools would commit and roll back each
+    other's work through it.
+    """
+    return Session(db.engine)
+
+
 class PDFFile(db.Model):
     __tablename__ = 'pdf_files'
     id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.String(64), unique=True, nullable=False, index=True)  # SHA-256 of the PDF bytes
     filename = db.Column(db.String(256), nullable=False)
     file_url = db.Column(db.String(512), nullable=False)  # 저장 경로나 URL
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    s3_key = db.Column(db.String(256), nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DocumentArtifact(db.Model):
+    """문서별로 한 번만 계산하면 되는 결과 (파싱 텍스트, 요약, 독소조항 등)"""
+    __tablename__ = 'document_artifacts'
+    __table_args__ = (db.UniqueConstraint('document_id', 'kind'),)
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.String(64), db.ForeignKey('pdf_files.document_id'), nullable=False, index=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ArticleFingerprint(db.Model):
+    """문서의 조(article)별 해시: 개정판 업로드 시 이전 버전을 찾는 데 사용"""
+    __tablename__ = 'article_fingerprints'
+    __table_args__ = (db.UniqueConstraint('document_id', 'article_hash'),)
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.String(64), db.ForeignKey('pdf_files.document_id'), nullable=False, index=True)
+    article_hash = db.Column(db.String(64), nullable=False, index=True)  # SHA-256 of the article text without whitespace
+
+
+class SessionDocument(db.Model):
+    """세션이 업로드(또는 재사용)한 문서"""
+    __tablename__ = 'session_documents'
+    __table_args__ = (db.UniqueConstraint('session_id', 'document_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), nullable=False, index=True)
+    document_id = db.Column(db.String(64), db.ForeignKey('pdf_files.document_id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CaseSummary(db.Model):
+    """LLM으로 정리한 판례 요약 (판례 본문의 SHA-256 기준으로 한 번만 생성)"""
+    __tablename__ = 'case_summaries'
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.String(64), unique=True, nullable=False, index=True)  # SHA-256 of the summary version and case text
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ClauseVerdict(db.Model):
+    """조항별 독소조항 판정과 연결된 판례 (여러 계약서에 반복되는 정형 조항 재사용)"""
+    __tablename__ = 'clause_verdicts'
+    __table_args__ = (db.UniqueConstraint('clause_hash', 'prompt_version'),)
+    id = db.Column(db.Integer, primary_key=True)
+    clause_hash = db.Column(db.String(64), nullable=False, index=True)  # SHA-256 of the normalized article text
+    prompt_version = db.Column(db.String(16), nullable=False, index=True)  # hash of the prompts and model that produced it
+    verdict = db.Column(db.Text, nullable=False)  # JSON
+    embedding = db.Column(db.LargeBinary, nullable=True)  # float32, for similarity lookups
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
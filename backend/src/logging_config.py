@@ -0,0 +1,201 @@
+"""
+Process-wide logging setup: non-blocking, structured, bounded.
+
+Request threads only put records on a queue; a listener thread formats them
+and writes them to stderr, so slow terminals or log collectors never add to
+request latency. When the queue is full, records are dropped and counted
+instead of blocking. Every message and extra field is truncated to
+LOG_MAX_FIELD_CHARS.
+
+Large payloads (agent state, tool results, prompts) should be logged through
+log_payload(): at DEBUG level, sampled by LOG_PAYLOAD_SAMPLE_RATE, and
+rendered with a bounded repr only when the record is actually emitted.
+
+Configured from the environment (see src/config.py):
+    LOG_LEVEL=INFO LOG_FORMAT=json LOG_MODULE_LEVELS="src.agent=DEBUG,src.tools.highlight=WARNING"
+
+Entry points call configure_logging() before importing the app.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import reprlib
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+
+from src.config import (
+    LOG_FORMAT, LOG_LEVEL, LOG_MAX_FIELD_CHARS, LOG_MODULE_LEVELS, LOG_PAYLOAD_SAMPLE_RATE, LOG_QUEUE_SIZE
+)
+from src.telemetry import metrics
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_lock = threading.Lock()
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_output_handler: Optional[logging.Handler] = None
+
+
+def truncate(text: str, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... [{len(text) - limit} more chars]"
+    return text
+
+
+class _BoundedRepr(reprlib.Repr):
+    def __init__(self, limit: int):
+        super().__init__()
+        self.maxstring = self.maxother = max(limit // 4, 40)
+        self.maxlist = self.maxtuple = self.maxdict = self.maxset = 20
+        self.maxlevel = 4
+
+
+class Payload:
+    """Lazily rendered, size-bounded view of a large object for log messages
+
+    reprlib stops at fixed depth/length limits, so rendering cost does not
+    grow with the payload, and nothing is rendered if the record is filtered.
+    """
+
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj, limit: int = LOG_MAX_FIELD_CHARS):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if isinstance(self.obj, str):
+            return truncate(self.obj, self.limit)
+        return truncate(_BoundedRepr(self.limit).repr(self.obj), self.limit)
+
+    __repr__ = __str__
+
+
+def log_payload(logger: logging.Logger, message: str, obj, level: int = logging.DEBUG,
+                sample_rate: Optional[float] = None) -> None:
+    """Log `message: <obj>` for a sampled fraction of calls (all of them above DEBUG)"""
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if level <= logging.DEBUG and rate < 1 and random.random() >= rate:
+        return
+    logger.log(level, "%s: %s", message, Payload(obj))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, thread, exception and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage()),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = truncate(value) if isinstance(value, str) else value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = truncate(record.exc_text, LOG_MAX_FIELD_CHARS * 4)
+        return orjson.dumps(entry, default=lambda value: truncate(str(value)),
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+
+class TruncatingFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return truncate(super().format(record), LOG_MAX_FIELD_CHARS * 4)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never waits: the message is rendered (bounded) here, everything else in the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            # Traceback objects hold frames that can change once the caller returns
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("financeguard_log_records_dropped_total", help="Log records dropped because the queue was full")
+
+
+def parse_module_levels(spec: str) -> dict:
+    """"src.agent=DEBUG,src.tools.highlight=WARNING" -> {"src.agent": "DEBUG", ...}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener() -> None:
+    global _listener
+    _queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, _output_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork() -> None:
+    # The listener thread does not survive fork(); records queued in the parent stay there
+    if _queue_handler is not None:
+        _start_listener()
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def configure_logging(level: str = None, fmt: str = None, module_levels: str = None) -> None:
+    """Route the root logger through the queue; safe to call more than once"""
+    global _queue_handler, _output_handler
+    level = (level or LOG_LEVEL).upper()
+    fmt = fmt or LOG_FORMAT
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        _output_handler = logging.StreamHandler(sys.stderr)
+        _output_handler.setFormatter(JsonFormatter() if fmt == "json" else TruncatingFormatter(TEXT_FORMAT))
+        first_call = _queue_handler is None
+        if first_call:
+            _queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+            atexit.register(stop_logging)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_restart_after_fork)
+        _start_listener()
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+        for name, module_level in parse_module_levels(module_levels if module_levels is not None else LOG_MODULE_LEVELS).items():
+            logging.getLogger(name).setLevel(module_level)
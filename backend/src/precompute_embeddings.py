@@ -1,30 +1,39 @@
 import json
+import os
+import sys
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
 
-def precompute_embeddings():
-    print("Loading model...")
-    model = SentenceTransformer("nlpai-lab/KURE-v1")
+# Allow running as a script from backend/src as well as with `python -m src.precompute_embeddings`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import CASE_DB_PATH, CASE_LEXICAL_INDEX_PATH, EMBEDDING_BACKEND, EMBEDDING_PATH
+from src.tools.encoder_backends import load_encoder
+from src.tools.lexical import build_case_index
+
+def precompute_embeddings(batch_size: int = 64):
+    print(f"Loading model ({EMBEDDING_BACKEND} backend)...")
+    model = load_encoder()
     
     print("Loading case database...")
-    with open("../datasets/case_db.json", 'r', encoding='utf-8') as f:
+    with open(CASE_DB_PATH, 'r', encoding='utf-8') as f:
         cases = json.load(f)
     
     print("Computing embeddings...")
-    case_texts = []
-    case_embeddings = []
-    
-    for case in tqdm(cases, desc="Computing embeddings"):
-        case_texts.append(case['key'])
-        case_embeddings.append(model.encode(case['key']))
+    case_texts = [case['key'] for case in cases]
+    case_embeddings = model.encode(case_texts, batch_size=batch_size, show_progress_bar=True)
     
     # 임베딩을 numpy 배열로 저장
-    np.savez('../datasets/precomputed_embeddings.npz',
+    np.savez(EMBEDDING_PATH,
              texts=case_texts,
-             embeddings=np.array(case_embeddings))
+             embeddings=np.asarray(case_embeddings, dtype=np.float32))
     
     print("Embeddings saved successfully!")
+    
+    # 하이브리드 검색용 BM25 색인
+    print("Building lexical index...")
+    lexical_index = build_case_index(cases)
+    lexical_index.save(CASE_LEXICAL_INDEX_PATH)
+    print(f"Lexical index saved: {len(lexical_index.vocabulary)} terms")
 
 if __name__ == "__main__":
-    precompute_embeddings()
\ No newline at end of file
+    precompute_embeddings()
@@ -0,0 +1,159 @@
+"""
+Pre-fork worker support: load shared read-only state once in the master and
+let forked workers share it copy-on-write.
+
+The master (see gunicorn.conf.py) calls preload() after importing the app:
+the embedding model, the normalized case embeddings and the fast router's
+example embeddings are loaded, then gc.freeze() moves every object into the
+permanent generation so the collector does not dirty the shared pages.
+Each worker calls after_fork() to drop handles that must not cross a fork
+and to size its torch thread pool.
+
+Per-worker memory:
+    python -m src.prefork memory <master pid>
+"""
+
+import argparse
+import gc
+import logging
+import os
+import sys
+from typing import Dict, List, Optional, Union
+
+from src import startup
+from src.config import EMBEDDING_BACKEND, EMBEDDING_ONNX_THREADS, TORCH_THREADS_PER_WORKER
+from src.telemetry import metrics
+from src.tools.embeddings import stop_batching
+from src.tools.encoder_backends import set_intra_op_threads
+
+logger = logging.getLogger(__name__)
+
+# Warm-up steps whose state is read-only after loading and can be shared;
+# the agent graph holds a SQLite connection and is built per worker. ONNX
+# Runtime sessions cannot be shared either, so with an ONNX backend only the
+# case embeddings are preloaded.
+SHARED_STEPS = ("embedding_model", "case_retriever", "fast_router") if EMBEDDING_BACKEND == "torch" else ("case_retriever",)
+
+
+def set_torch_threads(threads: int) -> None:
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def worker_threads(workers: int) -> int:
+    """Intra-op torch threads per worker, so workers together do not oversubscribe the CPUs"""
+    if TORCH_THREADS_PER_WORKER > 0:
+        return TORCH_THREADS_PER_WORKER
+    return max(1, (os.cpu_count() or 1) // max(workers, 1))
+
+
+def preload(tools) -> None:
+    """Load the shared state in the master; call before any worker is forked"""
+    # Encode single-threaded in the master: forking after a multi-threaded
+    # OpenMP region can leave the children's thread pool deadlocked
+    set_torch_threads(1)
+    startup.warm_up(tools, only=SHARED_STEPS)
+    # Fork from a single-threaded master; workers start their own batcher thread
+    stop_batching()
+    gc.collect()
+    gc.freeze()
+    memory = process_memory()
+    logger.info(f"Preloaded shared state in master {os.getpid()}: rss={_mb(memory['rss'])}MB")
+
+
+def after_fork(workers: int, app=None) -> None:
+    """Per-worker setup; call in the child right after the fork"""
+    set_torch_threads(worker_threads(workers))
+    if EMBEDDING_ONNX_THREADS == 0:
+        set_intra_op_threads(worker_threads(workers))
+
+    # Clients and pooled connections inherited from the master share its
+    # sockets; every worker opens its own
+    from src import documents
+    documents._s3_client = None
+    if app is not None:
+        from src.imsi.model import db
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, int]:
+    """RSS, PSS and USS (pages private to the process) in bytes
+
+    USS is what a worker really costs: pages still shared with the master are
+    counted in RSS but not in USS. Linux only; elsewhere only RSS is known.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) * 1024
+        return {
+            "rss": fields.get("Rss", 0),
+            "pss": fields.get("Pss", 0),
+            "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        }
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = peak if sys.platform == "darwin" else peak * 1024
+        return {"rss": rss, "pss": 0, "uss": 0}
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return sorted(children)
+
+
+def memory_report(master_pid: int) -> dict:
+    master = process_memory(master_pid)
+    workers = {child: process_memory(child) for child in child_pids(master_pid)}
+    return {
+        "master": {"pid": master_pid, **master},
+        "workers": [{"pid": pid, **memory} for pid, memory in workers.items()],
+        "total_uss": master["uss"] + sum(memory["uss"] for memory in workers.values()),
+        "total_rss": master["rss"] + sum(memory["rss"] for memory in workers.values()),
+    }
+
+
+def _mb(value: int) -> str:
+    return f"{value / 2 ** 20:.1f}"
+
+
+def get_process_memory_stats() -> dict:
+    # Keyed by pid: each scrape lands on one worker
+    return {str(os.getpid()): {f"{kind}_bytes": value for kind, value in process_memory().items()}}
+
+
+metrics.register_collector("financeguard_process_memory", get_process_memory_stats)
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-fork worker diagnostics")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    memory_parser = subparsers.add_parser("memory", help="RSS/PSS/USS of a master and its workers")
+    memory_parser.add_argument("pid", type=int, help="pid of the gunicorn master")
+    args = parser.parse_args(argv)
+
+    report = memory_report(args.pid)
+    print(f"{'role':<8}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'uss MB':>10}")
+    rows = [("master", report["master"])] + [("worker", worker) for worker in report["workers"]]
+    for role, row in rows:
+        print(f"{role:<8}{row['pid']:>8}{_mb(row['rss']):>10}{_mb(row['pss']):>10}{_mb(row['uss']):>10}")
+    print(f"total uss {_mb(report['total_uss'])}MB (sum of rss {_mb(report['total_rss'])}MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+JSON encoding for API responses and tool messages.
+
+orjson serializes numpy scalars and arrays natively (similarity scores are
+np.float32), so results no longer need a recursive conversion pass before
+json.dumps. Output is UTF-8, i.e. the same as json.dumps(..., ensure_ascii=False).
+"""
+
+import orjson
+from flask.json.provider import JSONProvider
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps_bytes(obj) -> bytes:
+    return orjson.dumps(obj, option=OPTIONS)
+
+
+def dumps(obj) -> str:
+    return orjson.dumps(obj, option=OPTIONS).decode('utf-8')
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider (jsonify, request.get_json) backed by orjson"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype="application/json")
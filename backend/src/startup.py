@@ -0,0 +1,230 @@
+"""
+Startup modes, warm-up and import-time reporting for the backend process.
+
+STARTUP_MODE controls when the heavy pieces (embedding model, case corpus,
+compiled agent graph) are loaded:
+    "lazy"       - nothing is preloaded; each piece loads on first use
+    "background" - the app serves at once and warms up in a daemon thread
+    "eager"      - warm-up finishes before the app starts serving
+
+Command line (from the backend directory):
+    python -m src.startup report [--module src.api.routes] [--top 20]
+    python -m src.startup warmup
+    python -m src.startup check [--budget 5]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.config import FAST_ROUTER_ENABLED, STARTUP_BUDGET_SECONDS, STARTUP_MODE
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESS_START = time.monotonic()
+
+_state = {"mode": STARTUP_MODE, "status": "pending", "steps": {}, "seconds": None}
+_state_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+
+
+def _warmup_steps(tools) -> List[Tuple[str, Callable[[], None]]]:
+    # Imported here so that importing this module stays cheap
+    from src.agent.core import get_fast_router, get_legal_assistant_agent
+    from src.tools.embeddings import get_embedding_model
+    from src.tools.highlight import get_case_retriever
+
+    steps = [
+        ("embedding_model", lambda: get_embedding_model().encode("warm-up")),
+        ("case_retriever", lambda: get_case_retriever().prepare()),
+        ("agent_graph", lambda: get_legal_assistant_agent(tools, persistent=True)),
+    ]
+    if FAST_ROUTER_ENABLED:
+        steps.append(("fast_router", lambda: get_fast_router(tools).classify("warm-up")))
+    return steps
+
+
+def warm_up(tools, only: Optional[Sequence[str]] = None) -> dict:
+    """Load models, data and the agent graph now; safe to call more than once
+
+    After a failed warm-up, calling it again retries the failed steps.
+    `only` runs just the named steps and leaves the process not ready
+    (used by the pre-fork master, see src/prefork.py).
+    """
+    with _warmup_lock:
+        with _state_lock:
+            if _state["status"] == "done":
+                return status()
+            if only is None:
+                _state["status"] = "running"
+
+        start = time.perf_counter()
+        failed = False
+        for name, step in _warmup_steps(tools):
+            if only is not None and name not in only:
+                continue
+            previous = _state["steps"].get(name)
+            if previous and previous["error"] is None:
+                continue  # already loaded, e.g. by the pre-fork master
+            step_start = time.perf_counter()
+            error = None
+            try:
+                step()
+            except Exception as e:
+                failed = True
+                error = str(e)
+                logger.error(f"Warm-up step {name} failed: {e}")
+            with _state_lock:
+                _state["steps"][name] = {"seconds": round(time.perf_counter() - step_start, 3), "error": error}
+
+        elapsed = time.perf_counter() - start
+        if only is not None:
+            logger.info(f"Warmed up {', '.join(only)} in {elapsed:.2f}s")
+            return status()
+        with _state_lock:
+            _state["status"] = "failed" if failed else "done"
+            _state["seconds"] = round(elapsed, 3)
+        logger.info(f"Warm-up finished in {elapsed:.2f}s: {_state['steps']}")
+        return status()
+
+
+def start(tools, mode: Optional[str] = None, started_at: Optional[float] = None) -> None:
+    """Begin the configured startup mode; call once the app object exists
+
+    `started_at` is a time.monotonic() taken at process start, used to check
+    the import phase against STARTUP_BUDGET_SECONDS.
+    """
+    mode = mode or STARTUP_MODE
+    with _state_lock:
+        _state["mode"] = mode
+
+    elapsed = time.monotonic() - (started_at if started_at is not None else PROCESS_START)
+    logger.info(f"App imported in {elapsed:.2f}s (startup mode: {mode})")
+    if elapsed > STARTUP_BUDGET_SECONDS:
+        logger.warning(f"Startup took {elapsed:.2f}s, over the {STARTUP_BUDGET_SECONDS:.1f}s budget")
+
+    if mode == "eager":
+        warm_up(tools)
+    elif mode == "background":
+        threading.Thread(target=warm_up, args=(tools,), name="warm-up", daemon=True).start()
+
+
+def is_ready() -> bool:
+    """True once requests will not pay for a cold load; never after a failed warm-up"""
+    with _state_lock:
+        return _state["mode"] == "lazy" or _state["status"] == "done"
+
+
+def status() -> dict:
+    with _state_lock:
+        return {
+            "mode": _state["mode"],
+            "warmup": _state["status"],
+            "warmup_seconds": _state["seconds"],
+            "steps": {name: dict(step) for name, step in _state["steps"].items()},
+            "uptime_seconds": round(time.monotonic() - PROCESS_START, 3),
+        }
+
+
+IMPORT_TIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def import_time_report(module: str = "src.api.routes", top: int = 20) -> dict:
+    """Import `module` in a fresh interpreter with -X importtime and summarize the slowest imports"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    by_package: Dict[str, int] = {}
+    for name, self_us, _, _ in entries:
+        root = name.split(".")[0]
+        by_package[root] = by_package.get(root, 0) + self_us
+
+    target = next((e for e in entries if e[0] == module), None)
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode else None,
+        "total_seconds": round(target[2] / 1e6, 3) if target else None,
+        "slowest": [
+            {"module": name, "cumulative_seconds": round(cumulative / 1e6, 3), "depth": depth}
+            for name, _, cumulative, depth in sorted(entries, key=lambda e: -e[2])[:top]
+        ],
+        "by_package": {
+            root: round(us / 1e6, 3)
+            for root, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+        },
+    }
+
+
+def time_to_healthy(timeout: float = 120.0) -> float:
+    """Launch app.py on a free port and return seconds until /healthz answers 200"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    env = dict(os.environ, PORT=str(port), HOST="127.0.0.1")
+    start = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.monotonic() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"app.py exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as response:
+                    if response.status == 200:
+                        return time.monotonic() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"/healthz did not answer within {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backend startup diagnostics")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="import-time breakdown")
+    report_parser.add_argument("--module", default="src.api.routes")
+    report_parser.add_argument("--top", type=int, default=20)
+    subparsers.add_parser("warmup", help="run the warm-up steps and print their timings")
+    check_parser = subparsers.add_parser("check", help="fail if time to first healthy response exceeds the budget")
+    check_parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        print(json.dumps(import_time_report(args.module, args.top), indent=2))
+        return 0
+    if args.command == "warmup":
+        from src.tools.tool_registry import get_registered_tools
+        print(json.dumps(warm_up(get_registered_tools()), indent=2))
+        return 0
+
+    elapsed = time_to_healthy()
+    within = elapsed <= args.budget
+    print(f"Time to first healthy response: {elapsed:.2f}s (budget {args.budget:.1f}s) - {'OK' if within else 'OVER BUDGET'}")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Lightweight tracing and metrics for the request pipeline.
+
+Every stage (graph node, LLM/Upstage/S3/Tavily call, embedding encode) is
+wrapped in `span()`, which records its duration and optional token counts
+and payload sizes. Metrics are exposed in Prometheus text format via
+`render_prometheus()`; spans are also exported to an OpenTelemetry
+collector when TELEMETRY_OTLP_ENDPOINT is set and opentelemetry is installed.
+"""
+
+import bisect
+import functools
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Tuple
+
+from src.config import TELEMETRY_ENABLED, TELEMETRY_OTLP_ENDPOINT, TELEMETRY_SERVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self._bucket_sets: Dict[str, Tuple[float, ...]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    @staticmethod
+    def _labels(labels: dict) -> LabelSet:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, buckets=DURATION_BUCKETS, help: str = "", **labels) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            self._bucket_sets.setdefault(name, tuple(buckets))
+            self._help.setdefault(name, help)
+            if key not in series:
+                series[key] = Histogram(self._bucket_sets[name])
+            series[key].observe(value)
+
+    def register_collector(self, name: str, collector: Callable[[], dict]) -> None:
+        """Export gauges computed at scrape time; `collector` returns {metric_suffix: value}
+        or {label_value: {metric_suffix: value}} for one label dimension"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Render everything in the Prometheus text exposition format"""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            collectors = dict(self._collectors)
+            help_texts = dict(self._help)
+
+        lines = []
+        for name, series in sorted(counters.items()):
+            if help_texts.get(name):
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for name, series in sorted(histograms.items()):
+            if help_texts.get(name):
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (buckets, counts, total, count) in series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        for name, collector in sorted(collectors.items()):
+            try:
+                values = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector {name} failed: {e}")
+                continue
+            gauges: Dict[str, list] = {}
+            for (metric, key), value in _flatten_gauges(name, values):
+                gauges.setdefault(metric, []).append(f"{metric}{_format_labels(key)} {_format_value(value)}")
+            for metric, samples in gauges.items():
+                lines.append(f"# TYPE {metric} gauge")
+                lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key: LabelSet) -> str:
+    if not key:
+        return ""
+    escaped = (
+        '{}="{}"'.format(label, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+        for label, value in key
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _flatten_gauges(name: str, values: dict):
+    for field, value in values.items():
+        if isinstance(value, dict):
+            for suffix, inner in value.items():
+                if isinstance(inner, (int, float)) and not isinstance(inner, bool):
+                    yield (f"{name}_{suffix}", (("key", str(field)),)), inner
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield (f"{name}_{field}", ()), value
+
+
+metrics = MetricsRegistry()
+
+
+# Optional OpenTelemetry export
+_tracer = None
+
+def _init_tracer():
+    global _tracer
+    if not (TELEMETRY_ENABLED and TELEMETRY_OTLP_ENDPOINT):
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("TELEMETRY_OTLP_ENDPOINT is set but opentelemetry is not installed; span export disabled")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": TELEMETRY_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=TELEMETRY_OTLP_ENDPOINT)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer(__name__)
+    logger.info(f"Exporting spans to {TELEMETRY_OTLP_ENDPOINT}")
+
+_init_tracer()
+
+
+class Span:
+    """Handle yielded by `span()` for attaching measurements to the current stage"""
+
+    def __init__(self, name: str, otel_span=None):
+        self.name = name
+        self._otel_span = otel_span
+
+    def set(self, key: str, value) -> None:
+        if self._otel_span is not None:
+            self._otel_span.set_attribute(key, value)
+
+    def record_usage(self, response) -> None:
+        """Record token counts from an OpenAI completion or a LangChain AIMessage"""
+        prompt_tokens = completion_tokens = None
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if usage_metadata:
+            prompt_tokens = usage_metadata.get("input_tokens")
+            completion_tokens = usage_metadata.get("output_tokens")
+        for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+            if tokens:
+                record_tokens(self.name, kind, tokens)
+                self.set(f"llm.{kind}_tokens", tokens)
+
+    def record_payload(self, size: int, direction: str = "in") -> None:
+        """Record bytes sent ("out") or received ("in") by this stage"""
+        if size is None:
+            return
+        record_payload(self.name, size, direction)
+        self.set(f"payload.{direction}_bytes", size)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a pipeline stage; failures are counted and re-raised"""
+    if not TELEMETRY_ENABLED:
+        yield Span(name)
+        return
+
+    otel_context = _tracer.start_as_current_span(name, attributes=attributes) if _tracer else None
+    otel_span = otel_context.__enter__() if otel_context else None
+    start = time.perf_counter()
+    status = "ok"
+    exc_info = (None, None, None)
+    try:
+        yield Span(name, otel_span)
+    except BaseException:
+        status = "error"
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        metrics.observe(
+            "financeguard_stage_duration_seconds", duration,
+            help="Duration of pipeline stages", stage=name, status=status
+        )
+        if status == "error":
+            metrics.inc("financeguard_stage_errors_total", help="Failed pipeline stages", stage=name)
+        if otel_context:
+            otel_context.__exit__(*exc_info)
+        logger.debug(f"{name} took {duration * 1000:.1f}ms ({status})")
+
+
+def traced(name: str):
+    """Decorator form of `span()` for graph nodes and other callables"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_tokens(stage: str, kind: str, tokens: int) -> None:
+    if TELEMETRY_ENABLED:
+        metrics.inc("financeguard_llm_tokens_total", tokens, help="LLM tokens by stage", stage=stage, kind=kind)
+
+
+def record_payload(stage: str, size: int, direction: str = "in") -> None:
+    if TELEMETRY_ENABLED:
+        metrics.observe(
+            "financeguard_payload_bytes", size, buckets=PAYLOAD_BUCKETS,
+            help="Payload sizes of external calls", stage=stage, direction=direction
+        )
+
+
+def render_prometheus() -> str:
+    return metrics.render()
@@ -0,0 +1,130 @@
+"""
+Cache of LLM-formatted precedent summaries.
+
+The case tools format a precedent with FORMAT_PROMPT_PATH before showing it,
+which costs a GPT call per case. The result only depends on the case text and
+on the format prompt and model (the summary version), so it is stored once
+under the SHA-256 of both: in process memory, and in the document database
+when an application context is active (tool calls run inside the request's
+context), so every worker shares it. Changing the prompt or the model starts
+fresh summaries. /api/cases serves these summaries without calling the LLM.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from src.config import FORMAT_PROMPT_PATH
+from src.imsi.model import CaseSummary, own_session
+from src.telemetry import metrics
+from src.tools.clause_cache import prompt_version
+
+logger = logging.getLogger(__name__)
+
+# Section labels of the format prompt's output ("제목: ...", "요약: ...")
+SECTION_PATTERN = re.compile(r'^\s*(제목|요약|핵심\s*포인트|판결\s*결과)\s*[:：]\s*', re.MULTILINE)
+SECTION_FIELDS = {"제목": "title", "요약": "summary", "핵심포인트": "keyPoints", "판결결과": "result"}
+BULLET_PATTERN = re.compile(r'^\s*(?:[-•·*]|\d+[.)])\s*')
+
+# Model every case tool formats precedents with
+FORMAT_MODEL = "gpt-4o-mini"
+
+
+def case_id(case_text: str) -> str:
+    return hashlib.sha256(str(case_text).encode('utf-8')).hexdigest()
+
+
+def summary_version(format_prompt: str, model: str = FORMAT_MODEL) -> str:
+    return prompt_version(format_prompt, model)
+
+
+@lru_cache(maxsize=1)
+def default_summary_version() -> str:
+    """Version of summaries made with the FORMAT_PROMPT_PATH prompt, for readers that format nothing themselves"""
+    try:
+        with open(FORMAT_PROMPT_PATH, 'r', encoding='utf-8') as f:
+            return summary_version(f.read())
+    except OSError as e:
+        logger.error(f"Error loading format prompt: {e}")
+        return summary_version("")
+
+
+def summary_key(case_text: str, version: str) -> str:
+    return hashlib.sha256(f"{version}\x00{case_text}".encode('utf-8')).hexdigest()
+
+
+def parse_summary(text: str) -> dict:
+    """Split a formatted case into title / summary / keyPoints / result"""
+    parsed = {}
+    matches = list(SECTION_PATTERN.finditer(text or ""))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        field = SECTION_FIELDS[re.sub(r'\s+', '', match.group(1))]
+        parsed[field] = text[match.end():end].strip()
+    if "keyPoints" in parsed:
+        lines = (BULLET_PATTERN.sub("", line).strip() for line in parsed["keyPoints"].splitlines())
+        parsed["keyPoints"] = [line for line in lines if line]
+    return parsed
+
+
+class CaseSummaryStore:
+    """Formatted case summaries keyed by summary version and case content hash"""
+
+    def __init__(self):
+        self._summaries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, case_texts: Iterable[str], version: str) -> Dict[str, str]:
+        """Cached summaries of the given cases, keyed by case_id; missing cases are left out"""
+        keys = {summary_key(text, version): case_id(text) for text in case_texts}
+        with self._lock:
+            found = {key: self._summaries[key] for key in keys if key in self._summaries}
+        missing = keys.keys() - found.keys()
+        if missing and has_app_context():
+            try:
+                with own_session() as s:
+                    rows = s.query(CaseSummary.case_id, CaseSummary.summary).filter(
+                        CaseSummary.case_id.in_(missing)).all()
+            except SQLAlchemyError as e:
+                logger.warning(f"Case summary lookup failed: {e}")
+                rows = []
+            with self._lock:
+                for key, summary in rows:
+                    self._summaries[key] = found[key] = summary
+        return {keys[key]: summary for key, summary in found.items()}
+
+    def get(self, case_text: str, version: str) -> Optional[str]:
+        summary = self.get_many([case_text], version).get(case_id(case_text))
+        metrics.inc("financeguard_case_summary_cache_total", help="Formatted case summary lookups",
+                    result="hit" if summary is not None else "miss")
+        return summary
+
+    def put(self, case_text: str, version: str, summary: str) -> None:
+        key = summary_key(case_text, version)
+        with self._lock:
+            self._summaries[key] = summary
+        if not has_app_context():
+            return
+        try:
+            with own_session() as s:
+                s.add(CaseSummary(case_id=key, summary=summary))
+                s.commit()
+        except IntegrityError:
+            pass  # another worker formatted the same case first
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not store case summary: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._summaries)}
+
+
+case_summaries = CaseSummaryStore()
+
+metrics.register_collector("financeguard_case_summaries", case_summaries.get_stats)
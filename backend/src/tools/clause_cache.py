@@ -0,0 +1,284 @@
+"""
+Cross-document cache of toxic clause verdicts, one entry per contract article.
+
+Financial contracts repeat the same boilerplate articles (fees, early
+termination, jurisdiction). ToxicClauseFinder looks every article up here
+before calling the LLM. A hit returns the clauses found in that article with
+their linked precedent and formatted summary, so neither the LLM nor the
+retriever runs for it again. Articles without toxic clauses are cached as
+empty verdicts.
+
+Keys are the SHA-256 of the article text after NFKC normalization with the
+article number and all whitespace removed, so renumbered boilerplate still
+matches. Entries are scoped by a prompt version (hash of the prompts, the
+model and the case corpus content): changing any of them starts a fresh
+cache. Stored versions nobody has written for CLAUSE_CACHE_RETIRE_DAYS are
+deleted, so workers still running an older version during a rolling deploy
+keep their entries. With CLAUSE_CACHE_SEMANTIC a miss falls back
+to the most similar cached article with toxic clauses, accepted only if
+every cached clause quote also appears in the new article. Empty verdicts
+need an exact key match: nothing in a similar article proves that an edited
+one is still clean.
+
+Like the case summaries, entries are kept in process memory and in the
+document database when an application context is active.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from flask import has_app_context
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from src.config import (
+    CLAUSE_CACHE_MAX_ENTRIES, CLAUSE_CACHE_RETIRE_DAYS, CLAUSE_CACHE_SEMANTIC, CLAUSE_CACHE_SEMANTIC_THRESHOLD
+)
+from src.imsi.model import ClauseVerdict, own_session
+from src.telemetry import metrics
+from src.tools.segmentation import ARTICLE_NUMBER_PATTERN
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_article(text: str) -> str:
+    """NFKC, leading article number ("제12조") and whitespace removed"""
+    text = unicodedata.normalize("NFKC", text).strip()
+    header = ARTICLE_NUMBER_PATTERN.match(text)
+    if header:
+        text = text[header.end():]
+    return re.sub(r'\s+', '', text)
+
+
+def clause_key(text: str) -> str:
+    return hashlib.sha256(normalize_article(text).encode('utf-8')).hexdigest()
+
+
+def prompt_version(*parts: str) -> str:
+    """Short hash identifying the prompts, model and corpus a verdict was produced with"""
+    return hashlib.sha256("\x00".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _header(number: str) -> str:
+    main, _, sub = number.partition("의")
+    return f"제{main}조" + (f"의{sub}" if sub else "")
+
+
+def _renumbered(verdict: dict, number: str) -> dict:
+    """Copy of a verdict whose clause quotes use this article's number"""
+    verdict = copy.deepcopy(verdict)
+    old = verdict.get("number", "")
+    if not old or not number or old == number:
+        return verdict
+
+    def swap(match):
+        found = match.group(1) + (f"의{match.group(2)}" if match.group(2) else "")
+        return _header(number) if found == old else match.group(0)
+
+    for clause in verdict["clauses"]:
+        clause["독소조항"] = ARTICLE_NUMBER_PATTERN.sub(swap, clause["독소조항"], count=1)
+    verdict["number"] = number
+    return verdict
+
+
+def _quotes_match(verdict: dict, article_text: str) -> bool:
+    if not verdict["clauses"]:
+        return False
+    target = re.sub(r'\s+', '', article_text)
+    return all(re.sub(r'\s+', '', clause["독소조항"]) in target for clause in verdict["clauses"])
+
+
+class ClauseVerdictCache:
+    """Verdicts ({"number", "clauses", "rationale"}) keyed by prompt version and normalized article hash"""
+
+    def __init__(self, max_entries: int = CLAUSE_CACHE_MAX_ENTRIES, semantic: bool = CLAUSE_CACHE_SEMANTIC,
+                 semantic_threshold: float = CLAUSE_CACHE_SEMANTIC_THRESHOLD, model=None):
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.model = model  # object with encode(texts, normalize_embeddings=True), or a zero-arg loader
+        self._entries = OrderedDict()  # (version, key) -> (verdict, embedding)
+        self._loaded_versions = set()  # versions whose stored embeddings are in memory
+        self._purged_versions = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def _encoder(self):
+        if self.model is None:
+            from src.tools.embeddings import get_embedding_model
+            self.model = get_embedding_model
+        if callable(self.model) and not hasattr(self.model, "encode"):
+            self.model = self.model()
+        return self.model
+
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        try:
+            return np.asarray(self._encoder().encode(texts, normalize_embeddings=True), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Clause cache embedding failed: {e}")
+            return None
+
+    def _remember(self, version: str, key: str, verdict: dict, embedding: Optional[np.ndarray]) -> None:
+        with self._lock:
+            self._entries[(version, key)] = (verdict, embedding)
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load_stored(self, version: str, keys: List[str]) -> dict:
+        if not keys or not has_app_context():
+            return {}
+        try:
+            with own_session() as s:
+                rows = s.query(ClauseVerdict.clause_hash, ClauseVerdict.verdict, ClauseVerdict.embedding).filter(
+                    ClauseVerdict.prompt_version == version, ClauseVerdict.clause_hash.in_(keys)).all()
+        except SQLAlchemyError as e:
+            logger.warning(f"Clause verdict lookup failed: {e}")
+            return {}
+        found = {}
+        for key, verdict, embedding in rows:
+            found[key] = json.loads(verdict)
+            self._remember(version, key, found[key],
+                           np.frombuffer(embedding, dtype=np.float32) if embedding else None)
+        return found
+
+    def _load_embeddings(self, version: str) -> None:
+        """Bring every stored verdict of this version into memory once, for similarity lookups"""
+        if version in self._loaded_versions or not has_app_context():
+            return
+        self._loaded_versions.add(version)
+        try:
+            with own_session() as s:
+                rows = (s.query(ClauseVerdict.clause_hash, ClauseVerdict.verdict, ClauseVerdict.embedding)
+                        .filter(ClauseVerdict.prompt_version == version, ClauseVerdict.embedding.isnot(None))
+                        .order_by(ClauseVerdict.created_at.desc())
+                        .limit(self.max_entries)
+                        .all())
+        except SQLAlchemyError as e:
+            logger.warning(f"Clause verdict lookup failed: {e}")
+            return
+        for key, verdict, embedding in reversed(rows):
+            self._remember(version, key, json.loads(verdict), np.frombuffer(embedding, dtype=np.float32))
+
+    def _similar(self, version: str, articles: List[Tuple[str, str]], missing: List[int]) -> dict:
+        self._load_embeddings(version)
+        with self._lock:
+            candidates = [(verdict, embedding) for (v, _), (verdict, embedding) in self._entries.items()
+                          if v == version and embedding is not None and verdict["clauses"]]
+        if not candidates:
+            return {}
+        queries = self._embed([articles[i][0] for i in missing])
+        if queries is None:
+            return {}
+
+        verdicts, embeddings = zip(*candidates)
+        scores = queries @ np.stack(embeddings).T
+        found = {}
+        for row, i in enumerate(missing):
+            best = int(np.argmax(scores[row]))
+            if scores[row, best] < self.semantic_threshold:
+                continue
+            verdict = _renumbered(verdicts[best], articles[i][1])
+            if _quotes_match(verdict, articles[i][0]):
+                found[i] = verdict
+        return found
+
+    def lookup(self, version: str, articles: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        """Cached verdict for each (article text, article number), or None"""
+        keys = [clause_key(text) for text, _ in articles]
+        results: List[Optional[dict]] = [None] * len(articles)
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get((version, key))
+                if entry is not None:
+                    self._entries.move_to_end((version, key))
+                    results[i] = entry[0]
+
+        stored = self._load_stored(version, list({keys[i] for i, r in enumerate(results) if r is None}))
+        for i, key in enumerate(keys):
+            if results[i] is None and key in stored:
+                results[i] = stored[key]
+        results = [_renumbered(r, articles[i][1]) if r is not None else None for i, r in enumerate(results)]
+        hits = sum(r is not None for r in results)
+
+        missing = [i for i, r in enumerate(results) if r is None]
+        similar = self._similar(version, articles, missing) if self.semantic and missing else {}
+        for i, verdict in similar.items():
+            results[i] = verdict
+
+        counts = {"hit": hits, "semantic_hit": len(similar), "miss": len(missing) - len(similar)}
+        with self._lock:
+            self.stats["hits"] += counts["hit"]
+            self.stats["semantic_hits"] += counts["semantic_hit"]
+            self.stats["misses"] += counts["miss"]
+        for result, count in counts.items():
+            if count:
+                metrics.inc("financeguard_clause_cache_total", count, help="Article verdict lookups", result=result)
+        return results
+
+    def put(self, version: str, article_text: str, number: str, clauses: List[dict], rationale: str) -> None:
+        key = clause_key(article_text)
+        verdict = {"number": number, "clauses": clauses, "rationale": rationale}
+        embedding = None
+        if self.semantic:
+            embedded = self._embed([article_text])
+            embedding = embedded[0] if embedded is not None else None
+        self._remember(version, key, verdict, embedding)
+        if not has_app_context():
+            return
+        try:
+            with own_session() as s:
+                if version not in self._purged_versions:
+                    self._retire_versions(s, version)
+                    self._purged_versions.add(version)
+                s.add(ClauseVerdict(
+                    clause_hash=key,
+                    prompt_version=version,
+                    verdict=json.dumps(verdict, ensure_ascii=False),
+                    embedding=embedding.tobytes() if embedding is not None else None
+                ))
+                s.commit()
+        except IntegrityError:
+            pass  # another worker analyzed the same article first
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not store clause verdict: {e}")
+
+    @staticmethod
+    def _retire_versions(s, version: str) -> None:
+        """Delete the verdicts of other versions that no worker has written recently"""
+        cutoff = datetime.utcnow() - timedelta(days=CLAUSE_CACHE_RETIRE_DAYS)
+        stale = (s.query(ClauseVerdict.prompt_version)
+                 .filter(ClauseVerdict.prompt_version != version)
+                 .group_by(ClauseVerdict.prompt_version)
+                 .having(func.max(ClauseVerdict.created_at) < cutoff)
+                 .all())
+        if stale:
+            s.query(ClauseVerdict).filter(ClauseVerdict.prompt_version.in_([v for v, in stale])).delete()
+            s.commit()
+            logger.info(f"Retired clause verdicts of {len(stale)} old version(s)")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._loaded_versions.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+clause_cache = ClauseVerdictCache()
+
+metrics.register_collector("financeguard_clause_cache", clause_cache.get_stats)
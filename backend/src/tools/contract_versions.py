@@ -0,0 +1,190 @@
+"""
+Incremental re-analysis of amended contracts.
+
+Every analyzed contract stores a SHA-256 per article (조, whitespace removed)
+in article_fingerprints, and its toxic clauses tagged with the article they
+were found in (artifact "clause_analysis"). When a new upload shares most of
+its articles with an earlier document of the same session, only the changed
+and added articles go through ToxicClauseFinder and case linking; clauses of
+unchanged articles are carried forward. The returned diff says which articles
+changed. Documents of other sessions are never considered, so neither their
+IDs nor their results reach another user.
+"""
+
+import hashlib
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from src.config import CONTRACT_VERSION_CANDIDATES, CONTRACT_VERSION_MIN_OVERLAP
+from src.documents import document_registry
+from src.imsi.model import db, ArticleFingerprint, SessionDocument
+from src.telemetry import metrics
+from src.tools.highlight import ToxicClauseFinder, merge_clauses
+from src.tools.segmentation import DocumentIndex
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_ARTIFACT = "clause_analysis"
+
+
+def article_hash(text: str) -> str:
+    return hashlib.sha256(re.sub(r'\s+', '', text).encode('utf-8')).hexdigest()
+
+
+def fingerprint(index: DocumentIndex) -> List[dict]:
+    """Hash of every article (and the preamble) of a segmented contract, in document order"""
+    return [
+        {
+            "segment_id": seg["id"],
+            "number": seg["number"],
+            "title": seg["title"],
+            "hash": article_hash(seg["text"]),
+        }
+        for seg in index.segments if seg["level"] in ("preamble", "article")
+    ]
+
+
+def _label(article: dict) -> str:
+    return f"제{article['number']}조" if article["number"] else "전문"
+
+
+def diff_articles(previous: List[dict], current: List[dict]) -> dict:
+    """Articles of `current` that are unchanged, changed (same number) or added, and those removed from `previous`"""
+    previous_hashes = {a["hash"] for a in previous}
+    current_hashes = {a["hash"] for a in current}
+    previous_numbers = {a["number"] for a in previous}
+    current_numbers = {a["number"] for a in current}
+
+    diff = {"unchanged": [], "changed": [], "added": [], "removed": []}
+    for article in current:
+        if article["hash"] in previous_hashes:
+            diff["unchanged"].append(_label(article))
+        elif article["number"] in previous_numbers:
+            diff["changed"].append(_label(article))
+        else:
+            diff["added"].append(_label(article))
+    diff["removed"] = [
+        _label(a) for a in previous if a["hash"] not in current_hashes and a["number"] not in current_numbers
+    ]
+    return diff
+
+
+def attribute(index: DocumentIndex, articles: List[dict], clause: str) -> Optional[str]:
+    """Hash of the article a detected clause belongs to
+
+    The clause is located verbatim when possible; clauses the LLM paraphrased
+    go to the most similar article.
+    """
+    by_segment = {a["segment_id"]: a["hash"] for a in articles}
+    location = index.locate(clause)
+    if location and location["segment_id"] in by_segment:
+        return by_segment[location["segment_id"]]
+    hits = index.search(clause, top_k=1, levels=("preamble", "article"))
+    return by_segment.get(hits[0][0]["id"]) if hits else None
+
+
+class ContractVersionStore:
+    """Article fingerprints and per-article clause analyses of earlier documents
+
+    Backed by the document database, so it is shared by every worker process.
+    Must be used inside an application context.
+    """
+
+    def find_previous(self, document_id: str, articles: List[dict],
+                      session_id: str) -> Optional[Tuple[str, float, dict]]:
+        """Earlier analyzed document of the session sharing the most articles, as (document_id, overlap, analysis)
+
+        overlap is the Jaccard similarity of the article hash sets; documents
+        below CONTRACT_VERSION_MIN_OVERLAP are not treated as versions.
+        """
+        hashes = {a["hash"] for a in articles}
+        if not hashes or not session_id:
+            return None
+        session_documents = db.session.query(SessionDocument.document_id).filter(
+            SessionDocument.session_id == session_id
+        )
+        shared = func.count(ArticleFingerprint.id)
+        try:
+            candidates = (db.session.query(ArticleFingerprint.document_id, shared)
+                          .filter(ArticleFingerprint.article_hash.in_(hashes),
+                                  ArticleFingerprint.document_id != document_id,
+                                  ArticleFingerprint.document_id.in_(session_documents))
+                          .group_by(ArticleFingerprint.document_id)
+                          .order_by(shared.desc())
+                          .limit(CONTRACT_VERSION_CANDIDATES)
+                          .all())
+        except SQLAlchemyError as e:
+            logger.warning(f"Previous version lookup failed: {e}")
+            return None
+
+        for candidate_id, common in candidates:
+            analysis = document_registry.get_artifact(candidate_id, ANALYSIS_ARTIFACT)
+            if analysis is None:
+                continue
+            previous_hashes = {a["hash"] for a in analysis["articles"]}
+            overlap = common / len(hashes | previous_hashes)
+            if overlap >= CONTRACT_VERSION_MIN_OVERLAP:
+                return candidate_id, overlap, analysis
+        return None
+
+    def save(self, document_id: str, articles: List[dict], tagged_items: List[dict]) -> None:
+        document_registry.put_artifact(document_id, ANALYSIS_ARTIFACT, {"articles": articles, "items": tagged_items})
+        known = {row.article_hash for row in ArticleFingerprint.query.filter_by(document_id=document_id)}
+        for missing in {a["hash"] for a in articles} - known:
+            db.session.add(ArticleFingerprint(document_id=document_id, article_hash=missing))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # saved concurrently by another worker
+
+
+contract_versions = ContractVersionStore()
+
+
+def analyze_contract(finder: ToxicClauseFinder, document_id: str, index: DocumentIndex, session_id: str,
+                     incremental: bool = True) -> Tuple[list, Optional[dict]]:
+    """Toxic clauses of a contract with linked precedents, reusing the analysis of an
+    earlier version uploaded in the same session
+
+    Returns (items in document order, version info or None if no earlier version was used).
+    """
+    articles = fingerprint(index)
+    previous = contract_versions.find_previous(document_id, articles, session_id) if incremental else None
+
+    if previous is None:
+        items = finder.find(index.text)
+        carried = []
+        version = None
+    else:
+        previous_id, overlap, analysis = previous
+        previous_hashes = {a["hash"] for a in analysis["articles"]}
+        current_hashes = {a["hash"] for a in articles}
+        changed = [index.segments[a["segment_id"]]["text"] for a in articles if a["hash"] not in previous_hashes]
+        carried = [entry for entry in analysis["items"] if entry["article"] in current_hashes]
+
+        items = finder.find("\n\n".join(changed)) if changed else []
+        version = {
+            "previous_pdf_id": previous_id,
+            "overlap": round(overlap, 3),
+            **diff_articles(analysis["articles"], articles),
+            "reanalyzed_articles": len(changed),
+            "carried_clauses": len(carried),
+            "new_clauses": len(items),
+        }
+        logger.info(f"Document {document_id} is a version of {previous_id} (overlap {overlap:.2f}): "
+                    f"re-analyzed {len(changed)}/{len(articles)} articles, carried {len(carried)} clauses")
+        metrics.inc("financeguard_contract_articles_reused_total", len(articles) - len(changed),
+                    help="Articles whose toxic clause analysis was carried over from an earlier version")
+
+    tagged = carried + [{"article": attribute(index, articles, item["독소조항"]), "item": item} for item in items]
+    position = {a["hash"]: i for i, a in enumerate(articles)}
+    tagged.sort(key=lambda entry: position.get(entry["article"], len(articles)))
+    kept = {id(item) for item in merge_clauses([entry["item"] for entry in tagged])}
+    tagged = [entry for entry in tagged if id(entry["item"]) in kept]
+
+    contract_versions.save(document_id, articles, tagged)
+    return [entry["item"] for entry in tagged], version
@@ -0,0 +1,204 @@
+"""Shared sentence embedding model for retrieval and document indexing"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from src.config import EMBEDDING_BACKEND, EMBEDDING_BATCHING, EMBEDDING_MAX_BATCH_SIZE, EMBEDDING_MAX_WAIT_MS
+from src.telemetry import metrics, span
+from src.tools.encoder_backends import PerProcessEncoder, load_encoder
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class InstrumentedEncoder:
+    """Proxy around the embedding model that times every encode() call"""
+
+    def __init__(self, model):
+        self._model = model
+
+    def encode(self, sentences, *args, **kwargs):
+        batch_size = 1 if isinstance(sentences, str) else len(sentences)
+        with span("embedding.encode", batch_size=batch_size):
+            return self._model.encode(sentences, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+class _Request:
+    __slots__ = ("texts", "single", "options", "future", "enqueued_at")
+
+    def __init__(self, sentences, options: tuple):
+        self.single = isinstance(sentences, str)
+        self.texts = [sentences] if self.single else list(sentences)
+        self.options = options
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class BatchingEncoder:
+    """Coalesces concurrent encode() calls into micro-batches
+
+    Callers from any thread enqueue their sentences; one background thread
+    takes everything already queued and, if the previous batch coalesced
+    several callers (i.e. there is concurrent load), waits up to
+    `max_wait_ms` for more. It then encodes up to `max_batch_size` sentences
+    in a single model call and resolves each caller's future with its rows.
+    A lone caller is therefore never delayed by the window. Requests are only batched
+    with others that pass the same keyword arguments. Calls that cannot be
+    batched (positional options, unhashable options, lists already larger
+    than a batch) go straight to the model.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_MAX_WAIT_MS):
+        self._model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "sentences": 0, "batches": 0, "bypassed": 0}
+
+    def submit(self, sentences, **kwargs) -> Future:
+        """Queue sentences for encoding; the future resolves to what model.encode would return"""
+        request = _Request(sentences, tuple(sorted(kwargs.items())))
+        self._ensure_started().put(request)
+        return request.future
+
+    def encode(self, sentences, *args, **kwargs):
+        if args or not self._batchable(sentences, kwargs):
+            with self._stats_lock:
+                self._stats["bypassed"] += 1
+            return self._model.encode(sentences, *args, **kwargs)
+        return self.submit(sentences, **kwargs).result()
+
+    def _batchable(self, sentences, kwargs: dict) -> bool:
+        if not isinstance(sentences, str) and not 0 < len(sentences) <= self.max_batch_size:
+            return False
+        try:
+            hash(tuple(kwargs.items()))
+        except TypeError:
+            return False
+        return True
+
+    def _ensure_started(self) -> queue.Queue:
+        # A forked worker inherits the queue but not the thread; start its own
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                     name="embedding-batcher", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def stop(self) -> None:
+        """Finish queued requests and stop the background thread (it restarts on the next call)"""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._queue = self._thread = self._pid = None
+
+    def _run(self, requests: queue.Queue) -> None:
+        previous_requests = 0
+        while True:
+            first = requests.get()
+            if first is None:
+                return
+            batch = [first]
+            size = len(first.texts)
+            deadline = time.perf_counter() + (self.max_wait if previous_requests > 1 else 0)
+            stopping = False
+            while size < self.max_batch_size:
+                try:
+                    request = requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._encode_batch(batch)
+            previous_requests = len(batch)
+            if stopping:
+                return
+
+    def _encode_batch(self, batch: List[_Request]) -> None:
+        started = time.perf_counter()
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.options, []).append(request)
+            metrics.observe("financeguard_embedding_queue_seconds", started - request.enqueued_at,
+                            help="Time encode requests waited to join a batch")
+
+        for options, requests in groups.items():
+            texts = [text for request in requests for text in request.texts]
+            metrics.observe("financeguard_embedding_batch_size", len(texts), buckets=BATCH_SIZE_BUCKETS,
+                            help="Sentences per coalesced encode call")
+            try:
+                embeddings = self._model.encode(texts, **dict(options))
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in requests:
+                n = len(request.texts)
+                request.future.set_result(embeddings[offset] if request.single else embeddings[offset:offset + n])
+                offset += n
+
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["sentences"] += sum(len(request.texts) for request in batch)
+            self._stats["batches"] += len(groups)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["sentences"] / stats["batches"] if stats["batches"] else 0.0
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+def wrap_model(model, batching: bool = EMBEDDING_BATCHING):
+    """Instrument a raw encoder and, if enabled, put the micro-batcher in front of it"""
+    encoder = InstrumentedEncoder(model)
+    return BatchingEncoder(encoder) if batching else encoder
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """Return the process-wide KURE-v1 model, loading it on first use"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if EMBEDDING_BACKEND == "torch":
+                    _model = wrap_model(load_encoder("torch"))
+                else:
+                    # ONNX Runtime sessions cannot cross a fork: load in each process on first encode
+                    _model = wrap_model(PerProcessEncoder(load_encoder))
+    return _model
+
+def stop_batching() -> None:
+    """Stop the micro-batcher thread, if any (e.g. in a pre-fork master before forking)"""
+    if isinstance(_model, BatchingEncoder):
+        _model.stop()
+
+def get_embedding_batcher_stats() -> dict:
+    return _model.get_stats() if isinstance(_model, BatchingEncoder) else {}
+
+metrics.register_collector("financeguard_embedding_batcher", get_embedding_batcher_stats)
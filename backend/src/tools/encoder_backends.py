@@ -0,0 +1,156 @@
+"""
+Inference backends for the sentence embedding model.
+
+EMBEDDING_BACKEND selects how KURE-v1 runs on CPU:
+    "torch"     - eager PyTorch (default)
+    "onnx"      - ONNX Runtime, fp32 graph
+    "onnx-int8" - ONNX Runtime, dynamically quantized int8 weights
+The ONNX graphs are exported once into EMBEDDING_ONNX_DIR (on first load, or
+ahead of time with `python -m src.tools.encoder_backends export`). The ONNX
+backends are optional and need `pip install "optimum[onnxruntime]"`.
+
+ONNX Runtime sessions own native thread pools that do not survive fork(), so
+ONNX models are loaded separately in every process on first use.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+from typing import Optional
+
+from src.config import (
+    EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_QUANTIZATION,
+    EMBEDDING_ONNX_THREADS
+)
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_intra_op_threads = EMBEDDING_ONNX_THREADS
+
+
+def set_intra_op_threads(threads: int) -> None:
+    """Threads for ONNX Runtime sessions created from now on in this process (0: runtime default)"""
+    global _intra_op_threads
+    _intra_op_threads = threads
+
+
+def onnx_file_name(quantized: bool) -> str:
+    return f"model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx" if quantized else "model.onnx"
+
+
+def _find_onnx_file(directory: str, file_name: str) -> Optional[str]:
+    """Path of `file_name` relative to `directory` (exports place it in an onnx/ subfolder)"""
+    for root, _, files in os.walk(directory):
+        if file_name in files:
+            return os.path.relpath(os.path.join(root, file_name), directory)
+    return None
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL_NAME, output_dir: str = EMBEDDING_ONNX_DIR,
+                quantize: bool = True) -> str:
+    """Export the model to ONNX (and its int8 variant) under output_dir; returns output_dir
+
+    An fp32 graph already in output_dir is reused, so this can add the int8
+    variant to an earlier export.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    exported = _find_onnx_file(output_dir, onnx_file_name(quantized=False))
+    if exported:
+        model = SentenceTransformer(output_dir, backend="onnx", model_kwargs={"file_name": exported})
+    else:
+        logger.info(f"Exporting {model_name} to ONNX in {output_dir}...")
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"export": True})
+        model.save_pretrained(output_dir)
+    if quantize:
+        logger.info(f"Quantizing the ONNX graph to int8 ({EMBEDDING_ONNX_QUANTIZATION})...")
+        export_dynamic_quantized_onnx_model(model, EMBEDDING_ONNX_QUANTIZATION, output_dir)
+    return output_dir
+
+
+def load_onnx(model_name: str = EMBEDDING_MODEL_NAME, quantized: bool = False,
+              threads: Optional[int] = None):
+    """SentenceTransformer served by ONNX Runtime, exporting the graph first if needed"""
+    import onnxruntime as ort
+    from sentence_transformers import SentenceTransformer
+
+    file_name = onnx_file_name(quantized)
+    relative_path = _find_onnx_file(EMBEDDING_ONNX_DIR, file_name)
+    if relative_path is None:
+        export_onnx(model_name, EMBEDDING_ONNX_DIR, quantize=quantized)
+        relative_path = _find_onnx_file(EMBEDDING_ONNX_DIR, file_name)
+        if relative_path is None:
+            raise FileNotFoundError(f"ONNX export did not produce {file_name} in {EMBEDDING_ONNX_DIR}")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = _intra_op_threads if threads is None else threads
+    options.inter_op_num_threads = 1  # the encoder graph is sequential
+    logger.info(f"Loading {relative_path} with ONNX Runtime ({options.intra_op_num_threads or 'default'} threads)...")
+    return SentenceTransformer(
+        EMBEDDING_ONNX_DIR, backend="onnx",
+        model_kwargs={"file_name": relative_path, "provider": "CPUExecutionProvider", "session_options": options}
+    )
+
+
+def load_encoder(backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL_NAME):
+    """Load the embedding model with the given backend"""
+    if backend == "torch":
+        # Imported here: sentence_transformers pulls in torch, which dominates startup time
+        from sentence_transformers import SentenceTransformer
+        logger.info(f"Loading sentence transformer model {model_name}...")
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return load_onnx(model_name, quantized=backend == "onnx-int8")
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+class PerProcessEncoder:
+    """Loads its model lazily, once in every process that uses it (for fork-unsafe runtimes)"""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._model = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._model = self._loader()
+                    self._pid = os.getpid()
+        return self._model
+
+    def encode(self, sentences, *args, **kwargs):
+        return self._get().encode(sentences, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="export (and quantize) the ONNX graph")
+    export_parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    export_parser.add_argument("--output-dir", default=EMBEDDING_ONNX_DIR)
+    export_parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    output_dir = export_onnx(args.model, args.output_dir, quantize=not args.no_quantize)
+    for quantized in (False, True):
+        path = _find_onnx_file(output_dir, onnx_file_name(quantized))
+        if path:
+            size_mb = os.path.getsize(os.path.join(output_dir, path)) / 2 ** 20
+            print(f"{path}: {size_mb:.0f}MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
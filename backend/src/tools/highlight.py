@@ -1,3 +1,4 @@
+import contextvars
 import requests
 from flask import Flask, request, jsonify
 from openai import OpenAI
@@ -5,22 +6,55 @@ import json
 import io
 import os
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from tqdm import tqdm
 import logging
+import re
+import threading
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import List, Optional
 import time
-from src.config import UPSTAGE_API_KEY, OPENAI_API_KEY, CASE_DB_PATH, HIGHLIGHT_PROMPT_PATH, FORMAT_PROMPT_PATH
+from src.documents import document_form
+from src.logging_config import log_payload
+from src.tools.embeddings import get_embedding_model
+from src.tools.lexical import BM25Index, corpus_fingerprint, index_fingerprint, reciprocal_rank_fusion
+from src.tools.case_summaries import FORMAT_MODEL, case_summaries, case_id, summary_version
+from src.tools.clause_cache import clause_cache, prompt_version
+from src.tools.segmentation import ARTICLE_PATTERN, segment_contract
+from src.telemetry import span
+from src.config import (
+    UPSTAGE_API_KEY,
+    UPSTAGE_BASE_URL,
+    OPENAI_API_KEY,
+    CASE_DB_PATH,
+    EMBEDDING_PATH,
+    EMBEDDING_MODEL_NAME,
+    CASE_LEXICAL_INDEX_PATH,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    HYBRID_RRF_K,
+    HIGHLIGHT_PROMPT_PATH,
+    FORMAT_PROMPT_PATH,
+    TOXIC_CHUNKED_MODE,
+    TOXIC_CHUNK_SIZE,
+    TOXIC_CHUNK_OVERLAP,
+    TOXIC_MAX_WORKERS,
+    CLAUSE_CACHE_ENABLED
+)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Model of the toxic clause detection calls; part of the clause cache version
+LLM_MODEL = "gpt-4o-mini"
+
 load_dotenv()
 
 class DocumentParser:
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.url = "https://api.upstage.ai/v1/document-ai/document-parse"
+        self.url = f"{UPSTAGE_BASE_URL}/document-ai/document-parse"
     
     def parse(self, file_obj) -> dict:
         """Parse document using the Upstage API
@@ -32,31 +66,7 @@ class DocumentParser:
             dict: Parsed document content
         """
         try:
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            
-            # Ensure file_obj is properly positioned at the start
-            if hasattr(file_obj, 'seek'):
-                file_obj.seek(0)
-                logger.info("File object seek(0) completed")
-            
-            # Check if we can read from the file
-            if hasattr(file_obj, 'read'):
-                # For debugging, check file content
-                sample_bytes = file_obj.read(100)
-                file_obj.seek(0)
-                logger.info(f"File content starts with: {sample_bytes[:20]}")
-                
-                # If this is a BytesIO object, we need to convert it to a file-like object
-                # that the requests library can handle
-                if isinstance(file_obj, io.BytesIO):
-                    files = {"document": ('document.pdf', file_obj, 'application/pdf')}
-                    logger.info("Created files dict with BytesIO object")
-                else:
-                    # Regular file object
-                    files = {"document": ('document.pdf', file_obj, 'application/pdf')}
-                    logger.info("Created files dict with file object")
-            else:
-                # If it's not a file-like object, log error and raise exception
+            if not hasattr(file_obj, 'read'):
                 logger.error(f"Unsupported file object type: {type(file_obj)}")
                 raise ValueError(f"Unsupported file object type: {type(file_obj)}")
             
@@ -68,9 +78,14 @@ class DocumentParser:
                 "base64_encoding": "[]", 
                 "model": "document-parse" 
             }
+            # Streamed from the file handle, so the PDF is never copied into the request body
+            body, content_type = document_form(file_obj, data)
+            headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": content_type}
             
             logger.info("Sending request to Upstage API...")
-            response = requests.post(self.url, headers=headers, files=files, data=data)
+            with span("upstage.document_parse") as parse_span:
+                response = requests.post(self.url, headers=headers, data=body)
+                parse_span.record_payload(len(response.content))
             logger.info(f"Received response with status code {response.status_code}")
             
             # Check if request was successful
@@ -93,23 +108,30 @@ class DocumentParser:
 
 
 class CaseLawRetriever:
-    def __init__(self, case_db_path: str, embedding_path: str = None):
+    def __init__(self, case_db_path: str, embedding_path: str = None, lexical_index_path: str = CASE_LEXICAL_INDEX_PATH):
         self.case_db_path = case_db_path
         self.embedding_path = embedding_path or case_db_path.replace('.json', '_embeddings.npz')
+        self.lexical_index_path = lexical_index_path
         self.model = None
         self.cases = None
         self.case_embeddings = None
         self.case_texts = None
+        self.lexical_index = None
+        self._normalized = None
+        self._positions = None  # case_key -> position in self.cases
+        self.corpus_hash = None
+        self._load_lock = threading.Lock()
         
     def _init_model(self):
         if self.model is None:
-            print("Loading sentence transformer model...")
-            self.model = SentenceTransformer("nlpai-lab/KURE-v1")
+            self.model = get_embedding_model()
     
     def load_cases(self):
         print("Loading case database...")
         with open(self.case_db_path, 'r', encoding='utf-8') as f:
             self.cases = json.load(f)
+        self._positions = None
+        self.corpus_hash = corpus_fingerprint(self.cases)
             
         # 미리 계산된 임베딩이 있는지 확인
         if os.path.exists(self.embedding_path):
@@ -140,29 +162,233 @@ class CaseLawRetriever:
                 f"Precomputed embeddings not found at {self.embedding_path}. Please compute them first with backend/src/precompute_embeddings.py."
             )
         
+        # BM25 index for hybrid search (built offline by precompute_embeddings.py)
+        if self.lexical_index_path and os.path.exists(self.lexical_index_path):
+            lexical_index = BM25Index.load(self.lexical_index_path)
+            if lexical_index.fingerprint == index_fingerprint(self.corpus_hash):
+                self.lexical_index = lexical_index
+            else:
+                # Built from other cases or with another tokenizer: its hits would point at the wrong cases
+                logger.warning(f"Ignoring {self.lexical_index_path}: built for another corpus or tokenizer, "
+                               f"rebuild it with `python -m src.tools.lexical build`")
+        
         print(f"Loaded {len(self.cases)} cases successfully")
     
-    def find_similar_case(self, toxic_clause: str) -> dict:
+    def ensure_loaded(self):
         if self.model is None or self.cases is None:
-            self.load_cases()
+            # Clauses may be linked from several threads at once
+            with self._load_lock:
+                if self.model is None or self.cases is None:
+                    self.load_cases()
+
+    def prepare(self):
+        """Load the corpus and normalize it now instead of on the first search
+
+        After this the embedding matrix is never written again, so a pre-fork
+        master can share it with its workers copy-on-write.
+        """
+        self.ensure_loaded()
+        self._normalized_embeddings()
+
+    def case_key(self, index: int) -> str:
+        """Stable ID of a case (hash of its text); unlike its position it survives corpus rebuilds"""
+        return case_id(str(self.cases[index]["value"]))
+
+    def find_case(self, key: str) -> Optional[int]:
+        """Position of the case with this case_key, or None"""
+        self.ensure_loaded()
+        if self._positions is None:
+            with self._load_lock:
+                if self._positions is None:
+                    self._positions = {case_id(str(case["value"])): i for i, case in enumerate(self.cases)}
+        return self._positions.get(key)
+
+    def fingerprint(self) -> str:
+        """Identity of the loaded corpus: hash of the cases, embedding model and embedding shape
+
+        Content based, so copies of the same corpus on other hosts or after a
+        deploy have the same fingerprint.
+        """
+        self.ensure_loaded()
+        shape = "x".join(str(n) for n in np.shape(self.case_embeddings))
+        return f"{self.corpus_hash}:{EMBEDDING_MODEL_NAME}:{shape}"
+
+    def _normalized_embeddings(self) -> np.ndarray:
+        """Case embeddings scaled to unit length (once), so cosine similarity is a single matmul"""
+        embeddings = self.case_embeddings
+        if self._normalized is not embeddings:
+            with self._load_lock:
+                embeddings = self.case_embeddings
+                if self._normalized is not embeddings:
+                    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                    norms[norms == 0] = 1
+                    if embeddings.dtype.kind == 'f' and embeddings.flags.writeable:
+                        embeddings /= norms  # in place: the corpus can be gigabytes
+                    else:
+                        embeddings = (embeddings / norms).astype(np.float32)
+                    self.case_embeddings = self._normalized = embeddings
+        return embeddings
+
+    def search(self, query_embeddings, top_k: int = 1, query_texts: List[str] = None, mode: str = None):
+        """Top-k cases for one query (1-D embedding) or a batch (2-D)
+
+        In "hybrid" mode (given the query texts and a BM25 index) the dense and
+        lexical rankings are merged by reciprocal rank fusion; otherwise this
+        is plain cosine search. Scores are cosine similarities either way.
+
+        Returns:
+            tuple: (indices, scores), both shaped (n_queries, top_k), best match first
+        """
+        self.ensure_loaded()
+        mode = mode or RETRIEVAL_MODE
+        if mode == "hybrid" and query_texts is not None and self.lexical_index is not None:
+            return self._hybrid_search(query_embeddings, query_texts, top_k)
+        return self._dense_search(query_embeddings, top_k)
+
+    def _hybrid_search(self, query_embeddings, query_texts: List[str], top_k: int):
+        embeddings = self._normalized_embeddings()
+        queries = self._normalized_queries(query_embeddings, embeddings.dtype)
+        dense_indices, _ = self._dense_search(queries, max(top_k, HYBRID_CANDIDATES))
+        top_k = min(top_k, len(embeddings))
+
+        indices = np.empty((len(queries), top_k), dtype=np.int64)
+        for i, (text, dense_ranking) in enumerate(zip(query_texts, dense_indices)):
+            lexical_ranking, _ = self.lexical_index.search(text, HYBRID_CANDIDATES)
+            indices[i] = reciprocal_rank_fusion([dense_ranking, lexical_ranking], k=HYBRID_RRF_K)[:top_k]
+        scores = np.einsum('qd,qkd->qk', queries, embeddings[indices])
+        return indices, scores
+
+    @staticmethod
+    def _normalized_queries(query_embeddings, dtype) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=dtype))
+        return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    def _dense_search(self, query_embeddings, top_k: int):
+        embeddings = self._normalized_embeddings()
+        queries = self._normalized_queries(query_embeddings, embeddings.dtype)
+        scores = queries @ embeddings.T
+
+        top_k = min(top_k, scores.shape[1])
+        if top_k < scores.shape[1]:
+            candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        else:
+            candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def find_similar_case(self, toxic_clause: str) -> dict:
+        self.ensure_loaded()
             
         if not isinstance(toxic_clause, str):
             raise ValueError(f"toxic_clause must be a string, got {type(toxic_clause)}")
             
-        query_embedding = self.model.encode(toxic_clause)
-        similarities = np.dot(self.case_embeddings, query_embedding) / (
-            np.linalg.norm(self.case_embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
-        most_similar_idx = np.argmax(similarities)
+        indices, scores = self.search(self.model.encode(toxic_clause), top_k=1, query_texts=[toxic_clause])
+        most_similar_idx = int(indices[0, 0])
         return {
             'case': self.cases[most_similar_idx]['value'],
-            'similarity_score': float(similarities[most_similar_idx])
+            'similarity_score': float(scores[0, 0]),
+            'index': most_similar_idx,
+            'case_id': self.case_key(most_similar_idx)
         }
 
 
+_case_retrievers = {}
+_case_retrievers_lock = threading.Lock()
+
+def get_case_retriever(case_db_path: str = CASE_DB_PATH, embedding_path: str = EMBEDDING_PATH) -> CaseLawRetriever:
+    """Return the process-wide retriever for a case database
+
+    Every tool and route shares it, so the cases, embeddings and model are
+    loaded once (on first search, or by the startup warm-up) instead of per call.
+    """
+    key = (case_db_path, embedding_path)
+    with _case_retrievers_lock:
+        if key not in _case_retrievers:
+            _case_retrievers[key] = CaseLawRetriever(case_db_path, embedding_path)
+        return _case_retrievers[key]
+
+
+COMBINE_RATIONALE_PROMPT = """You are a contract analysis expert with deep knowledge of Korean contract law.
+The following are explanations of potentially unfair clauses ("독소 조항") found in different parts of the same contract.
+Combine them into one friendly, comprehensive explanation for the reviewer of the contract.
+- Write in Korean.
+- Do not repeat the same point twice.
+- Return only the explanation text (no JSON, no Markdown)."""
+
+
+def split_into_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """Split contract text into chunks on article (제N조) boundaries
+
+    Articles are packed greedily into chunks of at most `chunk_size` characters.
+    Each chunk also repeats the last `overlap` characters of the previous one so
+    that a clause cut at a boundary is still seen whole by one of the chunks.
+    Articles longer than `chunk_size` are split by length.
+    """
+    if not text:
+        return []
+
+    starts = [m.start() for m in ARTICLE_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+
+    pieces = []
+    step = max(chunk_size - overlap, 1)
+    for begin, end in zip(bounds, bounds[1:]):
+        while end - begin > chunk_size:
+            pieces.append((begin, begin + chunk_size))
+            begin += step
+        if end > begin:
+            pieces.append((begin, end))
+
+    chunks = []
+    chunk_start, chunk_end = pieces[0]
+    for begin, end in pieces[1:]:
+        if end - chunk_start <= chunk_size:
+            chunk_end = end
+            continue
+        chunks.append((chunk_start, chunk_end))
+        chunk_start, chunk_end = max(begin - overlap, end - chunk_size, 0), end
+    chunks.append((chunk_start, chunk_end))
+
+    return [text[begin:end] for begin, end in chunks]
+
+
+def merge_clauses(clauses: List[dict]) -> List[dict]:
+    """Deduplicate clauses reported by overlapping chunks
+
+    Clauses are compared with whitespace removed; a clause contained in a
+    longer one (e.g. cut at a chunk boundary) is dropped.
+    """
+    def normalize(clause):
+        return re.sub(r'\s+', '', clause.get("독소조항", ""))
+
+    merged = []
+    keys = []
+    for clause in sorted(clauses, key=lambda c: len(normalize(c)), reverse=True):
+        key = normalize(clause)
+        if not key or any(key in existing for existing in keys):
+            continue
+        merged.append(clause)
+        keys.append(key)
+
+    # 원문 순서 유지
+    order = {id(clause): i for i, clause in enumerate(clauses)}
+    merged.sort(key=lambda c: order[id(c)])
+    return merged
+
+
 class ToxicClauseFinder:
-    def __init__(self, openai_api_key: str, prompt_path: str, case_retriever: CaseLawRetriever):
+    def __init__(self, openai_api_key: str, prompt_path: str, case_retriever: CaseLawRetriever,
+                 chunked: bool = TOXIC_CHUNKED_MODE, chunk_size: int = TOXIC_CHUNK_SIZE,
+                 chunk_overlap: int = TOXIC_CHUNK_OVERLAP, max_workers: int = TOXIC_MAX_WORKERS,
+                 use_clause_cache: bool = CLAUSE_CACHE_ENABLED):
         self.prompt_path = prompt_path
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers
         try:
             with open(prompt_path, 'r', encoding='utf-8') as f:
                 self.system_prompt = f.read()
@@ -181,6 +407,15 @@ class ToxicClauseFinder:
         except Exception as e:
             logger.error(f"Error loading format prompt: {e}")
             self.format_prompt = "주어진 판례를 요약해주세요."
+
+        self.summary_version = summary_version(self.format_prompt)
+        # Verdicts of articles seen in earlier contracts
+        self.clause_cache = clause_cache if use_clause_cache else None
+
+    @cached_property
+    def prompt_version(self) -> str:
+        """Clause cache version; changes with a prompt, a model or the case corpus (verdicts hold linked precedents)"""
+        return prompt_version(self.system_prompt, self.summary_version, LLM_MODEL, self.case_retriever.fingerprint())
     
     def format_case(self, case_details: str) -> str:
         """Format case details using LLM"""
@@ -193,6 +428,10 @@ class ToxicClauseFinder:
             if len(case_details.split()) < 5 and not any(legal_term in case_details for legal_term in ["판례", "법원", "계약", "조항"]):
                 return "계약서 분석과 관련된 내용만 처리할 수 있습니다."
                 
+            cached_summary = case_summaries.get(case_details, self.summary_version)
+            if cached_summary is not None:
+                return cached_summary
+                
             messages = [
                 {"role": "system", "content": self.format_prompt},
                 {"role": "user", "content": case_details}
@@ -204,15 +443,18 @@ class ToxicClauseFinder:
             
             while retry_count <= max_retries:
                 try:
-                    response = self.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages,
-                        temperature=0.1,
-                        timeout=30  # 30 second timeout
-                    )
+                    with span("llm.format_case", model=FORMAT_MODEL) as llm_span:
+                        response = self.client.chat.completions.create(
+                            model=FORMAT_MODEL,
+                            messages=messages,
+                            temperature=0.1,
+                            timeout=30  # 30 second timeout
+                        )
+                        llm_span.record_usage(response)
                     
                     result = response.choices[0].message.content.strip()
                     if result:
+                        case_summaries.put(case_details, self.summary_version, result)
                         return result
                     return "판례 분석 결과가 없습니다."
                 except Exception as e:
@@ -226,118 +468,266 @@ class ToxicClauseFinder:
             logger.error(f"Unhandled error in format_case: {str(e)}")
             return "판례 분석 중 오류가 발생했습니다."
 
-    def find(self, text: str) -> list:
-        """Find toxic clauses in contract text"""
-        try:
-            logger.info("Analyzing document with LLM...")
-            
-            # Limit text length if it's too long (to fit in context window)
-            if len(text) > 15000:
-                logger.info(f"Text is too long ({len(text)} chars), truncating to 15000 chars")
-                text = text[:15000]
-            
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": text}
-            ]
-            
-            # Add retry mechanism for LLM call
-            max_retries = 2
-            retry_count = 0
-            
-            while retry_count <= max_retries:
-                try:
+    def _call_llm(self, text: str):
+        """Run the toxic clause prompt on a piece of contract text and return the raw reply"""
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": text}
+        ]
+
+        # Add retry mechanism for LLM call
+        max_retries = 2
+        retry_count = 0
+
+        while retry_count <= max_retries:
+            try:
+                with span("llm.find_toxic_clauses", model=LLM_MODEL) as llm_span:
                     response = self.client.chat.completions.create(
-                        model="gpt-4o-mini", 
+                        model=LLM_MODEL,
                         messages=messages,
                         temperature=0.1,
                         timeout=60  # 60 second timeout
                     )
-                    
-                    result = response.choices[0].message.content
-                    logger.info("Received response from LLM")
-                    # print("Result****", result)
-                    break
-                except Exception as e:
-                    logger.error(f"LLM call error (attempt {retry_count+1}): {str(e)}")
-                    retry_count += 1
-                    if retry_count > max_retries:
-                        logger.error("Max retries exceeded for LLM call")
-                        return []
-                    # Wait a bit before retrying
-                    time.sleep(2)
-            
-            # Process the result
-            try:
-                # print("Raw LLM response:", result)  
-                # Remove code block markers if they exist
-                result = result.replace('```json', '').replace('```', '').strip()
-                
-                # JSON 시작과 끝 위치 찾기
-                start_idx = result.find('[')
-                end_idx = result.rfind(']') + 1
-                
-                if (start_idx == -1 or end_idx == 0):
-                    logger.error("No JSON array found in response")
-                    return []
-                    
-                # JSON 부분만 추출
-                json_str = result[start_idx:end_idx]
-                # print("Extracted JSON string:", json_str)
-                # print("=" * 20)
-                
-                parsed_result = json.loads(json_str)
-                if not isinstance(parsed_result, list):
-                    logger.error("Parsed result is not a list")
-                    return []
-                
-                print("Parsed result:", parsed_result)
-                print("=" * 20)
-                
-                logger.info("Finding similar cases...")
-                # 결과 재구성 - 키 순서 변경
-                reordered_result = []
-                
-                # Find the explanation item first
-                rationale_item = parsed_result[-1]["친절한_설명"]
-                parsed_result = parsed_result[:-1]  
-                
+                    llm_span.record_usage(response)
+
+                logger.info("Received response from LLM")
+                return response.choices[0].message.content
+            except Exception as e:
+                logger.error(f"LLM call error (attempt {retry_count+1}): {str(e)}")
+                retry_count += 1
+                if retry_count > max_retries:
+                    logger.error("Max retries exceeded for LLM call")
+                    return None
+                # Wait a bit before retrying
+                time.sleep(2)
+
+    def _analyze(self, text: str):
+        """Detect toxic clauses in a piece of text
+
+        Returns:
+            tuple: (list of clause dicts with "독소조항", 친절한_설명 string);
+            the list is None when the LLM call or its output failed
+        """
+        result = self._call_llm(text)
+        if result is None:
+            return None, ""
+
+        try:
+            # Remove code block markers if they exist
+            result = result.replace('```json', '').replace('```', '').strip()
+
+            # JSON 시작과 끝 위치 찾기
+            start_idx = result.find('[')
+            end_idx = result.rfind(']') + 1
+
+            if (start_idx == -1 or end_idx == 0):
+                logger.error("No JSON array found in response")
+                return None, ""
+
+            # JSON 부분만 추출
+            parsed_result = json.loads(result[start_idx:end_idx])
+            if not isinstance(parsed_result, list):
+                logger.error("Parsed result is not a list")
+                return None, ""
+        except json.JSONDecodeError as je:
+            logger.error(f"JSON parsing error: {str(je)}")
+            return None, ""
+
+        clauses = []
+        rationale = ""
+        for item in parsed_result:
+            if not isinstance(item, dict):
+                continue
+            if item.get("독소조항"):
+                clauses.append(item)
+            elif item.get("친절한_설명"):
+                rationale = item["친절한_설명"]
+        for clause in clauses:
+            clause["_rationale"] = rationale
+        return clauses, rationale
+
+    def _combine_rationales(self, rationales: List[str]) -> str:
+        """Reduce the per-chunk explanations into a single 친절한_설명"""
+        rationales = [r for r in rationales if r]
+        if len(rationales) <= 1:
+            return rationales[0] if rationales else ""
+
+        messages = [
+            {"role": "system", "content": COMBINE_RATIONALE_PROMPT},
+            {"role": "user", "content": "\n\n".join(f"- {r}" for r in rationales)}
+        ]
+        try:
+            with span("llm.combine_rationales", model=LLM_MODEL) as llm_span:
+                response = self.client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=0.1,
+                    timeout=60
+                )
+                llm_span.record_usage(response)
+            result = response.choices[0].message.content.strip()
+            if result:
+                return result
+        except Exception as e:
+            logger.error(f"Error combining explanations: {str(e)}")
+        return " ".join(rationales)
+
+    def _link_case(self, item: dict, rationale: str):
+        """Attach the most similar precedent to a toxic clause"""
+        if "유사판례_ID" in item:
+            # Verdict from the clause cache: precedent and summary are already linked
+            return {
+                "독소조항": item["독소조항"],
+                "유사판례_정리": item["유사판례_정리"],
+                "유사판례_ID": item["유사판례_ID"],
+                "유사도": item["유사도"],
+                "친절한_설명": rationale
+            }
+        try:
+            similar_case = self.case_retriever.find_similar_case(item["독소조항"])
+
+            formatted_case = self.format_case(str(similar_case["case"]))
+
+            return {
+                "독소조항": item["독소조항"],
+                # "이유": item["이유"],
+                "유사판례_정리": formatted_case,
+                "유사판례_ID": similar_case["case_id"],  # 원문은 /api/cases/<id>에서 조회
+                "유사도": similar_case["similarity_score"],
+                "친절한_설명": rationale
+            }
+        except Exception as item_e:
+            logger.error(f"Error processing item: {str(item_e)}")
+            return None
+
+    def detect(self, text: str):
+        """Toxic clauses in contract text, without precedents
+
+        With the clause cache, the text is split into articles and only
+        articles without a cached verdict are sent to the LLM. Long documents
+        are split on article boundaries (제N조) and analyzed chunk by chunk in
+        parallel when chunked mode is enabled; otherwise the text is analyzed
+        in a single call (truncated to 15000 chars).
+
+        Returns:
+            tuple: (list of clause dicts with "독소조항", 친절한_설명 string, complete);
+            complete is False if an LLM call failed or part of the text went unanalyzed
+        """
+        logger.info("Analyzing document with LLM...")
+
+        articles = []
+        if self.clause_cache is not None:
+            articles = [seg for seg in segment_contract(text) if seg["level"] in ("preamble", "article")]
+        if not articles:
+            clauses, rationale_item, complete = self._detect_text(text)
+            log_payload(logger, "Parsed result", clauses)
+            return clauses, rationale_item, complete
+
+        verdicts = self.clause_cache.lookup(self.prompt_version, [(a["text"], a["number"]) for a in articles])
+        cached, rationales, pending = [], [], []
+        for position, (article, verdict) in enumerate(zip(articles, verdicts)):
+            if verdict is None:
+                pending.append((position, article))
+                continue
+            cached.extend(dict(clause, _position=position) for clause in verdict["clauses"])
+            if verdict["clauses"] and verdict["rationale"]:
+                rationales.append(verdict["rationale"])
+        logger.info(f"Clause cache: {len(articles) - len(pending)}/{len(articles)} articles already analyzed")
+
+        fresh, rationale_item, complete, attributed = [], "", True, True
+        if pending:
+            fresh, rationale_item, complete = self._detect_text("\n\n".join(article["text"] for _, article in pending))
+            rationales.append(rationale_item)
+            attributed = self._attribute(fresh, pending, len(articles))
+
+        clauses = sorted(cached + fresh, key=lambda clause: clause["_position"])
+        if complete and attributed:
+            # Articles the LLM saw in full without finding anything are cached as clean
+            toxic = {clause["_position"] for clause in fresh}
+            for position, article in pending:
+                if position not in toxic:
+                    self.clause_cache.put(self.prompt_version, article["text"], article["number"], [], "")
+
+        log_payload(logger, "Parsed result", clauses)
+        return clauses, self._combine_rationales(list(dict.fromkeys(rationales))), complete
+
+    def _detect_text(self, text: str):
+        """(clauses, rationale, complete); complete is False if part of the text went unanalyzed"""
+        if self.chunked and len(text) > self.chunk_size:
+            chunks = split_into_chunks(text, self.chunk_size, self.chunk_overlap)
+            logger.info(f"Text is long ({len(text)} chars), analyzing {len(chunks)} chunks")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                chunk_results = list(executor.map(self._analyze, chunks))
+            clauses = merge_clauses([c for chunk_clauses, _ in chunk_results for c in chunk_clauses or []])
+            rationale_item = self._combine_rationales([r for _, r in chunk_results])
+            return clauses, rationale_item, all(chunk_clauses is not None for chunk_clauses, _ in chunk_results)
+
+        complete = True
+        # Limit text length if it's too long (to fit in context window)
+        if len(text) > 15000:
+            logger.info(f"Text is too long ({len(text)} chars), truncating to 15000 chars")
+            text = text[:15000]
+            complete = False
+        clauses, rationale_item = self._analyze(text)
+        return clauses or [], rationale_item, complete and clauses is not None
+
+    @staticmethod
+    def _attribute(clauses: List[dict], pending: list, end: int) -> bool:
+        """Tag clauses with the article quoting them; False if some clause matches no article"""
+        normalized = [(position, article, re.sub(r'\s+', '', article["text"])) for position, article in pending]
+        all_found = True
+        for clause in clauses:
+            quote = re.sub(r'\s+', '', clause["독소조항"])
+            match = next(((p, a) for p, a, text in normalized if quote and quote in text), None)
+            if match is None:
+                clause["_position"] = end
+                all_found = False
+            else:
+                clause["_position"], clause["_article"] = match
+        return all_found
+
+    def _store_verdicts(self, clauses: List[dict], linked: List[Optional[dict]]) -> None:
+        """Cache the linked clauses of freshly analyzed articles, per article"""
+        by_article = {}
+        for clause, item in zip(clauses, linked):
+            if "_article" in clause:
+                by_article.setdefault(clause["_position"], (clause, []))[1].append(item)
+        for clause, items in by_article.values():
+            if any(item is None or not self._summary_cached(item) for item in items):
+                continue  # linking or formatting failed; analyze again next time
+            article = clause["_article"]
+            verdict_clauses = [{k: v for k, v in item.items() if k != "친절한_설명"} for item in items]
+            self.clause_cache.put(self.prompt_version, article["text"], article["number"],
+                                  verdict_clauses, clause.get("_rationale", ""))
+
+    def _summary_cached(self, item: dict) -> bool:
+        index = self.case_retriever.find_case(item["유사판례_ID"])
+        if index is None:
+            return False
+        case_text = str(self.case_retriever.cases[index]["value"])
+        return case_id(case_text) in case_summaries.get_many([case_text], self.summary_version)
+
+    def link(self, clauses: List[dict], rationale: str) -> list:
+        """Attach the most similar precedent to every detected clause"""
+        logger.info("Finding similar cases...")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Each call runs in a copy of the current context, so formatted summaries reach the
+            # document database when there is an app context
+            futures = [executor.submit(contextvars.copy_context().run, self._link_case, item, rationale)
+                       for item in clauses]
+            linked = [future.result() for future in futures]
+        if self.clause_cache is not None:
+            self._store_verdicts(clauses, linked)
+        return [item for item in linked if item is not None]
+
+    def find(self, text: str) -> list:
+        """Find toxic clauses in contract text and link each to a precedent"""
+        try:
+            clauses, rationale, _ = self.detect(text)
+            reordered_result = self.link(clauses, rationale)
+            logger.info("Analysis complete!")
+            return reordered_result
 
-                for item in parsed_result:
-                    try:
-                        # Skip non-dictionary items or items without 독소조항
-                        # if not isinstance(item, dict) or "독소조항" not in item:
-                        #     continue
-                            
-                        # # Skip the item if it's the friendly explanation item
-                        # if "친절한_설명" in item and len(item) == 1:
-                        #     continue
-                            
-                        similar_case = self.case_retriever.find_similar_case(item["독소조항"])
-
-                        formatted_case = self.format_case(str(similar_case["case"]))
-                        
-                        reordered_item = {
-                            "독소조항": item["독소조항"],
-                            # "이유": item["이유"],
-                            "유사판례_정리": formatted_case,
-                            "유사판례_원문": similar_case["case"],
-                            "유사도": similar_case["similarity_score"],
-                            "친절한_설명": rationale_item
-                        }
-                        
-                        reordered_result.append(reordered_item)
-                    except Exception as item_e:
-                        logger.error(f"Error processing item: {str(item_e)}")
-                        continue
-                
-                logger.info("Analysis complete!")
-                return reordered_result
-                
-            except json.JSONDecodeError as je:
-                logger.error(f"JSON parsing error: {str(je)}")
-                return []
-                
         except Exception as e:
             logger.error(f"LLM Analysis error: {str(e)}")
             return []
@@ -351,69 +741,65 @@ class OrderedJsonEncoder(json.JSONEncoder):
             return {key: obj[key] for key in obj}
         return super().default(obj)
 
-app = Flask(__name__)
-app.json_encoder = OrderedJsonEncoder
+def create_app() -> Flask:
+    """Standalone /upload demo server; built on demand so importing this module stays cheap"""
+    app = Flask(__name__)
+    app.json_encoder = OrderedJsonEncoder
 
-API_KEY = UPSTAGE_API_KEY
-# PROMPT_PATH = "/Users/limdongha/workspace/LegalFore/FinanceGuard/backend/prompts/highlight_prompt.txt"
-# CASE_DB_PATH = "/Users/limdongha/workspace/LegalFore/FinanceGuard/backend/datasets/case_db.json"
+    document_parser = DocumentParser(UPSTAGE_API_KEY)
+    llm_highlighter = ToxicClauseFinder(
+        openai_api_key=OPENAI_API_KEY,
+        prompt_path=HIGHLIGHT_PROMPT_PATH,
+        case_retriever=get_case_retriever()
+    )
 
-document_parser = DocumentParser(API_KEY)
-case_retriever = CaseLawRetriever(
-    case_db_path=CASE_DB_PATH,
-    embedding_path="../datasets/precomputed_embeddings.npz"
-)
-llm_highlighter = ToxicClauseFinder(
-    openai_api_key=OPENAI_API_KEY,
-    prompt_path=HIGHLIGHT_PROMPT_PATH,
-    case_retriever=case_retriever
-)
+    @app.route('/', methods=['GET'])
+    def index():
+        return '''
+        <html>
+        <head><title>PDF Upload</title></head>
+        <body>
+            <h1>Upload PDF File for Parsing</h1>
+            <form action=\"/upload\" method=\"post\" enctype=\"multipart/form-data\">
+                <input type=\"file\" name=\"document\" accept=\"application/pdf\">
+                <input type=\"submit\" value=\"Upload\">
+            </form>
+        </body>
+        </html>
+        '''
 
-@app.route('/', methods=['GET'])
-def index():
-    return '''
-    <html>
-    <head><title>PDF Upload</title></head>
-    <body>
-        <h1>Upload PDF File for Parsing</h1>
-        <form action=\"/upload\" method=\"post\" enctype=\"multipart/form-data\">
-            <input type=\"file\" name=\"document\" accept=\"application/pdf\">
-            <input type=\"submit\" value=\"Upload\">
-        </form>
-    </body>
-    </html>
-    '''
-
-@app.route('/upload', methods=['POST'])
-def highlight_pdf():
-    try:
-        print("Starting document analysis...")
-        if 'document' not in request.files:
-            return jsonify({"error": "문서가 필요합니다."}), 400
+    @app.route('/upload', methods=['POST'])
+    def highlight_pdf():
+        try:
+            print("Starting document analysis...")
+            if 'document' not in request.files:
+                return jsonify({"error": "문서가 필요합니다."}), 400
         
-        file = request.files['document']
-        if not file.filename:
-            return jsonify({"error": "빈 파일이 전송되었습니다."}), 400
+            file = request.files['document']
+            if not file.filename:
+                return jsonify({"error": "빈 파일이 전송되었습니다."}), 400
             
-        parse_result = document_parser.parse(file)
-        text = parse_result.get("content", {}).get("text", "")
-        if not text:
-            return jsonify({"error": "파싱된 텍스트가 없습니다."}), 400
+            parse_result = document_parser.parse(file)
+            text = parse_result.get("content", {}).get("text", "")
+            if not text:
+                return jsonify({"error": "파싱된 텍스트가 없습니다."}), 400
         
-        highlight_result = llm_highlighter.find(text)
-        if not highlight_result:
-            return jsonify({"error": "분석 결과가 없습니다."}), 400
+            highlight_result = llm_highlighter.find(text)
+            if not highlight_result:
+                return jsonify({"error": "분석 결과가 없습니다."}), 400
             
-        # OrderedDict 순서를 보존하기 위해 dumps를 직접 사용
-        return app.response_class(
-            response=json.dumps(highlight_result, cls=OrderedJsonEncoder, ensure_ascii=False),
-            status=200,
-            mimetype='application/json'
-        )
+            # OrderedDict 순서를 보존하기 위해 dumps를 직접 사용
+            return app.response_class(
+                response=json.dumps(highlight_result, cls=OrderedJsonEncoder, ensure_ascii=False),
+                status=200,
+                mimetype='application/json'
+            )
         
-    except Exception as e:
-        app.logger.error(f"Error processing request: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        except Exception as e:
+            app.logger.error(f"Error processing request: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
@@ -0,0 +1,255 @@
+"""
+BM25 inverted index over the precedent corpus, for exact-term recall that
+dense embeddings blur (statute articles such as 제3조의2, law abbreviations
+such as 약관법, case numbers such as 2023다12345).
+
+The tokenizer is dependency-free and Korean-aware:
+  - statute references and case numbers become single tokens
+    ("제3조 제1항" -> 제3조, 제3조제1항)
+  - trailing particles (조사) are stripped from Hangul words
+  - Hangul words are also indexed as character bigrams, so compounds match
+    their parts (약관규제법 <-> 약관의 규제에 관한 법률)
+
+The saved index records the tokenizer version and a hash of the corpus it
+was built from; CaseLawRetriever ignores an index whose fingerprint does not
+match the loaded cases. Build the index offline (precompute_embeddings.py
+also does this):
+    python -m src.tools.lexical build
+    python -m src.tools.lexical query "약관법 제6조 위반"
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import sys
+import unicodedata
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when tokenize() changes, so indexes built with the old tokenizer are not used
+TOKENIZER_VERSION = 2
+
+STATUTE_PATTERN = re.compile(
+    r'제\s*(\d+)\s*조(?:\s*의\s*(\d+))?(?:\s*제?\s*(\d+)\s*항)?(?:\s*제?\s*(\d+)\s*호)?'
+)
+# 사건부호 of Korean courts (civil, criminal, administrative, family, patent, constitutional,
+# insolvency, execution); anything else between two numbers (2023년 12월) is not a case number
+CASE_TYPE_CODES = sorted([
+    "가합", "가단", "가소", "나", "다", "라", "마", "그", "카합", "카단", "카기", "카확", "머", "재다",
+    "고합", "고단", "고정", "고약", "노", "도", "모", "로", "오", "초", "감도",
+    "구합", "구단", "누", "두", "아", "드합", "드단", "르", "므", "느합", "느단", "스", "브",
+    "허", "후", "헌가", "헌나", "헌다", "헌라", "헌마", "헌바", "헌사", "헌아",
+    "회합", "회단", "하합", "하단", "개회", "타경", "타채",
+], key=len, reverse=True)
+CASE_NUMBER_PATTERN = re.compile(
+    rf'(?<!\d)(\d{{4}}|\d{{2}})\s*({"|".join(CASE_TYPE_CODES)})\s*(\d{{2,7}})(?!\d)'
+)
+HANGUL_WORD = re.compile(r'[가-힣]+')
+ALNUM_WORD = re.compile(r'[a-z0-9]+')
+
+# Longest first, so "에서" is stripped before "에"
+PARTICLES = sorted([
+    "은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "께서", "로", "으로", "와", "과",
+    "도", "만", "까지", "부터", "보다", "처럼", "이나", "나", "이며", "며", "에는", "에도", "으로서",
+    "로서", "으로써", "로써", "이라", "라", "이다", "였다", "하여", "하고", "한", "할", "함", "된", "되어",
+], key=len, reverse=True)
+
+
+def _strip_particle(word: str) -> str:
+    for particle in PARTICLES:
+        if len(word) > len(particle) + 1 and word.endswith(particle):
+            return word[:-len(particle)]
+    return word
+
+
+def statute_tokens(match: re.Match) -> List[str]:
+    article, branch, paragraph, item = match.groups()
+    token = f"제{article}조" + (f"의{branch}" if branch else "")
+    tokens = [token]
+    if paragraph:
+        token += f"제{paragraph}항"
+        tokens.append(token)
+    if item:
+        tokens.append(token + f"제{item}호")
+    return tokens
+
+
+def tokenize(text: str) -> List[str]:
+    """Index/query tokens for Korean legal text"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+
+    for match in STATUTE_PATTERN.finditer(text):
+        tokens.extend(statute_tokens(match))
+    text = STATUTE_PATTERN.sub(" ", text)
+    for match in CASE_NUMBER_PATTERN.finditer(text):
+        tokens.append("".join(match.groups()))
+    text = CASE_NUMBER_PATTERN.sub(" ", text)
+
+    for word in HANGUL_WORD.findall(text):
+        word = _strip_particle(word)
+        tokens.append(word)
+        if len(word) > 2:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    tokens.extend(ALNUM_WORD.findall(text))
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over an immutable corpus, stored as CSR posting lists"""
+
+    def __init__(self, terms: Sequence[str], indptr: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75,
+                 fingerprint: str = ""):
+        self.fingerprint = fingerprint  # index_fingerprint() of the corpus it was built from
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_lengths)
+        document_freqs = np.diff(indptr)
+        self.idf = np.log1p((n_docs - document_freqs + 0.5) / (document_freqs + 0.5)).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if n_docs else 1.0
+        # Per-document part of the BM25 denominator, computed once
+        self._length_norm = (k1 * (1 - b + b * doc_lengths / max(average_length, 1e-9))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, tokenized_documents: Iterable[List[str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocabulary = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_lengths = []
+        for doc_id, tokens in enumerate(tokenized_documents):
+            doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, freq))
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        term_freqs = np.empty(indptr[-1], dtype=np.float32)
+        for term_id, term_postings in enumerate(postings):
+            start = indptr[term_id]
+            doc_ids[start:start + len(term_postings)] = [doc_id for doc_id, _ in term_postings]
+            term_freqs[start:start + len(term_postings)] = [freq for _, freq in term_postings]
+        return cls(list(vocabulary), indptr, doc_ids, term_freqs, np.array(doc_lengths, dtype=np.float32), k1, b)
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path, terms=np.array(list(self.vocabulary), dtype=str), indptr=self.indptr, doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs, doc_lengths=self.doc_lengths, params=np.array([self.k1, self.b]),
+            fingerprint=np.array(self.fingerprint)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        data = np.load(path)
+        k1, b = data["params"].tolist()
+        fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+        return cls(data["terms"].tolist(), data["indptr"], data["doc_ids"], data["term_freqs"],
+                   data["doc_lengths"], k1, b, fingerprint)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+            # Posting lists hold each document once, so fancy-index += is safe
+            scores[docs] += self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self._length_norm[docs])
+        return scores
+
+    def search(self, query: str, top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Best-scoring documents first; only documents sharing a term with the query are returned"""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        order = np.argsort(-scores[matched], kind="stable")
+        return matched[order], scores[matched[order]]
+
+
+def tokenize_case(case: dict, key_weight: int = 2) -> List[str]:
+    """Case headline tokens count `key_weight` times, the full text once"""
+    return tokenize(str(case.get("key", ""))) * key_weight + tokenize(str(case.get("value", "")))
+
+
+def corpus_fingerprint(cases: Sequence[dict]) -> str:
+    """SHA-256 of every case's headline and text, in order"""
+    digest = hashlib.sha256()
+    for case in cases:
+        digest.update(str(case.get("key", "")).encode('utf-8') + b"\x00")
+        digest.update(str(case.get("value", "")).encode('utf-8') + b"\x01")
+    return digest.hexdigest()
+
+
+def index_fingerprint(corpus_hash: str) -> str:
+    return f"tokenizer-{TOKENIZER_VERSION}:{corpus_hash}"
+
+
+def build_case_index(cases: Sequence[dict]) -> BM25Index:
+    index = BM25Index.build(tokenize_case(case) for case in cases)
+    index.fingerprint = index_fingerprint(corpus_fingerprint(cases))
+    return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Merge ranked ID lists: score(d) = sum over lists of 1 / (k + rank of d)"""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[int(doc_id)] = fused.get(int(doc_id), 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda doc_id: -fused[doc_id])
+
+
+def main(argv=None) -> int:
+    from src.config import CASE_DB_PATH, CASE_LEXICAL_INDEX_PATH
+
+    parser = argparse.ArgumentParser(description="BM25 index over the precedent corpus")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="tokenize case_db.json and write the index")
+    build_parser.add_argument("--cases", default=CASE_DB_PATH)
+    build_parser.add_argument("--output", default=CASE_LEXICAL_INDEX_PATH)
+    query_parser = subparsers.add_parser("query", help="search the index")
+    query_parser.add_argument("text")
+    query_parser.add_argument("--index", default=CASE_LEXICAL_INDEX_PATH)
+    query_parser.add_argument("--cases", default=CASE_DB_PATH)
+    query_parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with open(args.cases, 'r', encoding='utf-8') as f:
+        cases = json.load(f)
+    if args.command == "build":
+        index = build_case_index(cases)
+        index.save(args.output)
+        print(f"Indexed {len(index)} cases, {len(index.vocabulary)} terms -> {args.output}")
+        return 0
+
+    index = BM25Index.load(args.index)
+    print(f"tokens: {tokenize(args.text)}")
+    for doc_id, score in zip(*index.search(args.text, args.top_k)):
+        print(f"{score:8.3f}  {cases[doc_id]['key']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
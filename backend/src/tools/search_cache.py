@@ -0,0 +1,111 @@
+"""TTL cache for web search results keyed by normalized query"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query: NFKC, lowercase, single spaces, no trailing punctuation"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r'\s+', ' ', query).strip()
+    return query.rstrip(' ?!.。~')
+
+
+class SearchCache:
+    """Thread-safe LRU cache with per-entry TTL
+
+    Lookups first try the normalized query exactly. If a `model` is given,
+    a miss falls back to the most similar cached query whose embedding
+    cosine similarity is at least `semantic_threshold`. With a `signature`,
+    only cached queries with the same signature as the lookup are considered.
+    """
+
+    def __init__(self, ttl: float, max_size: int, model=None, semantic_threshold: float = 0.92,
+                 signature: Optional[Callable[[str], Hashable]] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.model = model  # object with encode(text, normalize_embeddings=True), or a zero-arg loader
+        self.semantic_threshold = semantic_threshold
+        self.signature = signature
+        self._entries = OrderedDict()  # key -> (value, expires_at, embedding)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def _encoder(self):
+        if callable(self.model) and not hasattr(self.model, "encode"):
+            self.model = self.model()
+        return self.model
+
+    def _embed(self, key: str) -> Optional[np.ndarray]:
+        if self.model is None:
+            return None
+        try:
+            return np.asarray(self._encoder().encode(key, normalize_embeddings=True))
+        except Exception as e:
+            logger.error(f"Search cache embedding failed: {e}")
+            return None
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, query: str) -> Optional[Any]:
+        key = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            candidates = [(k, e) for k, (_, _, e) in self._entries.items() if e is not None]
+        if self.signature is not None and candidates:
+            wanted = self.signature(key)
+            candidates = [(k, e) for k, e in candidates if self.signature(k) == wanted]
+
+        embedding = self._embed(key) if candidates else None
+        if embedding is not None:
+            keys, embeddings = zip(*candidates)
+            scores = np.stack(embeddings) @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] >= self.semantic_threshold:
+                with self._lock:
+                    entry = self._entries.get(keys[best])
+                    if entry is not None:
+                        self.stats["semantic_hits"] += 1
+                        logger.info(f"Search cache semantic hit ({scores[best]:.3f}): '{key}' ~ '{keys[best]}'")
+                        return entry[0]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, query: str, value: Any) -> None:
+        key = normalize_query(query)
+        embedding = self._embed(key)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,198 @@
+"""Article/clause segmentation and per-document embedding index for parsed contracts"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple, TypedDict
+
+import numpy as np
+
+from src.config import DOCUMENT_INDEX_MAX_DOCUMENTS
+
+logger = logging.getLogger(__name__)
+
+# 조 단위 머리글: 줄 첫머리의 "제3조", "제 12 조", "제5조의2" 또는 "제3조(목적)"처럼 제목이 붙은 경우.
+# "제3조(목적)에 따라"와 같은 본문 속 인용은 제외합니다.
+ARTICLE_PATTERN = re.compile(
+    r'^[ \t]*제\s*\d+\s*조(?:\s*의\s*\d+)?'
+    r'|제\s*\d+\s*조(?:\s*의\s*\d+)?'
+    r'(?=\s*[(\[【<][^)\]】>\n]{1,40}[)\]】>](?!\s*(?:에|의|을|를|와|과|및|또는|으로|로|부터|까지)))',
+    re.MULTILINE
+)
+ARTICLE_NUMBER_PATTERN = re.compile(r'제\s*(\d+)\s*조(?:\s*의\s*(\d+))?')
+ARTICLE_TITLE_PATTERN = re.compile(r'\s*[(\[【<]\s*([^)\]】>\n]{1,40})[)\]】>]')
+# 항 단위: ① ~ ⑳
+CLAUSE_PATTERN = re.compile(r'[①-⑳]')
+
+
+class ContractSegment(TypedDict):
+    id: int
+    level: str  # "preamble", "article" or "clause"
+    number: str  # "3", "5의2", "3-①"
+    title: str
+    start: int  # character offsets into the parsed text
+    end: int
+    text: str
+    parent: Optional[int]  # id of the enclosing article for clauses
+
+
+def _trimmed(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Shrink [start, end) so it does not begin or end with whitespace"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def segment_contract(text: str) -> List[ContractSegment]:
+    """Split parsed contract text into articles (조) and their clauses (항)
+
+    Every segment keeps its character offsets into `text`, so
+    `text[segment["start"]:segment["end"]] == segment["text"]`.
+    """
+    segments: List[ContractSegment] = []
+    if not text:
+        return segments
+
+    starts = [m.start() for m in ARTICLE_PATTERN.finditer(text)]
+    bounds = starts + [len(text)]
+
+    def add(level, number, title, start, end, parent=None):
+        start, end = _trimmed(text, start, end)
+        if start >= end:
+            return None
+        segments.append({
+            "id": len(segments),
+            "level": level,
+            "number": number,
+            "title": title,
+            "start": start,
+            "end": end,
+            "text": text[start:end],
+            "parent": parent
+        })
+        return segments[-1]["id"]
+
+    if not starts or starts[0] > 0:
+        add("preamble", "", "", 0, starts[0] if starts else len(text))
+
+    for start, end in zip(bounds, bounds[1:]):
+        header = ARTICLE_NUMBER_PATTERN.search(text, start, end)
+        number = header.group(1) + (f"의{header.group(2)}" if header.group(2) else "")
+        title_match = ARTICLE_TITLE_PATTERN.match(text, header.end(), end)
+        title = title_match.group(1).strip() if title_match else ""
+
+        article_id = add("article", number, title, start, end)
+        if article_id is None:
+            continue
+
+        clause_starts = [m.start() for m in CLAUSE_PATTERN.finditer(text, header.end(), end)]
+        for clause_start, clause_end in zip(clause_starts, clause_starts[1:] + [end]):
+            add("clause", f"{number}-{text[clause_start]}", title, clause_start, clause_end, parent=article_id)
+
+    return segments
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', '', text)
+
+
+class DocumentIndex:
+    """Segments of one contract together with their embeddings"""
+
+    def __init__(self, document_id: str, text: str, segments: List[ContractSegment], embeddings: np.ndarray, model):
+        self.document_id = document_id
+        self.text = text
+        self.segments = segments
+        self.embeddings = embeddings  # L2-normalized, one row per segment
+        self.model = model
+
+    def search(self, query: str, top_k: int = 3, levels=("article",)) -> List[Tuple[ContractSegment, float]]:
+        """Return the segments most similar to the query, best first"""
+        candidates = [i for i, seg in enumerate(self.segments) if seg["level"] in levels]
+        if not candidates:
+            return []
+
+        query_embedding = self.model.encode(query, normalize_embeddings=True)
+        scores = self.embeddings[candidates] @ query_embedding
+        order = np.argsort(scores)[::-1][:top_k]
+        return [(self.segments[candidates[i]], float(scores[i])) for i in order]
+
+    def locate(self, passage: str) -> Optional[dict]:
+        """Find where a passage (e.g. a detected toxic clause) sits in the document
+
+        Returns the character offsets of the passage and the article containing it,
+        or None if the passage cannot be found verbatim (ignoring whitespace).
+        """
+        target = _normalize(passage)
+        if not target:
+            return None
+
+        # Map positions in the whitespace-free text back to the original offsets
+        positions = [i for i, ch in enumerate(self.text) if not ch.isspace()]
+        found = "".join(self.text[i] for i in positions).find(target)
+        if found == -1:
+            return None
+
+        start = positions[found]
+        end = positions[found + len(target) - 1] + 1
+        article = next(
+            (seg for seg in self.segments
+             if seg["level"] in ("preamble", "article") and seg["start"] <= start < seg["end"]),
+            None
+        )
+        return {
+            "start": start,
+            "end": end,
+            "article": article["number"] if article else "",
+            "segment_id": article["id"] if article else None
+        }
+
+
+class DocumentIndexStore:
+    """In-memory LRU store of per-document indexes"""
+
+    def __init__(self, max_documents: int = DOCUMENT_INDEX_MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document_id: str) -> Optional[DocumentIndex]:
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is not None:
+                self._indexes.move_to_end(document_id)
+            return index
+
+    def put(self, index: DocumentIndex) -> None:
+        with self._lock:
+            self._indexes[index.document_id] = index
+            self._indexes.move_to_end(index.document_id)
+            while len(self._indexes) > self.max_documents:
+                self._indexes.popitem(last=False)
+
+    def build(self, document_id: str, text: str, model) -> DocumentIndex:
+        """Return the index for a document, segmenting and embedding it only once"""
+        index = self.get(document_id)
+        if index is not None and index.text == text:
+            return index
+
+        segments = segment_contract(text)
+        logger.info(f"Segmented document {document_id} into {len(segments)} segments")
+        if segments:
+            embeddings = np.asarray(model.encode(
+                [seg["text"] for seg in segments],
+                batch_size=32,
+                normalize_embeddings=True
+            ))
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+
+        index = DocumentIndex(document_id, text, segments, embeddings, model)
+        self.put(index)
+        return index
+
+
+document_index_store = DocumentIndexStore()
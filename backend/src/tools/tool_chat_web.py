@@ -2,23 +2,33 @@ import requests
 from flask import Flask, request, jsonify, Response
 import langgraph
 import json
+import logging
 import os
 from src.tools.basic import *
 from langchain_openai import ChatOpenAI
-from langchain_teddynote.tools.tavily import TavilySearch
 from typing import Annotated, Dict, Any, Optional, List
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, START, END
 from werkzeug.utils import secure_filename
 from langchain_core.messages import ToolMessage
-from langchain_teddynote.messages import display_message_tree
 from dotenv import load_dotenv
 from langchain.tools import tool
 from pydantic import BaseModel, Field
 
-from tavily import TavilyClient
-from ..config import FORMAT_PROMPT_PATH
+from .embeddings import get_embedding_model
+from .search_cache import SearchCache
+from ..telemetry import span, metrics
+from ..config import (
+    FORMAT_PROMPT_PATH,
+    TAVILY_API_KEY,
+    WEB_SEARCH_CACHE_TTL,
+    WEB_SEARCH_CACHE_SIZE,
+    WEB_SEARCH_SEMANTIC_CACHE,
+    WEB_SEARCH_SEMANTIC_THRESHOLD
+)
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
@@ -142,6 +152,7 @@ def query_agent():
     # 노드 추가
     llm = ChatOpenAI(model="gpt-4o-mini")
 
+    from langchain_teddynote.tools.tavily import TavilySearch
     tool = TavilySearch(max_results=3)
     Tavily_agent = Tavily(tool)
     Tavily_agent.add_tool()
@@ -193,6 +204,32 @@ def chatbot(state: State):
 with open(FORMAT_PROMPT_PATH, 'r', encoding='utf-8') as f:
     format_prompt = f.read()
 
+_search_client = None
+
+def get_search_client():
+    """Return the Tavily client, created once and reused across calls"""
+    global _search_client
+    if _search_client is None:
+        from tavily import TavilyClient
+        _search_client = TavilyClient(api_key=os.environ.get('TAVILY_API_KEY') or TAVILY_API_KEY)
+    return _search_client
+
+def set_search_client(client) -> None:
+    """Replace the search backend (e.g. a local stub with a Tavily-compatible search())"""
+    global _search_client
+    _search_client = client
+    web_search_cache.clear()
+
+# Search results shared by all users, keyed by normalized query
+web_search_cache = SearchCache(
+    ttl=WEB_SEARCH_CACHE_TTL,
+    max_size=WEB_SEARCH_CACHE_SIZE,
+    model=get_embedding_model if WEB_SEARCH_SEMANTIC_CACHE else None,
+    semantic_threshold=WEB_SEARCH_SEMANTIC_THRESHOLD
+)
+
+metrics.register_collector("financeguard_web_search_cache", web_search_cache.get_stats)
+
 # Define schema for the web search tool
 class WebSearchToolSchema(BaseModel):
     query: str = Field(..., description="Search query to look up information on the web")
@@ -208,15 +245,21 @@ def web_search_tool(query: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: A dictionary containing search results with titles, snippets, and URLs
     """
+    cached = web_search_cache.get(query)
+    if cached is not None:
+        logger.info(f"Web search cache hit for query: {query}")
+        return dict(cached, query=query)
+    
     try:
-        tavily_client = TavilyClient(api_key=os.environ.get('TAVILY_API_KEY'))
-        search_results = tavily_client.search(
-            query=query,
-            search_depth="advanced",
-            include_images=False,
-            include_raw_content=False,
-            max_results=2
-        )
+        with span("tavily.search") as search_span:
+            search_results = get_search_client().search(
+                query=query,
+                search_depth="advanced",
+                include_images=False,
+                include_raw_content=False,
+                max_results=2
+            )
+            search_span.record_payload(len(json.dumps(search_results, ensure_ascii=False).encode("utf-8")))
         
         # Format the results for easier consumption
         formatted_results = {
@@ -232,6 +275,7 @@ def web_search_tool(query: str) -> Dict[str, Any]:
                     "content": result.get("content", "No content")
                 })
         
+        web_search_cache.put(query, formatted_results)
         return formatted_results
     except Exception as e:
         return {
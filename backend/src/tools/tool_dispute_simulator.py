@@ -6,28 +6,21 @@ import json
 import os
 import io  # Add this import
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from src.tools.highlight import CaseLawRetriever, DocumentParser, ToxicClauseFinder
+from src.tools.highlight import CaseLawRetriever, DocumentParser, ToxicClauseFinder, get_case_retriever
+from src.tools.case_summaries import FORMAT_MODEL, case_summaries, summary_version
 import logging
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
-import boto3
-from botocore.config import Config
+from src.documents import document_s3_key, file_size, open_document, read_header
+from src.telemetry import span, traced
 import traceback
 from ..config import (
     CASE_DB_PATH,
     EMBEDDING_PATH,
     SIMULATION_PROMPT_PATH,
     FORMAT_PROMPT_PATH,
-    HIGHLIGHT_PROMPT_PATH
-)
-
-BUCKET_NAME = os.environ.get('BUCKET_NAME', 'wetube-gwanwoo')
-s3 = boto3.client('s3',
-    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-    region_name='ap-northeast-2',
-    config=Config(signature_version='s3v4')
+    HIGHLIGHT_PROMPT_PATH,
+    SIMULATION_CASE_CANDIDATES
 )
 
 load_dotenv()
@@ -95,7 +88,7 @@ def extract_toxic_clauses(state: SimulationState, llm_highlighter: ToxicClauseFi
         state["error"] = f"Clause extraction error: {str(e)}"
         return state
 
-def select_relevant_toxic_clauses(state: SimulationState, model: SentenceTransformer) -> SimulationState:
+def select_relevant_toxic_clauses(state: SimulationState, model) -> SimulationState:
     """Select most relevant toxic clauses based on user query"""
     if state.get("error") or not state.get("toxic_clauses"):
         return state
@@ -144,20 +137,28 @@ def format_case(case_details: str, format_prompt: str, client: OpenAI) -> str:
         if len(case_details.split()) < 5 and not any(legal_term in case_details for legal_term in ["판례", "법원", "계약", "조항"]):
             return "계약서 분석과 관련된 내용만 처리할 수 있습니다."
             
+        version = summary_version(format_prompt)
+        cached_summary = case_summaries.get(case_details, version)
+        if cached_summary is not None:
+            return cached_summary
+            
         messages = [
             {"role": "system", "content": format_prompt},
             {"role": "user", "content": case_details}
         ]
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.1
-        )
+        with span("llm.format_case", model=FORMAT_MODEL) as llm_span:
+            response = client.chat.completions.create(
+                model=FORMAT_MODEL,
+                messages=messages,
+                temperature=0.1
+            )
+            llm_span.record_usage(response)
         
         result = response.choices[0].message.content.strip()
         if not result:
             return "판례 분석 결과가 없습니다."
+        case_summaries.put(case_details, version, result)
         return result
     except Exception as e:
         logger.error(f"Case formatting error: {str(e)}")
@@ -171,25 +172,27 @@ def retrieve_cases_for_clauses(state: SimulationState, case_retriever: CaseLawRe
     try:
         state["similar_cases"] = []
         
-        # For each relevant toxic clause, find similar cases
-        for toxic_clause in state["relevant_toxic_clauses"]:
-            logger.info(f"Retrieving similar cases for toxic clause")
-            clause_text = toxic_clause.get("독소조항", "")
-            combined_query = f"{state['query']} {clause_text}"
-            
-            query_embedding = case_retriever.model.encode(combined_query)
-            similarities = np.dot(case_retriever.case_embeddings, query_embedding) / (
-                np.linalg.norm(case_retriever.case_embeddings, axis=1) * np.linalg.norm(query_embedding)
-            )
-            
-            top_indices = np.argsort(similarities)[-10:][::-1]
+        # Encode every clause query at once and search them as one batch
+        combined_queries = [
+            f"{state['query']} {toxic_clause.get('독소조항', '')}"
+            for toxic_clause in state["relevant_toxic_clauses"]
+        ]
+        logger.info(f"Retrieving similar cases for {len(combined_queries)} toxic clauses")
+        case_retriever.ensure_loaded()
+        query_embeddings = case_retriever.model.encode(combined_queries)
+        top_indices, top_scores = case_retriever.search(
+            query_embeddings, top_k=SIMULATION_CASE_CANDIDATES, query_texts=combined_queries
+        )
+        
+        for indices, scores in zip(top_indices, top_scores):
             cases_for_clause = []
             
-            for idx in top_indices:
+            for idx, score in zip(indices, scores):
                 cases_for_clause.append({
                     "case": str(case_retriever.cases[idx]["value"]),
-                    "similarity_score": float(similarities[idx]),
-                    "index": idx,
+                    "similarity_score": float(score),
+                    "index": int(idx),
+                    "case_id": case_retriever.case_key(idx),
                     "formatted_case": None  # We'll format only after selecting the best case
                 })
                 
@@ -218,10 +221,11 @@ def select_best_cases(state: SimulationState, case_retriever: CaseLawRetriever,
             best_case = None
             highest_similarity = -1
             
-            for case_data in similar_cases_set:
-                case_text = str(case_data["case"])
-                case_embedding = case_retriever.model.encode(case_text[:1024])
-                
+            case_embeddings = case_retriever.model.encode(
+                [str(case_data["case"])[:1024] for case_data in similar_cases_set]
+            ) if similar_cases_set else []
+            
+            for case_data, case_embedding in zip(similar_cases_set, case_embeddings):
                 similarity = np.dot(case_embedding, query_embedding) / (
                     np.linalg.norm(case_embedding) * np.linalg.norm(query_embedding)
                 )
@@ -282,11 +286,13 @@ def run_simulations(state: SimulationState, simulation_prompt: str, client: Open
                 {"role": "user", "content": context}
             ]
             
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",  
-                messages=messages,
-                temperature=0.1,
-            )
+            with span("llm.simulate_dispute", model="gpt-4o-mini") as llm_span:
+                response = client.chat.completions.create(
+                    model="gpt-4o-mini",  
+                    messages=messages,
+                    temperature=0.1,
+                )
+                llm_span.record_usage(response)
             
             state["simulations"].append(response.choices[0].message.content.strip())
             logger.info(f"Completed simulation {i+1}")
@@ -316,8 +322,8 @@ def create_simulation_workflow(
         format_prompt = f.read()
     
     # Initialize components
-    case_retriever = CaseLawRetriever(case_db_path, embedding_path)
-    case_retriever.load_cases()
+    case_retriever = get_case_retriever(case_db_path, embedding_path)
+    case_retriever.ensure_loaded()
     
     document_parser = DocumentParser(upstage_api_key)
     
@@ -333,12 +339,12 @@ def create_simulation_workflow(
     workflow = StateGraph(SimulationState)
     
     # Add nodes
-    workflow.add_node("parse", lambda state: parse_document(state, document_parser))
-    workflow.add_node("extract", lambda state: extract_toxic_clauses(state, llm_highlighter))
-    workflow.add_node("select_clauses", lambda state: select_relevant_toxic_clauses(state, case_retriever.model))
-    workflow.add_node("retrieve", lambda state: retrieve_cases_for_clauses(state, case_retriever, format_prompt, client))
-    workflow.add_node("select_cases", lambda state: select_best_cases(state, case_retriever, format_prompt, client))
-    workflow.add_node("simulate", lambda state: run_simulations(state, simulation_prompt, client))
+    workflow.add_node("parse", traced("simulation.parse")(lambda state: parse_document(state, document_parser)))
+    workflow.add_node("extract", traced("simulation.extract")(lambda state: extract_toxic_clauses(state, llm_highlighter)))
+    workflow.add_node("select_clauses", traced("simulation.select_clauses")(lambda state: select_relevant_toxic_clauses(state, case_retriever.model)))
+    workflow.add_node("retrieve", traced("simulation.retrieve")(lambda state: retrieve_cases_for_clauses(state, case_retriever, format_prompt, client)))
+    workflow.add_node("select_cases", traced("simulation.select_cases")(lambda state: select_best_cases(state, case_retriever, format_prompt, client)))
+    workflow.add_node("simulate", traced("simulation.simulate")(lambda state: run_simulations(state, simulation_prompt, client)))
     
     # Add edges
     workflow.add_edge("parse", "extract")
@@ -384,12 +390,6 @@ def run_simulation_from_file(
             file_obj.seek(0)
             logger.info("Reset file position to beginning")
         
-        # Get some information about the file object
-        if hasattr(file_obj, 'read'):
-            sample = file_obj.read(100)
-            file_obj.seek(0)
-            logger.info(f"File object sample: {sample[:20]}... (showing first 20 bytes)")
-        
         logger.info("Parsing document...")
         parse_result = document_parser.parse(file_obj)
         
@@ -430,11 +430,18 @@ def run_simulation_from_file(
             logger.error(f"Graph execution completed with error: {result['error']}")
             return {"error": result["error"]}
         
-        # Return results
+        # Return results; cases are referenced by ID (full text via /api/cases/<id>)
         return {
             "simulations": result.get("simulations", []),
             "relevant_toxic_clauses": result.get("relevant_toxic_clauses", []),
-            "selected_cases": result.get("selected_cases", [])
+            "selected_cases": [
+                {
+                    "case_id": case["case_id"],
+                    "similarity_score": case["similarity_score"],
+                    "formatted_case": case["formatted_case"]
+                }
+                for case in result.get("selected_cases", [])
+            ]
         }
         
     except Exception as e:
@@ -443,25 +450,6 @@ def run_simulation_from_file(
         logger.error(traceback.format_exc())
         return {"error": f"실행 오류: {str(e)}"}
     
-def convert_numpy_types(obj):
-    """
-    Recursively convert numpy types to native Python types for JSON serialization
-    """
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, dict):
-        return {key: convert_numpy_types(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, tuple):
-        return tuple(convert_numpy_types(item) for item in obj)
-    else:
-        return obj
-
 # Tool decorator for direct usage from other modules
 @tool(args_schema=SimulationToolSchema, description="Simulates potential contract disputes and outcomes based on the user's query and the provided contract document, especially when legal interpretation or clause-related conflicts are involved.")
 def simulate_dispute_tool(query: str, file_id: str) -> Dict[str, Any]:
@@ -477,28 +465,20 @@ def simulate_dispute_tool(query: str, file_id: str) -> Dict[str, Any]:
         # Retrieve file from S3
         try:
             logger.info(f"Retrieving file from S3 with key: {file_id}")
-            # Add error handling for different key formats
-            if not file_id.startswith("pdf/"):
-                file_id = f"{file_id}"
-                logger.info(f"Adjusted file ID to: {file_id}")
+            # Documents are stored under a key derived from their content-hash ID
+            s3_key = document_s3_key(file_id)
+            logger.info(f"Using S3 key: {s3_key}")
             
             # Get the document from S3
             try:
-                response = s3.get_object(Bucket=BUCKET_NAME, Key=file_id)
-                content_type = response.get('ContentType', '')
-                logger.info(f"Retrieved file from S3 with content type: {content_type}")
-                
-                # Read the entire content into memory
-                file_content = response['Body'].read()
-                logger.info(f"Read {len(file_content)} bytes from S3")
-                
-                # Create a BytesIO object to use as a file-like object
-                file_obj = io.BytesIO(file_content)
-                file_obj.seek(0)
+                # Spooled to a temp file once the document is large, instead of read() + BytesIO copies
+                file_obj = open_document(file_id)
+                logger.info(f"Downloaded {file_size(file_obj)} bytes from S3")
                 
                 # Check if this looks like a PDF (starts with %PDF-)
-                if not file_content.startswith(b'%PDF-'):
-                    logger.warning(f"File does not appear to be a PDF. First bytes: {file_content[:20]}")
+                header = read_header(file_obj, 20)
+                if not header.startswith(b'%PDF-'):
+                    logger.warning(f"File does not appear to be a PDF. First bytes: {header}")
                 
                 logger.info("Successfully created file object from S3 content")
             except Exception as e:
@@ -506,23 +486,24 @@ def simulate_dispute_tool(query: str, file_id: str) -> Dict[str, Any]:
                 return {"error": f"S3에서 파일을 검색하는 데 실패했습니다: {str(e)}"}
             
             # Use the provided document parser with our file object
-            result = run_simulation_from_file(
-                file_obj,
-                query,
-                CASE_DB_PATH,
-                EMBEDDING_PATH,
-                SIMULATION_PROMPT_PATH, 
-                FORMAT_PROMPT_PATH,
-                HIGHLIGHT_PROMPT_PATH
-            )
+            with file_obj:
+                result = run_simulation_from_file(
+                    file_obj,
+                    query,
+                    CASE_DB_PATH,
+                    EMBEDDING_PATH,
+                    SIMULATION_PROMPT_PATH, 
+                    FORMAT_PROMPT_PATH,
+                    HIGHLIGHT_PROMPT_PATH
+                )
             
             if "error" in result and result["error"]:
                 logger.error(f"Simulation error: {result['error']}")
             else:
                 logger.info("Simulation completed successfully")
                 
-            # Convert NumPy types to Python native types before returning
-            return convert_numpy_types(result)
+            # NumPy scores are left as-is; src.serialization encodes them natively
+            return result
             
         except Exception as e:
             logger.error(f"Error in file processing: {e}")
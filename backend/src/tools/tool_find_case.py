@@ -4,10 +4,12 @@ import numpy as np
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
-from src.tools.highlight import CaseLawRetriever
+from src.tools.highlight import CaseLawRetriever, get_case_retriever
+from src.tools.case_summaries import FORMAT_MODEL, case_summaries, summary_version
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 from src.config import CASE_DB_PATH, EMBEDDING_PATH, FORMAT_PROMPT_PATH
+from src.telemetry import span, traced
 
 load_dotenv()
 
@@ -25,17 +27,16 @@ def retrieve_cases(state: QueryState, case_retriever: CaseLawRetriever) -> Query
     """검색 노드: 유사 판례 찾기"""
     try:
         print(f"Retrieving similar cases for query: {state['query']}")
+        case_retriever.ensure_loaded()
         query_embedding = case_retriever.model.encode(state["query"])
-        similarities = np.dot(case_retriever.case_embeddings, query_embedding) / (
-            np.linalg.norm(case_retriever.case_embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
         
         # Top 1 similar case
-        top_index = np.argmax(similarities)
+        indices, scores = case_retriever.search(query_embedding, top_k=1, query_texts=[state["query"]])
+        top_index = int(indices[0, 0])
         state["similar_cases"] = [
             {
                 "case": case_retriever.cases[top_index]["value"],
-                "similarity_score": float(similarities[top_index])
+                "similarity_score": float(scores[0, 0])
             }
         ]
         print(f"Found most similar case")
@@ -54,20 +55,30 @@ def format_cases(state: QueryState, format_prompt: str, client: OpenAI) -> Query
     try:
         print("Formatting case results...")
         formatted_results = []
+        version = summary_version(format_prompt)
         for case in state["similar_cases"]:
             case_content = str(case["case"])
+            cached_summary = case_summaries.get(case_content, version)
+            if cached_summary is not None:
+                formatted_results.append(cached_summary)
+                continue
             messages = [
                 {"role": "system", "content": format_prompt},
                 {"role": "user", "content": case_content}
             ]
             
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",  # gpt-4o-mini 대신 더 안정적인 모델 사용
-                    messages=messages,
-                    temperature=0.1
-                )
-                formatted_results.append(response.choices[0].message.content.strip())
+                with span("llm.format_case", model=FORMAT_MODEL) as llm_span:
+                    response = client.chat.completions.create(
+                        model=FORMAT_MODEL,
+                        messages=messages,
+                        temperature=0.1
+                    )
+                    llm_span.record_usage(response)
+                formatted_case = response.choices[0].message.content.strip()
+                if formatted_case:
+                    case_summaries.put(case_content, version, formatted_case)
+                formatted_results.append(formatted_case)
                 print(f"Successfully formatted case result")
             except Exception as e:
                 print(f"Error formatting individual case: {e}")
@@ -89,8 +100,8 @@ def create_case_query_workflow(
     """최신 StateGraph API를 사용한 워크플로우 생성"""
     
     # 필요한 리소스 로드
-    case_retriever = CaseLawRetriever(case_db_path, embedding_path)
-    case_retriever.load_cases()
+    case_retriever = get_case_retriever(case_db_path, embedding_path)
+    case_retriever.ensure_loaded()
     
     with open(format_prompt_path, 'r', encoding='utf-8') as f:
         format_prompt = f.read()
@@ -101,8 +112,8 @@ def create_case_query_workflow(
     workflow = StateGraph(QueryState)
     
     # 노드 정의 (클로저를 사용하여 외부 의존성 주입)
-    workflow.add_node("retrieve", lambda state: retrieve_cases(state, case_retriever))
-    workflow.add_node("format", lambda state: format_cases(state, format_prompt, client))
+    workflow.add_node("retrieve", traced("case_query.retrieve")(lambda state: retrieve_cases(state, case_retriever)))
+    workflow.add_node("format", traced("case_query.format")(lambda state: format_cases(state, format_prompt, client)))
     
     # 에지 정의
     workflow.add_edge("retrieve", "format")
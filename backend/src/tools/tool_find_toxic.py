@@ -1,29 +1,20 @@
 from typing import Dict, List, Any
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
-from src.tools.highlight import ToxicClauseFinder, CaseLawRetriever, DocumentParser
+from src.tools.highlight import ToxicClauseFinder, DocumentParser, get_case_retriever
+from src.tools.segmentation import document_index_store
 import os
 import json
 import traceback
 import logging
-import boto3
-from botocore.config import Config
-import io
+from src.documents import document_s3_key, file_size, open_document, read_header
+from src.logging_config import log_payload
 from ..config import CASE_DB_PATH, EMBEDDING_PATH, HIGHLIGHT_PROMPT_PATH, OPENAI_API_KEY, UPSTAGE_API_KEY, FORMAT_PROMPT_PATH
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# S3 configuration
-BUCKET_NAME = os.environ.get('BUCKET_NAME', 'wetube-gwanwoo')
-s3 = boto3.client('s3',
-    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-    region_name='ap-northeast-2',
-    config=Config(signature_version='s3v4')
-)
-
 # Define schema for the toxic clause search tool
 class ToxicClauseToolSchema(BaseModel):
     query: str = Field(..., description="User query about toxic clauses in contracts")
@@ -53,30 +44,23 @@ def find_toxic_clauses_tool(query: str, file_id: str) -> Dict[str, Any]:
         # Retrieve file from S3
         try:
             logger.info(f"Retrieving file from S3 with key: {file_id}")
-            # Add error handling for different key formats
-            if not file_id.startswith("pdf/"):
-                file_id = f"{file_id}"
-                logger.info(f"Adjusted file ID to: {file_id}")
+            # Documents are stored under a key derived from their content-hash ID
+            s3_key = document_s3_key(file_id)
+            logger.info(f"Using S3 key: {s3_key}")
                 
             # Use a try-except block to handle potential errors
             try:
-                response = s3.get_object(Bucket=BUCKET_NAME, Key=file_id)
-                content_type = response.get('ContentType', '')
-                logger.info(f"Retrieved file from S3 with content type: {content_type}")
-                
-                # Read the entire content into memory
-                file_content = response['Body'].read()
-                logger.info(f"Read {len(file_content)} bytes from S3")
-                
-                # Create a BytesIO object to ensure seek functionality
-                file_obj = io.BytesIO(file_content)
-                file_obj.seek(0)
+                # Spooled to a temp file once the document is large, instead of read() + BytesIO copies
+                file_obj = open_document(file_id)
+                logger.info(f"Downloaded {file_size(file_obj)} bytes from S3")
                 
                 # Check if this looks like a PDF (starts with %PDF-)
-                if not file_content.startswith(b'%PDF-'):
-                    logger.warning(f"File does not appear to be a PDF. First bytes: {file_content[:20]}")
-                    if content_type == 'application/json':
+                header = read_header(file_obj, 20)
+                if not header.startswith(b'%PDF-'):
+                    logger.warning(f"File does not appear to be a PDF. First bytes: {header}")
+                    if header.lstrip().startswith((b'{', b'[')):
                         logger.info("Retrieved content is JSON, not PDF")
+                        file_obj.close()
                         return {"error": "S3 객체가 PDF가 아닌 JSON 데이터입니다."}
                 
                 logger.info("Successfully created file object from S3 content")
@@ -87,7 +71,8 @@ def find_toxic_clauses_tool(query: str, file_id: str) -> Dict[str, Any]:
             # Parse document
             logger.info("Parsing document...")
             document_parser = DocumentParser(UPSTAGE_API_KEY)
-            parse_result = document_parser.parse(file_obj)
+            with file_obj:
+                parse_result = document_parser.parse(file_obj)
             
             # Check for parsing errors
             if isinstance(parse_result, dict) and "error" in parse_result:
@@ -109,14 +94,14 @@ def find_toxic_clauses_tool(query: str, file_id: str) -> Dict[str, Any]:
             # Initialize the case retriever
             try:
                 logger.info("Initializing case retriever...")
-                case_retriever = CaseLawRetriever(
-                    case_db_path=CASE_DB_PATH,
-                    embedding_path=EMBEDDING_PATH
-                )
-                case_retriever.load_cases()
+                case_retriever = get_case_retriever(CASE_DB_PATH, EMBEDDING_PATH)
+                case_retriever.ensure_loaded()
             except FileNotFoundError as e:
                 logger.error(f"Error loading case database or embeddings: {e}")
                 return {"error": f"판례 데이터베이스 로딩 오류: {str(e)}"}
+
+            # Segment the contract and embed each article once per document
+            document_index = document_index_store.build(file_id, document_text, case_retriever.model)
             
             # Initialize the toxic clause finder with API key rather than app
             try:
@@ -145,7 +130,7 @@ def find_toxic_clauses_tool(query: str, file_id: str) -> Dict[str, Any]:
                 logger.info(f"Processing {len(high_json)} toxic clauses...")
                 
                 rationale = ""
-                print("High Json: ", high_json)
+                log_payload(logger, "Toxic clauses", high_json)
                 for item in high_json:
                     converted.append(item.get("독소조항", ""))
                     if "친절한_설명" in item:
@@ -154,6 +139,8 @@ def find_toxic_clauses_tool(query: str, file_id: str) -> Dict[str, Any]:
                 result_highlight["type"] = "highlights"
                 result_highlight["rationale"] = rationale
                 result_highlight["highlights"] = converted
+                # Character offsets of each highlight in the parsed text (None if not found verbatim)
+                result_highlight["locations"] = [document_index.locate(clause) for clause in converted]
                 
                 logger.info(f"Successfully prepared highlights with {len(converted)} toxic clauses")
                 return result_highlight
@@ -9,7 +9,7 @@ import { ChatRequest, BackendResponse, ErrorResponse } from '@/types/chat';
 export async function POST(request: NextRequest) {
   try {
     const body: ChatRequest = await request.json();
-    const { query } = body;
+    const { query, file_id } = body;
     
 
     
@@ -24,7 +24,7 @@ export async function POST(request: NextRequest) {
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ query }),
+      body: JSON.stringify({ query, file_id }),
     });
 
     if (!response.ok) {
@@ -16,6 +16,7 @@ import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } f
 import { Separator } from "@/components/ui/separator"
 
 interface ChatbotProps {
+  fileId?: string
   selectedText: string
   isLoading: boolean
   onHighlightsReceived?: (highlights: string[]) => void
@@ -79,7 +80,7 @@ interface Message {
   content: MessageContent
 }
 
-export function Chatbot({ selectedText, isLoading, onHighlightsReceived }: ChatbotProps) {
+export function Chatbot({ fileId, selectedText, isLoading, onHighlightsReceived }: ChatbotProps) {
   
   // System Intro Message
   const [messages, setMessages] = useState<Message[]>([
@@ -159,7 +160,7 @@ export function Chatbot({ selectedText, isLoading, onHighlightsReceived }: Chatb
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ query: input }),
+        body: JSON.stringify({ query: input, file_id: fileId }),
       });
 
       if (!response.ok) {
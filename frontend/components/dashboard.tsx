@@ -137,7 +137,7 @@ export function Dashboard({ fileId, fileUrl }: { fileId: string; fileUrl?: strin
               <Overview data={documentData.overview} isLoading={isLoading} />
             </TabsContent>
             <TabsContent value="chat" className="h-full overflow-hidden">
-              <Chatbot selectedText={selectedText} isLoading={isLoading} onHighlightsReceived={handleUserHighlights} />
+              <Chatbot fileId={fileId} selectedText={selectedText} isLoading={isLoading} onHighlightsReceived={handleUserHighlights} />
             </TabsContent>
           </div>
         </Tabs>
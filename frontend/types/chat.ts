@@ -1,6 +1,7 @@
 // 채팅 API 관련 타입 정의
 export interface ChatRequest {
   query: string;
+  file_id?: string;
 }
 
 // 백엔드 응답 인터페이스 정의